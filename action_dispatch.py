@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+
+import pyautogui
+
+# Gesture actions run on one dispatcher thread instead of the Tk main loop, so a long typewrite() never
+# freezes the UI. Hotkey strings are parsed into Action objects once, when they are edited, not for every
+# gesture. A gesture that repeats within its cooldown window, or while the same one is still queued, is
+# coalesced into the earlier one instead of firing the action again.
+
+GESTURE_COOLDOWN = 0.5 # s
+
+
+class Action:
+    """
+    A parsed hotkey string: 'ctrl+c' -> hotkey, 'hello!' -> typewrite, 'l' / '120' -> press
+    (the same rules GestureApp.process_gesture applied to the raw string).
+    """
+
+    def __init__(self, hotkey_str):
+        self.text = hotkey_str
+        if '+' in hotkey_str:
+            self.kind = 'hotkey'
+            self.keys = hotkey_str.split('+')
+        elif len(hotkey_str) > 1 and not hotkey_str.isdigit() and not hotkey_str.isalpha():
+            self.kind = 'typewrite'
+            self.keys = [hotkey_str]
+        else:
+            self.kind = 'press'
+            self.keys = [hotkey_str]
+
+    def run(self):
+        if self.kind == 'hotkey':
+            pyautogui.hotkey(*self.keys)
+        elif self.kind == 'typewrite':
+            pyautogui.typewrite(self.keys[0])
+        else:
+            pyautogui.press(self.keys[0])
+
+    def __repr__(self):
+        return f"Action({self.kind} {self.text!r})"
+
+
+def parse_action(hotkey_str):
+    """
+    Action for a hotkey string, None if it is empty.
+    """
+    hotkey_str = hotkey_str.strip()
+    return Action(hotkey_str) if hotkey_str else None
+
+
+class ActionJob:
+    def __init__(self, key, action, context, received):
+        self.key = key
+        self.action = action
+        self.context = context
+        self.received = received
+        self.submitted = time.perf_counter()
+        self.dispatched = None
+        self.done = None
+        self.error = None
+
+
+class ActionDispatcher:
+    """
+    submit() from any thread; actions run in order on the dispatcher thread and on_done(job) is called
+    there after each one. key identifies what is debounced, e.g. (wand address, gesture name); cooldowns
+    can override the cooldown per gesture name (key[-1]).
+    """
+
+    def __init__(self, on_done=None, cooldown=GESTURE_COOLDOWN, cooldowns=None):
+        self.on_done = on_done
+        self.cooldown = cooldown
+        self.cooldowns = cooldowns or {}
+        self.cond = threading.Condition()
+        self.jobs = deque()
+        self.pending = set()
+        self.last_accepted = {}
+        self.coalesced = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='action-dispatcher', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def submit(self, key, action, context=None, received=None):
+        """
+        Queues the action; returns False if it was coalesced into an earlier one.
+        """
+        now = time.perf_counter()
+        cooldown = self.cooldowns.get(key[-1], self.cooldown) if isinstance(key, tuple) else self.cooldown
+        with self.cond:
+            last = self.last_accepted.get(key)
+            if key in self.pending or (last is not None and now - last < cooldown):
+                self.coalesced += 1
+                return False
+            self.last_accepted[key] = now
+            self.pending.add(key)
+            self.jobs.append(ActionJob(key, action, context, received))
+            self.cond.notify()
+        return True
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.jobs:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                job = self.jobs.popleft()
+                self.pending.discard(job.key)
+            job.dispatched = time.perf_counter()
+            try:
+                job.action.run()
+            except Exception as e:
+                job.error = e
+            job.done = time.perf_counter()
+            if self.on_done is not None:
+                self.on_done(job)
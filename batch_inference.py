@@ -0,0 +1,174 @@
+import numpy as np
+
+# Batched evaluation of a TFLite model: the interpreter input is resized to a whole batch of windows,
+# quantization and dequantization are done on the batch at once and the int8 input buffer is allocated
+# once. Models whose batch dimension cannot be resized are run one window per invoke() with the same
+# buffers, so the outputs do not depend on the path taken.
+#
+# Input roundings:
+#   'truncate' (x / scale + zero_point).astype(int8), what test_novi_data.py always did
+#   'round'    round() half away from zero, clipped to int8 (host_inference)
+#   'firmware' static_cast<int8_t>(round(x / scale) + zero_point) exactly as final.ino does it: no
+#              clipping, the Cortex-M float -> int32 conversion saturates and the int8 cast keeps the low byte
+
+EVAL_BATCH_SIZE = 64
+
+
+def quantize_round(values):
+    """
+    round() from final.ino (half away from zero), in place. floor(|x| + 0.5) is not used because the sum
+    itself rounds in float32 (0.49999997 + 0.5 == 1.0); x - trunc(x) is exact.
+    """
+    truncated = np.trunc(values)
+    away = np.abs(values - truncated) >= 0.5
+    np.copysign(away, values, out=values, dtype=values.dtype)
+    values += truncated
+    return values
+
+
+def wrap_int8(values):
+    """
+    static_cast<int8_t> of integral floats on the board: saturate to int32, keep the low byte.
+    """
+    info = np.iinfo(np.int32)
+    return np.clip(values, info.min, info.max).astype(np.int64).astype(np.int8)
+
+
+def quantization(details):
+    params = details['quantization_parameters']
+    if len(params['scales']) == 0:
+        return None, None # float tenzor
+    return params['scales'][0], params['zero_points'][0]
+
+
+class BatchEvaluator:
+    """
+    run(windows) -> raw model outputs (n, classes), predict(windows) -> dequantized outputs, for any number
+    of windows shaped like the model input without its batch dimension.
+    """
+
+    def __init__(self, interpreter, batch_size=EVAL_BATCH_SIZE, rounding='truncate'):
+        if rounding not in ('truncate', 'round', 'firmware'):
+            raise ValueError(f"Unknown rounding: {rounding}")
+        self.interpreter = interpreter
+        self.batch_size = batch_size
+        self.rounding = rounding
+
+        interpreter.allocate_tensors()
+        self.input_details = interpreter.get_input_details()[0]
+        self.output_details = interpreter.get_output_details()[0]
+        self.input_scale, self.input_zero_point = quantization(self.input_details)
+        self.output_scale, self.output_zero_point = quantization(self.output_details)
+        self.window_shape = tuple(int(d) for d in self.input_details['shape'][1:])
+        self.current_batch = int(self.input_details['shape'][0])
+        self.resizable = True
+        self.invocations = 0
+
+        # dtypes od (x / scale + zero_point) kao u petlji po prozorima, da rezultat bude bit-identican
+        self.input_batch = np.zeros((batch_size,) + self.window_shape, dtype=self.input_details['dtype'])
+        if self.input_scale is not None:
+            probe = np.zeros(1, dtype=np.float32) / self.input_scale
+            self.scaled = np.zeros(self.input_batch.shape, dtype=probe.dtype)
+            self.shifted = np.zeros(self.input_batch.shape, dtype=(probe + self.input_zero_point).dtype)
+
+    def quantize(self, windows):
+        """
+        Writes the windows (at most batch_size) into input_batch in the model's input dtype.
+        """
+        n = len(windows)
+        if self.input_scale is None:
+            self.input_batch[:n] = windows
+            return
+        scaled = self.scaled[:n]
+        np.divide(windows, self.input_scale, out=scaled)
+        if self.rounding == 'round':
+            quantize_round(scaled)
+            np.add(scaled, self.input_zero_point, out=scaled)
+            info = np.iinfo(self.input_batch.dtype)
+            np.clip(scaled, info.min, info.max, out=scaled)
+            self.input_batch[:n] = scaled
+        elif self.rounding == 'firmware':
+            quantize_round(scaled)
+            np.add(scaled, self.input_zero_point, out=scaled)
+            self.input_batch[:n] = wrap_int8(scaled)
+        else:
+            shifted = self.shifted[:n]
+            np.add(scaled, self.input_zero_point, out=shifted)
+            self.input_batch[:n] = shifted # isti unsafe cast kao astype
+
+    def dequantize(self, outputs):
+        if self.output_scale is None:
+            return outputs
+        return (outputs - self.output_zero_point) * self.output_scale
+
+    def resize(self, n):
+        self.interpreter.resize_tensor_input(self.input_details['index'], [n, *self.window_shape])
+        self.interpreter.allocate_tensors()
+        self.current_batch = n
+
+    def invoke(self, n):
+        """
+        Raw outputs (n, classes) for the first n windows of input_batch: one invoke() with the input resized
+        to n, or one invoke() per window if the model cannot be resized.
+        """
+        if self.resizable:
+            try:
+                if n != self.current_batch:
+                    self.resize(n)
+                self.interpreter.set_tensor(self.input_details['index'], self.input_batch[:n])
+                self.interpreter.invoke()
+                self.invocations += 1
+                outputs = self.interpreter.get_tensor(self.output_details['index'])
+                if len(outputs) == n:
+                    return outputs.copy()
+            except (RuntimeError, ValueError):
+                pass
+            print(f"Model input cannot be resized to a batch of {n}, evaluating one window per invoke().")
+            self.resizable = False
+            self.resize(1)
+
+        outputs = []
+        for i in range(n):
+            self.interpreter.set_tensor(self.input_details['index'], self.input_batch[i:i + 1])
+            self.interpreter.invoke()
+            self.invocations += 1
+            outputs.append(self.interpreter.get_tensor(self.output_details['index']).copy())
+        return np.concatenate(outputs)
+
+    def run(self, windows):
+        outputs = []
+        for start in range(0, len(windows), self.batch_size):
+            batch = windows[start:start + self.batch_size]
+            self.quantize(batch)
+            outputs.append(self.invoke(len(batch)))
+        if not outputs:
+            return np.zeros((0,) + tuple(self.output_details['shape'][1:]), dtype=self.output_details['dtype'])
+        return np.concatenate(outputs)
+
+    def predict(self, windows):
+        return self.dequantize(self.run(windows))
+
+    def predict_per_window(self, windows):
+        """
+        The reference path: quantize, set_tensor, invoke, get_tensor and dequantize one window at a time.
+        """
+        if self.current_batch != 1:
+            self.resize(1)
+        outputs = []
+        for i in range(len(windows)):
+            window = windows[i:i + 1]
+            if self.input_scale is None:
+                input_data = window.astype(self.input_details['dtype'])
+            elif self.rounding == 'round':
+                info = np.iinfo(self.input_details['dtype'])
+                input_data = np.clip(quantize_round(window / self.input_scale) + self.input_zero_point,
+                                     info.min, info.max).astype(self.input_details['dtype'])
+            elif self.rounding == 'firmware':
+                input_data = wrap_int8(quantize_round(window / self.input_scale) + self.input_zero_point)
+            else:
+                input_data = (window / self.input_scale + self.input_zero_point).astype(self.input_details['dtype'])
+            self.interpreter.set_tensor(self.input_details['index'], input_data)
+            self.interpreter.invoke()
+            self.invocations += 1
+            outputs.append(self.dequantize(self.interpreter.get_tensor(self.output_details['index'])))
+        return np.concatenate(outputs)
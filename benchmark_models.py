@@ -0,0 +1,372 @@
+import os
+import re
+import ast
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import tensorflow as tf
+
+from latency_stats import LatencyHistogram
+
+# Benchmarks model variants (.tflite, or .h5 converted like quantize_model.py does) and appends the results
+# to a JSON history, so a change of NUM_FILTERS / DENSE_UNITS in train_model.py shows up as a diff:
+#
+#   python benchmark_models.py model_quantized.tflite final/model.tflite gesture_model.h5 --threads 4
+#
+# Per model:
+#   latency   invoke() distribution at 1..--threads threads (LatencyHistogram, ms)
+#   arena     activation memory laid out like TFLite Micro's greedy planner (16-byte aligned, tensors whose
+#             lifetimes do not overlap share memory), against kTensorArenaSize in final.ino. TFLM also keeps
+#             its own tensor / node structs in the arena, so leave some headroom.
+#   ops       per-op time from TFLite's benchmark_model --enable_op_profiling if the binary is found, else
+#             the 1-thread mean split by estimated cost (MACs + output elements) and marked as estimated
+#   macs      CONV_2D / DEPTHWISE_CONV_2D / FULLY_CONNECTED multiply-accumulates per window
+#   params    elements of the constant tensors; flash is the flatbuffer size (model_quantized.h)
+
+history_file = "model_benchmarks.json"
+firmware_file = os.path.join("final", "final.ino")
+train_script = "train_model.py"
+representative_file = "train_dataset.npz"
+representative_samples = 100 # kao quantize_model.py
+default_runs = 200
+warmup_runs = 10
+latency_resolution = 1e-6 # invoke() traje ispod milisekunde, 0.1 ms iz latency_stats je pregrubo
+arena_alignment = 16 # kBufferAlignment u TFLM
+arena_warning_fraction = 0.9
+mac_ops = ('CONV_2D', 'DEPTHWISE_CONV_2D', 'FULLY_CONNECTED')
+
+
+def convert_keras(model, quantize=True, representative=None):
+    """
+    .tflite flatbuffer of a Keras model: int8 with representative windows (default: train_dataset.npz) like
+    quantize_model.py, or float like train_model.py.
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize:
+        X = np.load(representative_file)['X'] if representative is None else representative
+
+        def representative_data_gen():
+            for i in range(min(representative_samples, len(X))):
+                yield [X[i:i + 1].astype(np.float32)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_data_gen
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def convert_h5(path, quantize=True):
+    from keras.models import load_model
+    from tcn import TCN
+    return convert_keras(load_model(path, custom_objects={'TCN': TCN}, compile=False), quantize)
+
+
+def load_model_bytes(path, quantize_h5=True):
+    if path.endswith('.h5'):
+        return convert_h5(path, quantize_h5)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def firmware_arena_size(path=firmware_file):
+    """
+    kTensorArenaSize from final.ino (e.g. "16 * 1024"), None if it cannot be read.
+    """
+    try:
+        with open(path) as f:
+            match = re.search(r'kTensorArenaSize\s*=\s*([\d\s*]+);', f.read())
+    except OSError:
+        return None
+    if match is None:
+        return None
+    return int(np.prod([int(factor) for factor in match.group(1).split('*')]))
+
+
+def train_config(path=train_script):
+    """
+    The upper-case literal constants of train_model.py (NUM_FILTERS, DENSE_UNITS, ...), recorded with every run.
+    """
+    try:
+        with open(path) as f:
+            assignments = re.findall(r'^([A-Z_]+)\s*=\s*(.+)$', f.read(), re.M)
+    except OSError:
+        return {}
+    config = {}
+    for name, value in assignments:
+        try:
+            config[name] = ast.literal_eval(value.split('#')[0].strip())
+        except (ValueError, SyntaxError):
+            pass
+    return config
+
+
+def model_graph(model_content):
+    """
+    Ops and tensors of the model without the default delegates, so every op is listed on its own.
+    """
+    interpreter = tf.lite.Interpreter(
+        model_content=model_content,
+        experimental_op_resolver_type=tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+    interpreter.allocate_tensors()
+    tensors = {t['index']: t for t in interpreter.get_tensor_details()}
+    ops = interpreter._get_ops_details()
+    inputs = [d['index'] for d in interpreter.get_input_details()]
+    outputs = [d['index'] for d in interpreter.get_output_details()]
+    return ops, tensors, inputs, outputs
+
+
+def tensor_bytes(tensor):
+    return int(np.prod(tensor['shape'])) * np.dtype(tensor['dtype']).itemsize
+
+
+def op_macs(op, tensors):
+    name = op['op_name']
+    if name not in mac_ops:
+        return 0
+    out_elements = int(np.prod(tensors[op['outputs'][0]]['shape']))
+    weights = tensors[op['inputs'][1]]['shape']
+    if name == 'CONV_2D':
+        return out_elements * int(np.prod(weights[1:])) # [out, kh, kw, in]
+    if name == 'DEPTHWISE_CONV_2D':
+        return out_elements * int(np.prod(weights[1:3]))
+    return out_elements * int(weights[-1]) # FULLY_CONNECTED [units, in]
+
+
+def constant_tensors(ops, tensors, inputs):
+    produced = {i for op in ops for i in op['outputs']}
+    used = {i for op in ops for i in op['inputs'] if i >= 0}
+    return [i for i in used if i not in produced and i not in inputs]
+
+
+def plan_arena(ops, tensors, inputs, outputs, alignment=arena_alignment):
+    """
+    Peak bytes of the activation tensors placed first-fit, largest first, at the lowest offset that does
+    not collide with a placed tensor whose lifetime (producing op .. last consuming op) overlaps.
+    """
+    first, last = {}, {}
+    for i in inputs:
+        first[i] = last[i] = 0
+    for k, op in enumerate(ops):
+        for i in op['outputs']:
+            first.setdefault(i, k)
+            last[i] = max(last.get(i, k), k)
+        for i in op['inputs']:
+            if i in first:
+                last[i] = max(last[i], k)
+    for i in outputs:
+        last[i] = len(ops)
+
+    buffers = sorted(((-(-tensor_bytes(tensors[i]) // alignment) * alignment, first[i], last[i]) for i in first),
+                     reverse=True)
+    placed = []
+    peak = 0
+    for size, start, end in buffers:
+        offset = 0
+        for other_offset, other_size, other_start, other_end in sorted(placed):
+            if other_end < start or other_start > end:
+                continue
+            if offset + size <= other_offset:
+                break
+            offset = max(offset, other_offset + other_size)
+        placed.append((offset, size, start, end))
+        peak = max(peak, offset + size)
+    return peak
+
+
+def random_input(details):
+    dtype = np.dtype(details['dtype'])
+    rng = np.random.default_rng(0)
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return rng.integers(info.min, info.max + 1, size=details['shape'], dtype=dtype)
+    return rng.normal(size=details['shape']).astype(dtype)
+
+
+def invoke_latency(model_content, num_threads, runs=default_runs):
+    interpreter = tf.lite.Interpreter(model_content=model_content, num_threads=num_threads)
+    interpreter.allocate_tensors()
+    input_details = interpreter.get_input_details()[0]
+    interpreter.set_tensor(input_details['index'], random_input(input_details))
+    histogram = LatencyHistogram(resolution=latency_resolution)
+    for run in range(warmup_runs + runs):
+        start = time.perf_counter()
+        interpreter.invoke()
+        if run >= warmup_runs:
+            histogram.add(time.perf_counter() - start)
+    return histogram.summary()
+
+
+def profile_with_benchmark_binary(binary, model_path, runs=default_runs):
+    """
+    Per-op rows from benchmark_model --enable_op_profiling=true (see parse_op_profile).
+    """
+    result = subprocess.run([binary, f"--graph={model_path}", "--num_threads=1", f"--num_runs={runs}",
+                             "--enable_op_profiling=true"], capture_output=True, text=True, check=True)
+    return parse_op_profile(result.stdout + result.stderr)
+
+
+def parse_op_profile(output):
+    """
+    Rows of the "Run Order" table under "Operator-wise Profiling Info for Regular Benchmark Runs". The
+    initialization table printed before it (ModifyGraphWithDelegate, AllocateTensors) is skipped, and the
+    columns are looked up by their [header] names.
+    """
+    rows = []
+    in_regular_runs = False
+    in_run_order = False
+    columns = None
+    for line in output.splitlines():
+        if 'Operator-wise Profiling Info for Regular Benchmark Runs' in line:
+            in_regular_runs = True
+            continue
+        if '=====' in line:
+            in_run_order = in_regular_runs and 'Run Order' in line and not rows
+            columns = None
+            continue
+        fields = [field.strip() for field in line.split('\t') if field.strip()]
+        if not in_run_order or not fields:
+            continue
+        if columns is None:
+            if fields[0] == '[node type]':
+                columns = {name: i for i, name in enumerate(fields)}
+            continue
+        if len(fields) < len(columns):
+            continue
+        rows.append({'op': fields[columns['[node type]']], 'name': fields[columns['[Name]']],
+                     'avg_ms': float(fields[columns['[avg ms]']]), 'percent': float(fields[columns['[%]']].rstrip('%'))})
+    return rows
+
+
+def estimate_op_profile(ops, tensors, mean_ms):
+    costs = np.array([op_macs(op, tensors) + int(np.prod(tensors[op['outputs'][0]]['shape'])) for op in ops],
+                     dtype=np.float64)
+    shares = costs / costs.sum() if costs.sum() else costs
+    return [{'op': op['op_name'], 'name': str(op['index']), 'avg_ms': round(float(share * mean_ms), 4),
+             'percent': round(float(share * 100), 2)} for op, share in zip(ops, shares)]
+
+
+def summarize_ops(rows):
+    by_type = {}
+    for row in rows:
+        entry = by_type.setdefault(row['op'], {'count': 0, 'avg_ms': 0.0, 'percent': 0.0})
+        entry['count'] += 1
+        entry['avg_ms'] = round(entry['avg_ms'] + row['avg_ms'], 4)
+        entry['percent'] = round(entry['percent'] + row['percent'], 2)
+    return dict(sorted(by_type.items(), key=lambda item: -item[1]['avg_ms']))
+
+
+def benchmark_model(path, max_threads=1, runs=default_runs, quantize_h5=True, binary=None, arena_limit=None):
+    model_content = load_model_bytes(path, quantize_h5)
+    ops, tensors, inputs, outputs = model_graph(model_content)
+    constants = constant_tensors(ops, tensors, inputs)
+
+    latency = {str(n): invoke_latency(model_content, n, runs) for n in range(1, max_threads + 1)}
+    arena = plan_arena(ops, tensors, inputs, outputs)
+
+    if binary:
+        with tempfile.NamedTemporaryFile(suffix='.tflite', delete=False) as f:
+            f.write(model_content)
+        try:
+            op_rows, op_source = profile_with_benchmark_binary(binary, f.name, runs), 'benchmark_model'
+        finally:
+            os.remove(f.name)
+    else:
+        op_rows, op_source = estimate_op_profile(ops, tensors, latency['1']['mean_ms']), 'estimated'
+
+    return {
+        'flash_bytes': len(model_content),
+        'params': int(sum(np.prod(tensors[i]['shape']) for i in constants)),
+        'weight_bytes': int(sum(tensor_bytes(tensors[i]) for i in constants)),
+        'macs': int(sum(op_macs(op, tensors) for op in ops)),
+        'input_dtype': np.dtype(tensors[inputs[0]]['dtype']).name,
+        'arena_bytes': arena,
+        'arena_limit': arena_limit,
+        'latency_ms': latency,
+        'op_profile_source': op_source,
+        'op_types': summarize_ops(op_rows),
+        'ops': op_rows,
+    }
+
+
+def load_history(path=history_file):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'runs': []}
+
+
+def save_history(history, path=history_file):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def previous_result(history, model):
+    for run in reversed(history['runs']):
+        if model in run['models']:
+            return run['models'][model]
+    return None
+
+
+def change(new, old):
+    if old in (None, 0):
+        return ""
+    return f" ({(new - old) / old * 100:+.1f}%)"
+
+
+def print_result(model, result, previous):
+    old = previous or {}
+    print(f"\n{model}: {result['input_dtype']} input")
+    print(f"  flash {result['flash_bytes']} B{change(result['flash_bytes'], old.get('flash_bytes'))} | "
+          f"params {result['params']}{change(result['params'], old.get('params'))} | "
+          f"MACs {result['macs']}{change(result['macs'], old.get('macs'))}")
+    limit = result['arena_limit']
+    arena = f"  arena {result['arena_bytes']} B{change(result['arena_bytes'], old.get('arena_bytes'))}"
+    if limit:
+        arena += f" of kTensorArenaSize {limit} B ({result['arena_bytes'] / limit:.0%})"
+        if result['arena_bytes'] > limit:
+            arena += " <-- does not fit"
+        elif result['arena_bytes'] > limit * arena_warning_fraction:
+            arena += " <-- close to the limit"
+    print(arena)
+    for threads, s in result['latency_ms'].items():
+        old_p50 = old.get('latency_ms', {}).get(threads, {}).get('p50_ms')
+        print(f"  {threads} thread(s): p50 {s['p50_ms']:.3f} ms{change(s['p50_ms'], old_p50)} | "
+              f"p95 {s['p95_ms']:.3f} | p99 {s['p99_ms']:.3f} | max {s['max_ms']:.3f}")
+    print(f"  ops ({result['op_profile_source']}):")
+    for op, s in list(result['op_types'].items())[:8]:
+        print(f"    {op:<20} x{s['count']:<3} {s['avg_ms']:8.3f} ms {s['percent']:6.2f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark .tflite / .h5 models and append the results to a JSON history.")
+    parser.add_argument('models', nargs='+', help=".tflite files, or .h5 Keras models (converted in memory)")
+    parser.add_argument('--threads', type=int, default=1, help="measure latency at 1..THREADS threads")
+    parser.add_argument('--runs', type=int, default=default_runs, help="timed invoke() calls per thread count")
+    parser.add_argument('--float-h5', action='store_true', help="convert .h5 models without int8 quantization")
+    parser.add_argument('--benchmark-binary', default=shutil.which('benchmark_model'),
+                        help="TFLite benchmark_model for the per-op profile (default: from PATH, else estimated)")
+    parser.add_argument('--history', default=history_file)
+    parser.add_argument('--no-save', action='store_true', help="do not append this run to the history")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    arena_limit = firmware_arena_size()
+    run = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'train_config': train_config(), 'models': {}}
+    for model in args.models:
+        result = benchmark_model(model, args.threads, args.runs, not args.float_h5, args.benchmark_binary, arena_limit)
+        print_result(model, result, previous_result(history, model))
+        run['models'][model] = result
+
+    if not args.no_save:
+        history['runs'].append(run)
+        save_history(history, args.history)
+        print(f"\nResults appended to {args.history} ({len(history['runs'])} runs).")
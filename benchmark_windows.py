@@ -0,0 +1,204 @@
+import os
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+import create_windows
+from create_windows import load_csv_as_dataframe, load_intervals, label_map, sensor_cols, window_size, sensor_sample_rate, junk_stride, junk_label_idx
+
+data_dir = "gesture_data"
+gesture_names = ['double', 'flick', 'infinity', 'kiss']
+
+recording_hours = 1
+gesture_every_seconds = 5
+gesture_length_seconds = 2.5
+
+
+def legacy_extract_gesture_windows(data_df_full, intervals, gesture_name_str):
+    # row-by-row trigger search the scripts used before windowing.py, kept here as the reference
+    windows = []
+    labels = []
+    intended_gesture_label_str = str(label_map[gesture_name_str])
+
+    for interval in intervals:
+        interval_data_start_idx = data_df_full['timestamp'].searchsorted(interval['start_time'], side='left')
+        interval_data_end_idx = data_df_full['timestamp'].searchsorted(interval['end_time'], side='right') - 1
+
+        if interval_data_start_idx >= len(data_df_full) or interval_data_start_idx > interval_data_end_idx:
+            continue
+
+        trigger_found_at_idx = -1
+        for idx_in_full_df in range(interval_data_start_idx, interval_data_end_idx + 1):
+            if data_df_full.iloc[idx_in_full_df]['label'] == intended_gesture_label_str:
+                gx, gy, gz = data_df_full.iloc[idx_in_full_df]['gx'], data_df_full.iloc[idx_in_full_df]['gy'], data_df_full.iloc[idx_in_full_df]['gz']
+                if abs(gx) >= 1.0 or abs(gy) >= 1.0 or abs(gz) >= 1.0:
+                    trigger_found_at_idx = idx_in_full_df
+                    break
+
+        if trigger_found_at_idx != -1:
+            window_end_idx = trigger_found_at_idx + window_size - 1
+            if window_end_idx < len(data_df_full):
+                window_df = data_df_full.iloc[trigger_found_at_idx : window_end_idx + 1]
+                windows.append(window_df[sensor_cols].astype(np.float32).values.tolist())
+                labels.append(label_map[gesture_name_str])
+
+    return windows, labels
+
+
+def legacy_extract_junk_windows(data_df_junk):
+    # DataFrame slice + tolist() per window, as create_windows.py did before the strided views
+    windows = []
+    labels = []
+    for start_idx in range(0, len(data_df_junk) - window_size + 1, junk_stride):
+        window_df = data_df_junk.iloc[start_idx : start_idx + window_size]
+        windows.append(window_df[sensor_cols].astype(np.float32).values.tolist())
+        labels.append(label_map['junk'])
+    return windows, labels
+
+
+def legacy_inject_junk_between_intervals(data_df_full, intervals, junk_label_str_val):
+    # list-of-dicts version create_windows.py used before the index arithmetic
+    modified_rows = []
+    intervals = sorted(intervals, key=lambda x: x['start_time'])
+    last_idx_processed_in_original_df = 0
+
+    for i in range(len(intervals)):
+        interval = intervals[i]
+        interval_data_start_idx = data_df_full['timestamp'].searchsorted(interval['start_time'], side='left')
+        if interval_data_start_idx > last_idx_processed_in_original_df:
+            modified_rows.extend(data_df_full.iloc[last_idx_processed_in_original_df : interval_data_start_idx].to_dict('records'))
+
+        interval_data_end_idx = data_df_full['timestamp'].searchsorted(interval['end_time'], side='right') - 1
+        modified_rows.extend(data_df_full.iloc[interval_data_start_idx : interval_data_end_idx + 1].to_dict('records'))
+        last_idx_processed_in_original_df = interval_data_end_idx + 1
+
+        if i < len(intervals) - 1:
+            next_interval = intervals[i+1]
+            gap_duration_seconds = next_interval['start_time'] - interval['end_time']
+            if gap_duration_seconds > 0:
+                mid_time_between = (interval['end_time'] + next_interval['start_time']) / 2
+                closest_sample_idx = (data_df_full['timestamp'] - mid_time_between).abs().idxmin()
+                middle_junk_sample_data = data_df_full.iloc[closest_sample_idx].copy()
+                num_junk_samples_to_inject = min(int(gap_duration_seconds * sensor_sample_rate), 312)
+                current_junk_timestamp = interval['end_time'] + (1.0 / sensor_sample_rate)
+                for _ in range(num_junk_samples_to_inject):
+                    junk_row = middle_junk_sample_data.to_dict()
+                    junk_row['label'] = junk_label_str_val
+                    junk_row['timestamp'] = current_junk_timestamp
+                    modified_rows.append(junk_row)
+                    current_junk_timestamp += (1.0 / sensor_sample_rate)
+
+    if last_idx_processed_in_original_df < len(data_df_full):
+        modified_rows.extend(data_df_full.iloc[last_idx_processed_in_original_df:].to_dict('records'))
+
+    return pd.DataFrame(modified_rows, columns=data_df_full.columns).reset_index(drop=True)
+
+
+def synthetic_recording(hours, seed=0):
+    """
+    Builds a normalized recording of the given length with a quiet gesture every few seconds.
+    The gyro only crosses the trigger threshold near the end of each gesture interval,
+    which is the worst case for the row-by-row search.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * sensor_sample_rate)
+    timestamps = np.arange(n) / sensor_sample_rate
+    data = rng.normal(0.0, 0.2, size=(n, len(sensor_cols)))
+
+    gesture_label = str(label_map['double'])
+    labels = np.full(n, str(label_map['junk']), dtype=object)
+    intervals = []
+    for start in np.arange(1.0, n / sensor_sample_rate - gesture_every_seconds, gesture_every_seconds):
+        end = start + gesture_length_seconds
+        intervals.append({'start_time': float(start), 'end_time': float(end)})
+        i0, i1 = int(start * sensor_sample_rate), int(end * sensor_sample_rate)
+        labels[i0:i1] = gesture_label
+        data[i1 - 5, 3] = 1.5
+
+    df = pd.DataFrame(data, columns=sensor_cols)
+    df.insert(0, 'timestamp', timestamps)
+    df['label'] = labels
+    return df, intervals
+
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def traced(func, *args):
+    # returns (result, seconds, peak traced bytes)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def compare_junk(name, df):
+    def to_array(windows):
+        return np.array(windows, dtype=np.float32)
+
+    (new_windows, new_labels), new_time, new_peak = traced(create_windows.extract_junk_windows, df)
+    new_array, _, new_array_peak = traced(to_array, new_windows)
+    del new_array
+    (old_windows, old_labels), old_time, old_peak = traced(legacy_extract_junk_windows, df)
+    old_array, _, old_array_peak = traced(to_array, old_windows)
+
+    identical = new_labels == old_labels and np.array_equal(to_array(new_windows), old_array)
+    print(f"{name}: {len(new_windows)} junk windows, lists {old_time:.3f} s / {(old_peak + old_array_peak) / 2**20:.1f} MB, "
+          f"views {new_time:.4f} s / {(new_peak + new_array_peak) / 2**20:.1f} MB, identical: {identical}")
+
+
+def compare_injection(name, df, intervals):
+    junk = str(junk_label_idx)
+    new_df, new_time, new_peak = traced(create_windows.inject_junk_between_intervals, df, intervals, junk)
+    old_df, old_time, old_peak = traced(legacy_inject_junk_between_intervals, df, intervals, junk)
+    # the array version keeps the input column dtypes (float32 stays float32), so compare values
+    identical = (new_df.shape == old_df.shape and (new_df['label'].to_numpy() == old_df['label'].to_numpy()).all()
+                 and all(np.array_equal(new_df[col].to_numpy(dtype=np.float64), old_df[col].to_numpy(dtype=np.float64))
+                         for col in ['timestamp'] + sensor_cols))
+    print(f"{name}: {len(new_df)} rows, dicts {old_time:.3f} s / {old_peak / 2**20:.1f} MB, "
+          f"arrays {new_time:.4f} s / {new_peak / 2**20:.1f} MB, identical: {identical}")
+
+
+def compare(name, df, intervals, gesture):
+    (new_windows, new_labels), new_time = timed(create_windows.extract_gesture_windows, df, intervals, gesture)
+    (old_windows, old_labels), old_time = timed(legacy_extract_gesture_windows, df, intervals, gesture)
+    identical = new_labels == old_labels and np.array_equal(np.array(new_windows, dtype=np.float32), np.array(old_windows, dtype=np.float32))
+    speedup = old_time / new_time if new_time > 0 else float('inf')
+    print(f"{name}: {len(new_windows)} windows, row loop {old_time:.3f} s, vectorized {new_time:.4f} s, {speedup:.0f}x, identical: {identical}")
+
+
+if __name__ == "__main__":
+    print("--- gesture trigger search ---")
+    for gesture in gesture_names:
+        final_csv_path = os.path.join(data_dir, f"{gesture}_final.csv")
+        intervals_txt_path = os.path.join(data_dir, f"{gesture}_intervals.txt")
+        if not os.path.exists(final_csv_path):
+            print(f"{final_csv_path} not found.")
+            continue
+        df = load_csv_as_dataframe(final_csv_path, has_timestamp=True)
+        intervals = load_intervals(intervals_txt_path)
+        compare(gesture, df, intervals, gesture)
+
+    df, intervals = synthetic_recording(recording_hours)
+    compare(f"synthetic {recording_hours} h ({len(df)} samples)", df, intervals, 'double')
+
+    print("\n--- junk injection between intervals ---")
+    for gesture in gesture_names:
+        final_csv_path = os.path.join(data_dir, f"{gesture}_final.csv")
+        if os.path.exists(final_csv_path):
+            compare_injection(gesture, load_csv_as_dataframe(final_csv_path, has_timestamp=True),
+                              load_intervals(os.path.join(data_dir, f"{gesture}_intervals.txt")))
+    compare_injection(f"synthetic {recording_hours} h", df, intervals)
+
+    print("\n--- junk windows ---")
+    junk_final_csv_path = os.path.join(data_dir, "junk_final.csv")
+    if os.path.exists(junk_final_csv_path):
+        compare_junk("junk", load_csv_as_dataframe(junk_final_csv_path, has_timestamp=False))
+    compare_junk(f"synthetic {recording_hours} h", df)
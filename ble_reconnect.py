@@ -0,0 +1,59 @@
+import json
+import os
+import random
+
+# Last known wand addresses and reconnect timing, shared by magic_wand.py and bt_connect.py.
+# A known address is connected to directly (no name scan), which is what gets the first gesture in well
+# under a second after launch. magic_wand.py scans in the background at the same time, for wands that are
+# not known yet; bt_connect.py only scans if the known wand does not answer. After a dropped link the client keeps
+# reconnecting with exponential backoff and subscribes to its notifications again.
+
+KNOWN_WANDS_FILE = os.path.join(os.path.expanduser("~"), ".magic_wand_devices.json")
+MAX_KNOWN_WANDS = 8
+DIRECT_CONNECT_TIMEOUT = 5.0 # s
+RECONNECT_START = 0.5 # s
+RECONNECT_MAX = 30.0 # s
+
+
+def load_known_addresses(path=KNOWN_WANDS_FILE):
+    """
+    Remembered wand addresses, most recently connected first; empty if nothing was saved yet.
+    """
+    try:
+        with open(path) as f:
+            return list(json.load(f).get('addresses', []))
+    except (OSError, ValueError):
+        return []
+
+
+def remember_address(address, path=KNOWN_WANDS_FILE):
+    addresses = [address] + [a for a in load_known_addresses(path) if a != address]
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'addresses': addresses[:MAX_KNOWN_WANDS]}, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not save the wand address to {path}: {e}")
+
+
+class Backoff:
+    """
+    Reconnect delays start, start * factor, ... capped at maximum. Each delay is jittered by +-jitter so
+    several wands that dropped together do not retry in lockstep.
+    """
+
+    def __init__(self, start=RECONNECT_START, maximum=RECONNECT_MAX, factor=2.0, jitter=0.1):
+        self.start = start
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.delay = start
+
+    def next(self):
+        delay = self.delay
+        self.delay = min(self.delay * self.factor, self.maximum)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def reset(self):
+        self.delay = self.start
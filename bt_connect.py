@@ -2,6 +2,8 @@ import asyncio
 from bleak import BleakClient, BleakScanner
 import pyautogui
 
+from ble_reconnect import load_known_addresses, remember_address, Backoff, DIRECT_CONNECT_TIMEOUT
+
 GESTURE_CHAR_UUID = "24b077e2-a798-49ea-821f-824bd3998bde"
 
 gestures = ['4', '8', 'alpha', 'double', 'flick']
@@ -14,33 +16,59 @@ gesture_to_action = {
     "alpha": lambda: pyautogui.press("j"),   # 5 sec <<
 }
 
-async def run():
+def handle_notification(_, data):
+    gesture_idx = int.from_bytes(data, byteorder='little', signed=True)
+    if 0 <= gesture_idx < len(gestures):
+        gesture = gestures[gesture_idx]
+        print(f"Gesture received: {gesture} (index {gesture_idx})")
+        action = gesture_to_action.get(gesture)
+        if action:
+            action()
+        else:
+            print(f"No action mapped for gesture: {gesture}")
+    else:
+        print(f"Received invalid gesture index: {gesture_idx}")
+
+async def scan():
     print("Scanning for magic_wand...")
     device = await BleakScanner.find_device_by_name("magic_wand", timeout=10.0)
     if not device:
         print("magic_wand not found.")
-        return
-
-    async with BleakClient(device) as client:
-        print("Connected to magic_wand.")
-
-        def handle_notification(_, data):
-            gesture_idx = int.from_bytes(data, byteorder='little', signed=True)
-            if 0 <= gesture_idx < len(gestures):
-                gesture = gestures[gesture_idx]
-                print(f"Gesture received: {gesture} (index {gesture_idx})")
-                action = gesture_to_action.get(gesture)
-                if action:
-                    action()
-                else:
-                    print(f"No action mapped for gesture: {gesture}")
-            else:
-                print(f"Received invalid gesture index: {gesture_idx}")
-
-        await client.start_notify(GESTURE_CHAR_UUID, handle_notification)
-        print("Listening for gestures. Press Ctrl+C to stop.")
-        while True:
-            await asyncio.sleep(1)
+    return device
+
+async def run():
+    # zadnja poznata adresa se spaja direktno, skeniranje samo ako se ne javi
+    known = load_known_addresses()
+    target = known[0] if known else await scan()
+    connect_timeout = DIRECT_CONNECT_TIMEOUT if known else 10.0
+    backoff = Backoff()
+    loop = asyncio.get_running_loop()
+    while True:
+        if target is None:
+            target = await scan()
+            if target is None:
+                await asyncio.sleep(backoff.next())
+                continue
+        disconnected = asyncio.Event()
+        client = BleakClient(target, disconnected_callback=lambda c: loop.call_soon_threadsafe(disconnected.set),
+                             timeout=connect_timeout)
+        try:
+            async with client:
+                print(f"Connected to magic_wand ({client.address}).")
+                remember_address(client.address)
+                backoff.reset()
+                await client.start_notify(GESTURE_CHAR_UUID, handle_notification)
+                print("Listening for gestures. Press Ctrl+C to stop.")
+                await disconnected.wait()
+                print("Connection lost.")
+        except Exception as e:
+            print(f"Connection failed: {e!r}")
+            if known and target == known[0]:
+                # poznata adresa se ne javlja, dalje preko skeniranja
+                known, target, connect_timeout = [], None, 10.0
+        delay = backoff.next()
+        print(f"Reconnecting in {delay:.1f} s...")
+        await asyncio.sleep(delay)
 
 if __name__ == "__main__":
     asyncio.run(run())
\ No newline at end of file
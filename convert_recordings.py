@@ -0,0 +1,30 @@
+import os
+import glob
+import argparse
+
+from recording_store import convert_csv, export_csv, store_path, store_suffix
+
+data_dir = "gesture_data"
+
+parser = argparse.ArgumentParser(description="Convert CSV recordings to the .rec store (or back with --to-csv).")
+parser.add_argument('paths', nargs='*', help=f"files to convert (default: every CSV / .rec in {data_dir})")
+parser.add_argument('--to-csv', action='store_true', help="export .rec recordings back to CSV")
+parser.add_argument('--timestamp-unit', choices=['s', 'ms', 'us'], default=None,
+                    help="unit of the timestamp column (default: guessed from the sample interval)")
+args = parser.parse_args()
+
+if args.to_csv:
+    paths = args.paths or sorted(glob.glob(os.path.join(data_dir, f"*{store_suffix}")))
+    for rec_path in paths:
+        csv_path = os.path.splitext(store_path(rec_path))[0] + '.csv'
+        export_csv(rec_path, csv_path)
+        print(f"{rec_path} -> {csv_path}")
+else:
+    paths = args.paths or sorted(glob.glob(os.path.join(data_dir, "*.csv")))
+    for csv_path in paths:
+        try:
+            rec_path = convert_csv(csv_path, timestamp_unit=args.timestamp_unit)
+        except ValueError as e:
+            print(f"Skipping {csv_path}: {e}")
+            continue
+        print(f"{csv_path} -> {rec_path}")
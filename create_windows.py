@@ -1,11 +1,21 @@
 import os
 import csv
 import random
+import argparse
+import tempfile
 import numpy as np
 from collections import defaultdict # ne trazi provjeru kljuceva
 from collections import Counter
 import pandas as pd 
 
+from windowing import gesture_window_starts, take_windows, strided_windows, gyro_trigger_threshold, interval_index_bounds
+from recording_store import load_recording, recording_files
+from resample import recording_grid
+from window_cache import WindowCache, cache_dir_name
+from labeling import merge_intervals, in_intervals
+from recording_quality import bad_segments, report_file_name
+from parallel import add_jobs_argument, run_jobs
+
 data_dir = "gesture_data"
 
 label_list = ['double', 'flick', 'infinity', 'junk', 'kiss']
@@ -18,11 +28,15 @@ sensor_sample_rate = 88
 window_size_seconds = 3 
 window_size = int(window_size_seconds * sensor_sample_rate)
 junk_stride = int(1 * sensor_sample_rate) 
+max_injected_junk_samples = 312
 
 MAX_WINDOWS_PER_TRAIN_CLASS = 40 
 JUNK_MULTIPLIER = 1              
 
 test_win_per_class = 10          
+use_window_cache = True # prozori po gesti se spremaju u gesture_data/window_cache
+reject_bad_segments = False # --reject-bad-segments: izbaci prozore koji diraju lose segmente iz quality_report.json
+quality_report = os.path.join(data_dir, report_file_name) # pise ga sample_rate_test.py
 train_data = 'train_dataset.npz'
 test_data = 'test_dataset.npz'
 
@@ -36,6 +50,20 @@ def load_csv_as_dataframe(path, has_timestamp=True):
         df['label'] = df['label'].astype(int).astype(str)
     return df
 
+def load_recording_as_dataframe(base_path, has_timestamp=True):
+    """
+    Same frame as load_csv_as_dataframe, read from "<base_path>.rec" (falls back to "<base_path>.csv").
+    """
+    recording = load_recording(base_path)
+    df = recording.to_dataframe()
+    if has_timestamp and 'timestamp' in df.columns:
+        df['timestamp'] = recording.timestamps_in_seconds()
+    if 'label' in df.columns:
+        df['label'] = df['label'].astype(int).astype(str)
+    # (grid_start, rate) za resamplane snimke, intervali se onda mapiraju aritmetikom
+    df.attrs['grid'] = recording_grid(recording.header) if has_timestamp else None
+    return df
+
 def load_intervals(path):
     intervals = []
     try:
@@ -56,248 +84,355 @@ def load_intervals(path):
         return []
     return intervals
 
+def closest_sample_indices(timestamps, targets):
+    """
+    Position of the first sample closest to each target time, i.e. (ts - target).abs().idxmin() for all targets at once.
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    if len(timestamps) == 0 or len(targets) == 0:
+        return np.zeros(len(targets), dtype=np.int64)
+    if not np.all(np.diff(timestamps) >= 0):
+        return np.array([np.nanargmin(np.abs(timestamps - t)) for t in targets], dtype=np.int64)
+
+    right = np.minimum(np.searchsorted(timestamps, targets, side='left'), len(timestamps) - 1)
+    left = np.maximum(right - 1, 0)
+    closest = np.where(np.abs(timestamps[left] - targets) <= np.abs(timestamps[right] - targets), left, right)
+    # idxmin returns the first of several equal timestamps
+    return np.searchsorted(timestamps, timestamps[closest], side='left').astype(np.int64)
+
 def inject_junk_between_intervals(data_df_full, intervals, junk_label_str_val):
-    modified_rows = []
-    
-    intervals = sorted(intervals, key=lambda x: x['start_time'])
-
-    last_idx_processed_in_original_df = 0
-
-    for i in range(len(intervals)):
-        interval = intervals[i]
-        
-        interval_data_start_idx = data_df_full['timestamp'].searchsorted(interval['start_time'], side='left')
-        if interval_data_start_idx > last_idx_processed_in_original_df:
-            modified_rows.extend(data_df_full.iloc[last_idx_processed_in_original_df : interval_data_start_idx].to_dict('records'))
-
-        interval_data_end_idx = data_df_full['timestamp'].searchsorted(interval['end_time'], side='right') - 1
-        modified_rows.extend(data_df_full.iloc[interval_data_start_idx : interval_data_end_idx + 1].to_dict('records'))
-        
-        last_idx_processed_in_original_df = interval_data_end_idx + 1
-
-        if i < len(intervals) - 1:
-            next_interval = intervals[i+1]
-            
-            gap_duration_seconds = next_interval['start_time'] - interval['end_time']
-            
-            if gap_duration_seconds > 0:
-                mid_time_between = (interval['end_time'] + next_interval['start_time']) / 2
-                
-                closest_sample_idx = (data_df_full['timestamp'] - mid_time_between).abs().idxmin()
-                middle_junk_sample_data = data_df_full.iloc[closest_sample_idx].copy()
-                
-                num_samples_in_gap = int(gap_duration_seconds * sensor_sample_rate)
-                num_junk_samples_to_inject = min(num_samples_in_gap, 312)
-                
-                if num_junk_samples_to_inject > 0:
-                    injected_junk_rows = []
-                    current_junk_timestamp = interval['end_time'] + (1.0 / sensor_sample_rate) 
-                    
-                    for _ in range(num_junk_samples_to_inject):
-                        junk_row = middle_junk_sample_data.to_dict()
-                        junk_row['label'] = junk_label_str_val 
-                        junk_row['timestamp'] = current_junk_timestamp 
-                        injected_junk_rows.append(junk_row)
-                        current_junk_timestamp += (1.0 / sensor_sample_rate) 
-                        
-                    modified_rows.extend(injected_junk_rows)
-    
-    if last_idx_processed_in_original_df < len(data_df_full):
-        modified_rows.extend(data_df_full.iloc[last_idx_processed_in_original_df:].to_dict('records'))
-
-    df_modified = pd.DataFrame(modified_rows, columns=data_df_full.columns).reset_index(drop=True)
-    
+    """
+    After every interval but the last, inserts min(gap * sensor_sample_rate, max_injected_junk_samples) copies of the
+    sample closest to the middle of the gap, labeled as junk.
+    The output is described as segments of source row indices (step 1 for original rows, step 0 for a repeated junk
+    row) and every column is gathered with one take, instead of building a list of row dicts.
+    The injected rows are off the uniform grid, so the output gets attrs['grid'] = None and instead
+    attrs['interval_bounds'], the row bounds of the intervals (in the given order) in the output.
+    """
+    order = sorted(range(len(intervals)), key=lambda i: intervals[i]['start_time'])
+    intervals = [intervals[i] for i in order]
+    if not intervals:
+        return data_df_full.reset_index(drop=True)
+    timestamps = data_df_full['timestamp'].to_numpy(dtype=np.float64)
+    n = len(data_df_full)
+
+    starts = np.array([iv['start_time'] for iv in intervals], dtype=np.float64)
+    ends = np.array([iv['end_time'] for iv in intervals], dtype=np.float64)
+    start_idx, end_idx = interval_index_bounds(timestamps, intervals, grid=data_df_full.attrs.get('grid'))
+    last_idx = np.concatenate([[0], end_idx[:-1] + 1]).astype(np.int64)
+
+    gaps = starts[1:] - ends[:-1]
+    junk_counts = np.zeros(len(intervals), dtype=np.int64)
+    junk_counts[:-1] = np.where(gaps > 0, np.minimum((gaps * sensor_sample_rate).astype(np.int64), max_injected_junk_samples), 0)
+    junk_source = np.zeros(len(intervals), dtype=np.int64)
+    has_junk = junk_counts > 0
+    junk_source[has_junk] = closest_sample_indices(timestamps, ((ends[:-1] + starts[1:]) / 2)[has_junk[:-1]])
+
+    # per interval: rows since the previous interval, the interval's rows, the junk block
+    seg_src = np.stack([last_idx, start_idx, junk_source], axis=1).ravel()
+    seg_len = np.stack([np.maximum(start_idx - last_idx, 0), end_idx + 1 - start_idx, junk_counts], axis=1).ravel()
+    seg_step = np.tile([1, 1, 0], len(intervals))
+    tail_start = int(end_idx[-1] + 1)
+    seg_src = np.append(seg_src, tail_start)
+    seg_len = np.append(seg_len, max(n - tail_start, 0))
+    seg_step = np.append(seg_step, 1)
+
+    seg_len = np.maximum(seg_len, 0)
+    seg_of_row = np.repeat(np.arange(len(seg_len)), seg_len)
+    out_start = np.cumsum(seg_len) - seg_len
+    offset = np.arange(len(seg_of_row)) - out_start[seg_of_row]
+    source_rows = seg_src[seg_of_row] + seg_step[seg_of_row] * offset
+
+    df_modified = data_df_full.iloc[source_rows].reset_index(drop=True)
+    out_interval_start = out_start[1::3][:len(intervals)]
+    bounds = np.empty((2, len(intervals)), dtype=np.int64)
+    bounds[0, order] = out_interval_start
+    bounds[1, order] = out_interval_start + end_idx - start_idx
+    df_modified.attrs['grid'] = None
+    df_modified.attrs['interval_bounds'] = (bounds[0], bounds[1])
+
+    junk_rows = seg_step[seg_of_row] == 0
+    if junk_rows.any():
+        # junk timestamps continue from the interval end in 1 / sensor_sample_rate steps, accumulated like a running clock
+        step = 1.0 / sensor_sample_rate
+        junk_timestamps = np.concatenate([np.add.accumulate(np.concatenate([[end + step], np.full(count - 1, step)]))
+                                          for end, count in zip(ends[has_junk], junk_counts[has_junk])])
+        new_timestamps = df_modified['timestamp'].to_numpy(dtype=np.float64, copy=True)
+        new_timestamps[junk_rows] = junk_timestamps
+        df_modified['timestamp'] = new_timestamps
+        df_modified.loc[junk_rows, 'label'] = junk_label_str_val
+
     return df_modified
 
-def extract_gesture_windows(data_df_full, intervals, gesture_name_str):
-    windows = []
-    labels = []
-    
+def windows_outside_segments(timestamps, window_starts, segments):
+    """
+    The window starts whose window_size rows have no timestamp inside any (start_time, end_time) segment.
+    """
+    window_starts = np.asarray(window_starts, dtype=np.int64)
+    if not segments or len(window_starts) == 0:
+        return window_starts
+    starts, ends = merge_intervals([seg[0] for seg in segments], [seg[1] for seg in segments])
+    bad_before = np.concatenate([[0], np.cumsum(in_intervals(timestamps, starts, ends))])
+    return window_starts[bad_before[window_starts + window_size] == bad_before[window_starts]]
+
+def extract_gesture_windows(data_df_full, intervals, gesture_name_str, rejected_segments=None):
     if gesture_name_str not in label_map:
         print(f"Warning: Gesture '{gesture_name_str}' not found in label_map. Skipping.")
         return [], []
 
+    if not all(col in data_df_full.columns for col in sensor_cols):
+        print(f"Warning: Missing sensor columns for {gesture_name_str}. Skipping its windows.")
+        return [], []
+
     intended_gesture_label_str = str(label_map[gesture_name_str])
-    
-    for interval in intervals: 
-        interval_start_t = interval['start_time']
-        interval_end_t = interval['end_time']
-        
-        interval_data_start_idx = data_df_full['timestamp'].searchsorted(interval_start_t, side='left')
-        interval_data_end_idx = data_df_full['timestamp'].searchsorted(interval_end_t, side='right') - 1
-
-        if interval_data_start_idx >= len(data_df_full) or interval_data_start_idx > interval_data_end_idx:
-            continue
-        
-        trigger_found_at_idx = -1
-        
-        for idx_in_full_df in range(interval_data_start_idx, interval_data_end_idx + 1):
-            if data_df_full.iloc[idx_in_full_df]['label'] == intended_gesture_label_str:
-                gx, gy, gz = data_df_full.iloc[idx_in_full_df]['gx'], data_df_full.iloc[idx_in_full_df]['gy'], data_df_full.iloc[idx_in_full_df]['gz']
-                
-                if abs(gx) >= 1.0 or abs(gy) >= 1.0 or abs(gz) >= 1.0:
-                    trigger_found_at_idx = idx_in_full_df
-                    break
-
-        if trigger_found_at_idx != -1:
-            window_start_idx = trigger_found_at_idx
-            window_end_idx = window_start_idx + window_size - 1
-
-            if window_end_idx < len(data_df_full):
-                window_df = data_df_full.loc[data_df_full.index[window_start_idx] : data_df_full.index[window_end_idx]].copy()
-                
-                if len(window_df) != window_size:
-                    continue 
-
-                final_cleaned_window_df = window_df
-
-                if not all(col in final_cleaned_window_df.columns for col in sensor_cols):
-                    print(f"Warning: Missing sensor columns in window for {gesture_name_str}. Skipping this window.")
-                    continue
-                
-                features = final_cleaned_window_df[sensor_cols].astype(np.float32).values.tolist()
-                
-                windows.append(features)
-                labels.append(label_map[gesture_name_str]) 
-        
+
+    features = data_df_full[sensor_cols].to_numpy(dtype=np.float32)
+    window_starts = gesture_window_starts(
+        data_df_full['timestamp'].to_numpy(),
+        data_df_full[['gx', 'gy', 'gz']].to_numpy(),
+        intervals,
+        window_size,
+        valid=(data_df_full['label'] == intended_gesture_label_str).to_numpy(),
+        grid=data_df_full.attrs.get('grid'),
+        bounds=data_df_full.attrs.get('interval_bounds'),
+    )
+    if rejected_segments:
+        kept_starts = windows_outside_segments(data_df_full['timestamp'].to_numpy(), window_starts, rejected_segments)
+        print(f"'{gesture_name_str}': {len(window_starts) - len(kept_starts)} windows overlap bad segments, dropped.")
+        window_starts = kept_starts
+
+    windows = take_windows(features, window_starts, window_size)
+    labels = [label_map[gesture_name_str]] * len(windows)
+
     return windows, labels
 
 
-def extract_junk_windows(data_df_junk):
-    windows = []
-    labels = []
-    
-    junk_label_idx_val = label_map['junk']
+def extract_junk_windows(data_df_junk, materialize=False):
+    """
+    Junk windows every junk_stride samples, as strided views over one float32 buffer
+    unless materialize=True.
+    """
+    if not all(col in data_df_junk.columns for col in sensor_cols):
+        print(f"Warning: Missing sensor columns in junk data. Skipping junk windows.")
+        return [], []
+
+    features = data_df_junk[sensor_cols].to_numpy(dtype=np.float32)
+    windows = strided_windows(features, window_size, junk_stride, materialize=materialize)
+    labels = [label_map['junk']] * len(windows)
 
-    n = len(data_df_junk)
-    
-    effective_stride = int(1 * sensor_sample_rate) 
+    return windows, labels
 
-    for start_idx in range(0, n - window_size + 1, effective_stride):
-        window_df = data_df_junk.iloc[start_idx : start_idx + window_size]
-        
-        if len(window_df) != window_size:
+def split_dataset(all_windows, all_labels):
+    """
+    Takes test_win_per_class windows of every class for the test set and resamples the rest
+    to MAX_WINDOWS_PER_TRAIN_CLASS per class for the train set.
+    """
+    print("\n🧩 Extracted windows per gesture (raw counts):")
+    for g in all_windows:
+        print(f"{g}: {len(all_windows[g])}")
+
+    testing_data = []
+    testing_labels = []
+    training_data = []
+    training_labels = []
+
+    for label_name in label_list: 
+        if label_name not in all_windows: 
+            print(f"Warning: No data found for '{label_name}' to create test set. This class will be empty in test set.")
             continue
+        items = list(zip(all_windows[label_name], all_labels[label_name]))
+        random.shuffle(items)
+
+        actual_test_count = min(test_win_per_class, len(items))
+
+        test_items = items[:actual_test_count]
+        for win, lab in test_items:
+            testing_data.append(win)
+            testing_labels.append(lab)
 
-        if not all(col in window_df.columns for col in sensor_cols):
-            print(f"Warning: Missing sensor columns in junk window. Skipping this window.")
+        remaining_items = items[actual_test_count:]
+        all_windows[label_name] = [x[0] for x in remaining_items]
+        all_labels[label_name] = [x[1] for x in remaining_items]
+
+
+    for gesture in gesture_names: 
+        if gesture not in all_windows:
+            print(f"Warning: No data found for '{gesture}' to create train set. This class will be empty in train set.")
             continue
+        items = list(zip(all_windows[gesture], all_labels[gesture]))
+        if len(items) < MAX_WINDOWS_PER_TRAIN_CLASS:
+            items = items + random.choices(items, k=MAX_WINDOWS_PER_TRAIN_CLASS - len(items))
+        else:
+            items = random.sample(items, MAX_WINDOWS_PER_TRAIN_CLASS)
+        for win, lab in items:
+            training_data.append(win)
+            training_labels.append(lab)
+
+    junk_items = list(zip(all_windows['junk'], all_labels['junk']))
+    target_junk_count = int(MAX_WINDOWS_PER_TRAIN_CLASS * JUNK_MULTIPLIER)
+    if len(junk_items) > target_junk_count:
+        junk_items = random.sample(junk_items, target_junk_count)
+    elif len(junk_items) < target_junk_count:
+        junk_items = junk_items + random.choices(junk_items, k=target_junk_count - len(junk_items))
+    for win, lab in junk_items:
+        training_data.append(win)
+        training_labels.append(lab)
 
-        features = window_df[sensor_cols].astype(np.float32).values.tolist()
-        windows.append(features)
-        labels.append(junk_label_idx_val)
-        
-    return windows, labels
 
-all_windows = defaultdict(list)
-all_labels = defaultdict(list)
+    combined = list(zip(training_data, training_labels))
+    random.shuffle(combined)
+    training_data, training_labels = zip(*combined)
 
-for gesture in gesture_names:
-    final_csv_path = os.path.join(data_dir, f"{gesture}_final.csv")
-    intervals_txt_path = os.path.join(data_dir, f"{gesture}_intervals.txt")
+    X_train = np.array(training_data, dtype=np.float32)
+    y_train = np.array(training_labels)
+    X_test = np.array(testing_data, dtype=np.float32)
+    y_test = np.array(testing_labels)
+
+    return X_train, y_train, X_test, y_test
+
+
+def save_dataset(X_train, y_train, X_test, y_test):
+    np.savez(train_data, X=X_train, y=y_train)
+    np.savez(test_data, X=X_test, y=y_test)
+
+    print("✅ window processing complete.")
+    print(f"🧪 train samples: {len(X_train)}")
+    print(f"🔬 test samples: {len(X_test)}")
+    print("📊 train windows by class:")
+    print(Counter(y_train))
+    print("📊 test windows by class:")
+    print(Counter(y_test))
+
+
+def window_params(name, rejected_segments=None):
+    """
+    Everything besides the input files that the windows of one gesture (or junk) depend on; part of the cache key.
+    """
+    params = {'name': name, 'label': label_map[name], 'window_size': window_size, 'junk_stride': junk_stride,
+              'gyro_trigger_threshold': gyro_trigger_threshold, 'sensor_sample_rate': sensor_sample_rate,
+              'max_injected_junk_samples': max_injected_junk_samples}
+    if rejected_segments:
+        params['rejected_segments'] = [list(seg) for seg in rejected_segments]
+    return params
+
+
+def window_array(windows):
+    if len(windows) == 0:
+        return np.empty((0, window_size, len(sensor_cols)), dtype=np.float32)
+    return np.asarray(windows, dtype=np.float32)
+
+
+def gesture_windows_from_files(gesture, final_base_path, intervals_txt_path, rejected_segments=None):
+    data_df_full = load_recording_as_dataframe(final_base_path, has_timestamp=True)
+    intervals = load_intervals(intervals_txt_path)
+    df_modified_with_injected_junk = inject_junk_between_intervals(data_df_full, intervals, str(junk_label_idx))
+    windows, _ = extract_gesture_windows(df_modified_with_injected_junk, intervals, gesture, rejected_segments)
+    return window_array(windows)
 
-    try:
-        data_df_full = load_csv_as_dataframe(final_csv_path, has_timestamp=True)
-        intervals = load_intervals(intervals_txt_path)
-        
-        df_modified_with_injected_junk = inject_junk_between_intervals(data_df_full, intervals, str(junk_label_idx))
 
-        windows, labels = extract_gesture_windows(
-            df_modified_with_injected_junk, intervals, gesture
-        )
-        
-        all_windows[gesture].extend(windows)
-        all_labels[gesture].extend(labels)
+def junk_windows_from_file(junk_final_base_path):
+    junk_data_df = load_recording_as_dataframe(junk_final_base_path, has_timestamp=False)
+    windows, _ = extract_junk_windows(junk_data_df)
+    return window_array(windows)
 
-        print(f"Processed {len(windows)} windows for gesture '{gesture}'.")
 
+def class_input_paths(name):
+    if name == 'junk':
+        return recording_files(os.path.join(data_dir, "junk_final"))
+    return recording_files(os.path.join(data_dir, f"{name}_final")) + [os.path.join(data_dir, f"{name}_intervals.txt")]
+
+
+def extract_class_windows(name, rejected_segments=None):
+    if name == 'junk':
+        return junk_windows_from_file(os.path.join(data_dir, "junk_final"))
+    return gesture_windows_from_files(name, os.path.join(data_dir, f"{name}_final"), os.path.join(data_dir, f"{name}_intervals.txt"),
+                                      rejected_segments)
+
+
+def class_bad_segments(name, report_path=quality_report):
+    """
+    Bad segments of a gesture's <name>_labeled recording (same timestamps as _final) in the quality report.
+    Junk has no timestamps and never has any.
+    """
+    if name == 'junk':
+        return []
+    return bad_segments(report_path, f"{name}_labeled")
+
+
+def class_windows_job(name, cache_dir, rejected_segments=None):
+    """
+    Windows of one class (a gesture or 'junk'), taken from the cache in cache_dir or extracted and stored there.
+    Runs in a worker process with --jobs, so it returns (path of the .npy, cache hit, error) and the array
+    itself is never pickled. error is 'missing' for missing input files.
+    """
+    try:
+        path, hit = WindowCache(cache_dir, max_bytes=None).ensure(
+            class_input_paths(name), window_params(name, rejected_segments),
+            lambda: extract_class_windows(name, rejected_segments))
+        return path, hit, None
     except FileNotFoundError:
-        print(f"Error: Missing files for '{gesture}' gesture. Ensure '{final_csv_path}' and '{intervals_txt_path}' exist. Skipping.")
+        return None, False, 'missing'
     except Exception as e:
-        print(f"Error processing '{gesture}' gesture data: {e}. Skipping this gesture.")
-
-
-junk_final_csv_path = os.path.join(data_dir, "junk_final.csv") 
-try:
-    junk_data_df = load_csv_as_dataframe(junk_final_csv_path, has_timestamp=False)
-    junk_windows, junk_labels = extract_junk_windows(junk_data_df)
-    all_windows['junk'].extend(junk_windows)
-    all_labels['junk'].extend(junk_labels)
-    print(f"Processed {len(junk_windows)} windows for 'junk'.")
-except FileNotFoundError:
-    print(f"Error: Missing junk data file at '{junk_final_csv_path}'. No junk windows will be included.")
-except Exception as e:
-    print(f"Error processing junk data: {e}. Skipping junk data.")
-
-
-print("\n🧩 Extracted windows per gesture (raw counts):")
-for g in all_windows:
-    print(f"{g}: {len(all_windows[g])}")
-
-testing_data = []
-testing_labels = []
-training_data = []
-training_labels = []
-
-for label_name in label_list: 
-    if label_name not in all_windows: 
-        print(f"Warning: No data found for '{label_name}' to create test set. This class will be empty in test set.")
-        continue
-    items = list(zip(all_windows[label_name], all_labels[label_name]))
-    random.shuffle(items)
-    
-    actual_test_count = min(test_win_per_class, len(items))
-    
-    test_items = items[:actual_test_count]
-    for win, lab in test_items:
-        testing_data.append(win)
-        testing_labels.append(lab)
-    
-    remaining_items = items[actual_test_count:]
-    all_windows[label_name] = [x[0] for x in remaining_items]
-    all_labels[label_name] = [x[1] for x in remaining_items]
-
-
-for gesture in gesture_names: 
-    if gesture not in all_windows:
-        print(f"Warning: No data found for '{gesture}' to create train set. This class will be empty in train set.")
-        continue
-    items = list(zip(all_windows[gesture], all_labels[gesture]))
-    if len(items) < MAX_WINDOWS_PER_TRAIN_CLASS:
-        items = items + random.choices(items, k=MAX_WINDOWS_PER_TRAIN_CLASS - len(items))
-    else:
-        items = random.sample(items, MAX_WINDOWS_PER_TRAIN_CLASS)
-    for win, lab in items:
-        training_data.append(win)
-        training_labels.append(lab)
-
-junk_items = list(zip(all_windows['junk'], all_labels['junk']))
-target_junk_count = int(MAX_WINDOWS_PER_TRAIN_CLASS * JUNK_MULTIPLIER)
-if len(junk_items) > target_junk_count:
-    junk_items = random.sample(junk_items, target_junk_count)
-elif len(junk_items) < target_junk_count:
-    junk_items = junk_items + random.choices(junk_items, k=target_junk_count - len(junk_items))
-for win, lab in junk_items:
-    training_data.append(win)
-    training_labels.append(lab)
-
-
-combined = list(zip(training_data, training_labels))
-random.shuffle(combined)
-training_data, training_labels = zip(*combined)
-
-X_train = np.array(training_data, dtype=np.float32)
-y_train = np.array(training_labels)
-X_test = np.array(testing_data, dtype=np.float32)
-y_test = np.array(testing_labels)
-
-np.savez(train_data, X=X_train, y=y_train)
-np.savez(test_data, X=X_test, y=y_test)
-
-print("✅ window processing complete.")
-print(f"🧪 train samples: {len(X_train)}")
-print(f"🔬 test samples: {len(X_test)}")
-print("📊 train windows by class:")
-print(Counter(y_train))
-print("📊 test windows by class:")
-print(Counter(y_test))
\ No newline at end of file
+        return None, False, str(e)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cut the *_final recordings into windows and save the train/test npz files.")
+    parser.add_argument('--seed', type=int, default=None, help="seed for the train/test split")
+    parser.add_argument('--reject-bad-segments', action='store_true', default=reject_bad_segments,
+                        help=f"drop gesture windows that overlap a segment marked bad in {quality_report} (sample_rate_test.py)")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    rejected = {}
+    if args.reject_bad_segments:
+        try:
+            rejected = {name: class_bad_segments(name) for name in gesture_names}
+        except FileNotFoundError:
+            print(f"Error: {quality_report} not found, run sample_rate_test.py first.")
+            exit(1)
+        for name, segments in rejected.items():
+            if segments:
+                print(f"'{name}': rejecting windows in {len(segments)} bad segment(s).")
+
+    all_windows = defaultdict(list)
+    all_labels = defaultdict(list)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # bez cachea radnici pisu prozore u privremeni direktorij
+        cache_dir = os.path.join(data_dir, cache_dir_name) if use_window_cache else tmp_dir
+        class_names = gesture_names + ['junk']
+        results = run_jobs(class_windows_job, [(name, cache_dir, rejected.get(name)) for name in class_names], args.jobs)
+
+        for name, (path, hit, error) in zip(class_names, results):
+            final_base_path = os.path.join(data_dir, f"{name}_final")
+            if name == 'junk':
+                if error == 'missing':
+                    print(f"Error: Missing junk data file at '{final_base_path}' (.rec or .csv). No junk windows will be included.")
+                elif error is not None:
+                    print(f"Error processing junk data: {error}. Skipping junk data.")
+            elif error == 'missing':
+                intervals_txt_path = os.path.join(data_dir, f"{name}_intervals.txt")
+                print(f"Error: Missing files for '{name}' gesture. Ensure '{final_base_path}' (.rec or .csv) and '{intervals_txt_path}' exist. Skipping.")
+            elif error is not None:
+                print(f"Error processing '{name}' gesture data: {error}. Skipping this gesture.")
+            if error is not None:
+                continue
+
+            windows = np.load(path, mmap_mode='r' if use_window_cache else None)
+            all_windows[name].extend(windows)
+            all_labels[name].extend([label_map[name]] * len(windows))
+
+            if name == 'junk':
+                print(f"Processed {len(windows)} windows for 'junk'{' (cached)' if hit else ''}.")
+            else:
+                print(f"Processed {len(windows)} windows for gesture '{name}'{' (cached)' if hit else ''}.")
+
+        if use_window_cache:
+            WindowCache(cache_dir).evict(keep={path for path, _, _ in results})
+
+        X_train, y_train, X_test, y_test = split_dataset(all_windows, all_labels)
+    save_dataset(X_train, y_train, X_test, y_test)
@@ -1,27 +1,48 @@
 import os
-import pandas as pd
+import argparse
+import numpy as np
+
+from recording_store import load_recording, write_recording, store_path, unlabeled
+from parallel import add_jobs_argument, run_jobs
 
 DATA_FOLDER = "gesture_data"
 
 labels = ['double', 'flick', 'infinity', 'junk', 'kiss']
 label_map = {label: idx for idx, label in enumerate(labels)}
 
-for label in labels:
-    in_name = f"{label}_normalized.csv"
-    out_name = f"{label}_final.csv"
-    in_path = os.path.join(DATA_FOLDER, in_name)
-    out_path = os.path.join(DATA_FOLDER, out_name)
 
-    if not os.path.isfile(in_path):
-        print(f"File not found: {in_path}")
-        continue
+def enumerate_recording(label):
+    """
+    Writes <label>_final.rec from <label>_normalized; returns the lines to print, so the output
+    keeps the label order when several workers run.
+    """
+    in_base = os.path.join(DATA_FOLDER, f"{label}_normalized")
+    out_base = os.path.join(DATA_FOLDER, f"{label}_final")
+
+    try:
+        recording = load_recording(in_base)
+    except FileNotFoundError as e:
+        return [f"File not found: {e}"]
+
+    messages = []
+    # the store already keeps labels as codes, so this only re-maps them to the training label order
+    remap = np.array([label_map.get(name, unlabeled) for name in recording.label_names] + [unlabeled], dtype=np.int8)
+    final_labels = remap[recording.labels]
+
+    if (final_labels == unlabeled).any():
+        messages.append(f"Warning: Some labels in {in_base} were not recognized and became {unlabeled}")
 
-    df = pd.read_csv(in_path)
+    header = dict(recording.header, label_names=labels)
+    write_recording(out_base, recording.samples, recording.timestamps, final_labels, **header)
+    messages.append(f"Finsihed: {store_path(out_base)}")
+    return messages
 
-    df['label'] = df['label'].map(label_map)
 
-    if df['label'].isnull().any():
-        print(f"Warning: Some labels in {in_name} were not recognized and became NaN")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-map the normalized recordings' labels to the training label order.")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
 
-    df.to_csv(out_path, index=False)
-    print(f"Finsihed: {out_name}")
\ No newline at end of file
+    for messages in run_jobs(enumerate_recording, [(label,) for label in labels], args.jobs):
+        for message in messages:
+            print(message)
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+import argparse
+import numpy as np
+
+from recording_store import load_recording
+from resample import add_stage_argument, stage_rate
+from host_inference import (encode_raw_samples, decode_raw_samples, load_interpreter, StreamingClassifier,
+                            RAW_IMU_CHAR_UUID, DEFAULT_STRIDE, MAX_BATCH)
+
+# A stand-in for BleakClient that replays a recording as the wand's RAW_IMU notifications, so host-side
+# inference (and magic_wand.py itself, via MAGIC_WAND_REPLAY) can be run and tested without the board:
+#
+#   MAGIC_WAND_REPLAY=gesture_data/novi_raw_data python magic_wand.py
+#   python fake_wand.py novi_raw_data --speed 0    # predictions only, no GUI
+#
+# A model trained with --stage resampled needs the same stage here (magic_wand.py: MAGIC_WAND_STAGE=resampled).
+#
+# With --speed 0 the classifier runs lossless: the replay waits for the worker instead of skipping
+# windows, so every window is evaluated and repeated runs print the same predictions.
+#
+# Only the calls GestureApp makes are implemented. Notifications for any other characteristic are never
+# sent, like a wand flashed with STREAM_RAW_IMU 1.
+
+data_dir = "gesture_data"
+default_recording = "novi_raw_data"
+default_model = "model_quantized.tflite"
+gesture_names = ['double', 'flick', 'infinity', 'junk', 'kiss']
+
+
+class FakeWandClient:
+    """
+    speed 0 sends everything as fast as the event loop allows; samples_per_notification > 1 packs
+    several RawSamples into one notification like a larger BLE MTU would.
+    """
+
+    def __init__(self, recording, raw_char_uuid=RAW_IMU_CHAR_UUID, speed=1.0, samples_per_notification=1,
+                 disconnected_callback=None, address=None):
+        timestamps = recording.timestamps_in_seconds() if recording.timestamps is not None \
+            else np.arange(len(recording)) / recording.sample_rate
+        self.times = timestamps - timestamps[0]
+        self.timestamps_ms = np.round(timestamps * 1000).astype(np.int64)
+        self.samples = np.asarray(recording.samples, dtype=np.float32)
+        self.raw_char_uuid = raw_char_uuid
+        self.speed = speed
+        self.samples_per_notification = samples_per_notification
+        self.address = address or "fake:" + str(id(self))
+        self.disconnected_callback = disconnected_callback
+        self.is_connected = False
+        self.sent_samples = 0
+        self.replay_task = None
+        self.finished = asyncio.Event()
+
+    @classmethod
+    def from_path(cls, base_path, raw_char_uuid=RAW_IMU_CHAR_UUID, **kwargs):
+        if not os.path.dirname(base_path):
+            base_path = os.path.join(data_dir, base_path)
+        kwargs.setdefault('address', "fake:" + os.path.basename(base_path))
+        return cls(load_recording(base_path), raw_char_uuid, **kwargs)
+
+    async def connect(self):
+        self.is_connected = True
+        return True
+
+    async def disconnect(self):
+        await self.stop_notify(self.raw_char_uuid)
+        if self.is_connected and self.disconnected_callback is not None:
+            self.disconnected_callback(self)
+        self.is_connected = False
+        return True
+
+    async def start_notify(self, uuid, callback):
+        if uuid == self.raw_char_uuid:
+            self.replay_task = asyncio.get_running_loop().create_task(self.replay(callback))
+
+    async def stop_notify(self, uuid):
+        if uuid == self.raw_char_uuid and self.replay_task is not None:
+            self.replay_task.cancel()
+            try:
+                await self.replay_task
+            except asyncio.CancelledError:
+                pass
+            self.replay_task = None
+
+    async def replay(self, callback):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        step = self.samples_per_notification
+        for i in range(0, len(self.samples), step):
+            j = min(i + step, len(self.samples))
+            if self.speed > 0:
+                delay = self.times[j - 1] / self.speed - (loop.time() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)
+            callback(self.raw_char_uuid, bytearray(encode_raw_samples(self.timestamps_ms[i:j], self.samples[i:j])))
+            self.sent_samples = j
+        self.finished.set()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.disconnect()
+
+
+async def replay_predictions(client, classifier):
+    await client.connect()
+    await client.start_notify(client.raw_char_uuid, lambda _, data: classifier.push(*decode_raw_samples(data)))
+    await client.finished.wait()
+    await client.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recording through host-side inference as if the wand streamed it.")
+    parser.add_argument('recording', nargs='?', default=default_recording,
+                        help=f"recording name in {data_dir} (.rec or .csv, default: {default_recording})")
+    parser.add_argument('--model', default=default_model)
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed factor, 0 = as fast as possible")
+    parser.add_argument('--stride', type=int, default=DEFAULT_STRIDE, help="samples between evaluated windows")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help="most windows run in one invoke()")
+    parser.add_argument('--samples-per-notification', type=int, default=1)
+    add_stage_argument(parser) # kao normalize_data.py / pipeline.py za model koji se testira
+    args = parser.parse_args()
+
+    def on_prediction(gesture_idx, score, board_ms, received):
+        print(f"{board_ms / 1000.0:9.3f} s  {gesture_names[gesture_idx]:<9} {score:.2f}")
+
+    client = FakeWandClient.from_path(args.recording, speed=args.speed,
+                                      samples_per_notification=args.samples_per_notification)
+    classifier = StreamingClassifier(load_interpreter(args.model), on_prediction, stride=args.stride, max_batch=args.max_batch,
+                                     lossless=args.speed == 0, resample_rate=stage_rate(args.stage))
+    with classifier:
+        asyncio.run(replay_predictions(client, classifier))
+        # pricekaj da worker obradi zadnje prozore
+        while classifier.due() and classifier.running:
+            time.sleep(0.01)
+    print(classifier.status())
@@ -10,6 +10,9 @@
 #define WINDOW_SIZE ((int)(3 * SENSOR_SAMPLE_RATE_HZ))
 #define NUM_FEATURES 6
 #define DEBOUNCE_MS 5000 
+// 1: no inference on the board, every raw sample goes to the host over BLE_RAW_CHAR_UUID
+// (magic_wand.py with "Run the model on this PC"). Needs an ATT MTU of at least 31 bytes.
+#define STREAM_RAW_IMU 0
 
 const char* BLE_DEVICE_NAME = "magic_wand";
 const char* BLE_SERVICE_UUID = "0d431e22-b9ed-4938-b8fe-fe47311b469b";
@@ -17,6 +20,18 @@ const char* BLE_CHAR_UUID    = "24b077e2-a798-49ea-821f-824bd3998bde";
 BLEService gestureService(BLE_SERVICE_UUID);
 BLECharacteristic gestureChar(BLE_CHAR_UUID, BLERead | BLENotify, 1);
 
+#if STREAM_RAW_IMU
+const char* BLE_RAW_CHAR_UUID = "8e6f3a44-2b1c-4d0e-9a57-3c1b7f2e6d90";
+
+// RAW_SAMPLE_DTYPE u host_inference.py
+struct __attribute__((packed)) RawSample {
+  uint32_t timestamp;
+  float values[6];
+};
+RawSample rawSample;
+BLECharacteristic rawChar(BLE_RAW_CHAR_UUID, BLENotify, sizeof(RawSample));
+#endif
+
 const float means[6] = {0.157700, -0.303717, 0.655390, 1.477335, -2.782316, -7.167620};
 const float stds[6] = {0.314980, 0.295075, 0.531993, 98.251744, 59.885257, 32.191821};
 
@@ -54,6 +69,9 @@ void setup() {
   BLE.setLocalName(BLE_DEVICE_NAME);
   BLE.setAdvertisedService(gestureService);
   gestureService.addCharacteristic(gestureChar);
+#if STREAM_RAW_IMU
+  gestureService.addCharacteristic(rawChar);
+#endif
   BLE.addService(gestureService);
   BLE.advertise();
   //Serial.println("BLE device ready, advertising...");
@@ -101,6 +119,15 @@ void loop() {
           IMU.readGyroscope(gx, gy, gz);
 
           float raw_vals[6] = {ax, ay, az, gx, gy, gz};
+
+#if STREAM_RAW_IMU
+          rawSample.timestamp = now;
+          memcpy(rawSample.values, raw_vals, sizeof(raw_vals));
+          rawChar.writeValue((uint8_t*)&rawSample, sizeof(rawSample));
+          lastSampleTime = now;
+          continue;
+#endif
+
           float norm_vals[6];
           for (int i = 0; i < 6; i++) {
             norm_vals[i] = (raw_vals[i] - means[i]) / stds[i];
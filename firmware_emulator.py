@@ -0,0 +1,222 @@
+import os
+import time
+import argparse
+import numpy as np
+
+from recording_store import load_recording, timestamp_units
+from windowing import sliding_windows
+from host_inference import WINDOW_SIZE, MEANS, STDS, JUNK_INDEX, COOLDOWN_MS, load_interpreter
+from batch_inference import BatchEvaluator, EVAL_BATCH_SIZE
+
+# Replays recordings through the detection loop of final/final.ino, so trigger and debounce settings can
+# be tried on hours of data before flashing:
+#
+#   python firmware_emulator.py novi_raw_data
+#   python firmware_emulator.py novi_raw_data kiss_raw_data --debounce-ms 3000 --threshold 1.5
+#   python firmware_emulator.py novi_raw_data --check      # compare with the sample-by-sample port of loop()
+#
+# Every recorded sample is taken as one sample the board read (the recordings come from the same IMU
+# loop); board time is the sample timestamp in whole milliseconds, like millis(). Per connection the
+# firmware does, in float32 like the board:
+#   - normalize (raw - means) / stds
+#   - while idle, start a window at the first sample with |gx|, |gy| or |gz| > threshold (that sample
+#     is the window's first)
+#   - after WINDOW_SIZE samples, Invoke() if now - lastGestureTime > DEBOUNCE_MS (unsigned, lastGestureTime
+#     starts at 0), report a non-junk argmax and reset lastGestureTime to now
+#   - re-arm at the next sample, whether the window was invoked or skipped by the debounce
+# The quantization is static_cast<int8_t>(round(x / scale) + zero_point), without clipping
+# (batch_inference rounding 'firmware'). Invoke() is assumed to take no board time.
+#
+# The trigger chain is walked with one searchsorted per window over the precomputed trigger samples, and
+# all complete windows are run through the model as batches; only the debounce is a loop over windows.
+# emulate_per_sample() is the slow reference for --check: loop() ported line by line, one Invoke() at a time.
+
+DATA_DIR = "gesture_data"
+DEFAULT_MODEL = "model_quantized.tflite"
+TRIGGER_THRESHOLD = 1.0
+DEBOUNCE_MS = COOLDOWN_MS
+GESTURE_NAMES = ['double', 'flick', 'infinity', 'junk', 'kiss']
+
+
+def board_millis(recording):
+    """
+    Sample timestamps as millis(), or sample index / sample rate if the recording has none.
+    """
+    if recording.timestamps is None:
+        return (np.arange(len(recording)) * 1000) // recording.sample_rate
+    per_second = timestamp_units[recording.header['timestamp_unit']]
+    return np.asarray(recording.timestamps, dtype=np.int64) * 1000 // per_second
+
+
+def normalize(samples, means=MEANS, stds=STDS):
+    return (np.asarray(samples, dtype=np.float32) - means) / stds
+
+
+def window_starts(normalized, threshold=TRIGGER_THRESHOLD, window_size=WINDOW_SIZE):
+    """
+    First sample of every window the firmware records: a trigger sample, with the search for the next
+    trigger starting right after the previous window. Windows cut off by the end are not returned.
+    """
+    triggers = np.flatnonzero((np.abs(normalized[:, 3:6]) > threshold).any(axis=1))
+    last_start = len(normalized) - window_size
+    starts = []
+    j = 0
+    while j < len(triggers) and triggers[j] <= last_start:
+        start = triggers[j]
+        starts.append(start)
+        j = np.searchsorted(triggers, start + window_size, side='left')
+    return np.array(starts, dtype=np.int64)
+
+
+def emulate(recording, evaluator, threshold=TRIGGER_THRESHOLD, debounce_ms=DEBOUNCE_MS):
+    """
+    One connection over the whole recording. Returns a dict with the detections
+    (gesture index, trigger ms, detection ms, score) and the window / invocation counts.
+    """
+    millis = board_millis(recording)
+    normalized = normalize(recording.samples)
+    starts = window_starts(normalized, threshold)
+    ends = starts + WINDOW_SIZE - 1
+    windows = np.take(sliding_windows(normalized, WINDOW_SIZE), starts, axis=0)
+
+    outputs = evaluator.run(windows)
+    predicted = np.argmax(outputs, axis=1)
+    scores = evaluator.dequantize(outputs[np.arange(len(outputs)), predicted].astype(np.float32))
+
+    detections = []
+    invocations = 0
+    last_gesture_ms = 0
+    for k, end in enumerate(ends):
+        now = int(millis[end])
+        if (now - last_gesture_ms) & 0xFFFFFFFF <= debounce_ms:
+            continue
+        invocations += 1
+        if predicted[k] != JUNK_INDEX:
+            detections.append((int(predicted[k]), int(millis[starts[k]]), now, float(scores[k])))
+            last_gesture_ms = now
+
+    duration_ms = int(millis[-1] - millis[0]) if len(millis) else 0
+    return {
+        'samples': len(normalized),
+        'duration_ms': duration_ms,
+        'windows': len(starts),
+        'invocations': invocations,
+        'invocations_per_minute': invocations / (duration_ms / 60000.0) if duration_ms else 0.0,
+        'detections': detections,
+    }
+
+
+def emulate_per_sample(recording, evaluator, threshold=TRIGGER_THRESHOLD, debounce_ms=DEBOUNCE_MS):
+    """
+    loop() of final.ino for every sample in turn, with one predict_per_window() per Invoke().
+    Returns the same dict as emulate().
+    """
+    millis = board_millis(recording)
+    sensor_buffer = np.zeros((WINDOW_SIZE, len(MEANS)), dtype=np.float32)
+    buffer_index = 0
+    is_recording_window = False
+    last_gesture_ms = 0
+    trigger_ms = None
+    windows = 0
+    invocations = 0
+    detections = []
+
+    for i, raw_vals in enumerate(np.asarray(recording.samples, dtype=np.float32)):
+        now = int(millis[i])
+        norm_vals = (raw_vals - MEANS) / STDS
+
+        if not is_recording_window and (abs(norm_vals[3]) > threshold or abs(norm_vals[4]) > threshold
+                                        or abs(norm_vals[5]) > threshold):
+            is_recording_window = True
+            buffer_index = 0
+            trigger_ms = now
+
+        if is_recording_window and buffer_index < WINDOW_SIZE:
+            sensor_buffer[buffer_index] = norm_vals
+            buffer_index += 1
+
+        if is_recording_window and buffer_index >= WINDOW_SIZE:
+            windows += 1
+            if (now - last_gesture_ms) & 0xFFFFFFFF > debounce_ms:
+                invocations += 1
+                output = evaluator.predict_per_window(sensor_buffer[None])[0]
+                gesture_idx = int(np.argmax(output))
+                if gesture_idx != JUNK_INDEX:
+                    detections.append((gesture_idx, trigger_ms, now, float(output[gesture_idx])))
+                    last_gesture_ms = now
+            is_recording_window = False
+            buffer_index = 0
+
+    duration_ms = int(millis[-1] - millis[0]) if len(millis) else 0
+    return {
+        'samples': len(millis),
+        'duration_ms': duration_ms,
+        'windows': windows,
+        'invocations': invocations,
+        'invocations_per_minute': invocations / (duration_ms / 60000.0) if duration_ms else 0.0,
+        'detections': detections,
+    }
+
+
+def compare_results(result, reference):
+    """
+    Differences between emulate() and emulate_per_sample() results, empty if they agree exactly.
+    """
+    differences = [f"{key}: {result[key]} vs {reference[key]}" for key in ('samples', 'windows', 'invocations')
+                   if result[key] != reference[key]]
+    if result['detections'] != reference['detections']:
+        differing = [i for i, (a, b) in enumerate(zip(result['detections'], reference['detections'])) if a != b]
+        first = differing[0] if differing else min(len(result['detections']), len(reference['detections']))
+        differences.append(f"detections: {len(result['detections'])} vs {len(reference['detections'])}, "
+                           f"first difference at detection {first}")
+    return differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recordings through the final.ino detection loop.")
+    parser.add_argument('recordings', nargs='+', help=f"recording names in {DATA_DIR} (.rec or .csv)")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--threshold', type=float, default=TRIGGER_THRESHOLD, help="normalized gyro trigger")
+    parser.add_argument('--debounce-ms', type=int, default=DEBOUNCE_MS)
+    parser.add_argument('--batch-size', type=int, default=EVAL_BATCH_SIZE, help="windows per invoke()")
+    parser.add_argument('--check', action='store_true',
+                        help="also run the sample-by-sample port of loop() and check the results are identical")
+    args = parser.parse_args()
+
+    evaluator = BatchEvaluator(load_interpreter(args.model), batch_size=args.batch_size, rounding='firmware')
+
+    total_ms = 0
+    total_invocations = 0
+    mismatches = 0
+    for name in args.recordings:
+        base_path = name if os.path.dirname(name) else os.path.join(DATA_DIR, name)
+        recording = load_recording(base_path)
+        start = time.perf_counter()
+        result = emulate(recording, evaluator, args.threshold, args.debounce_ms)
+        elapsed = time.perf_counter() - start
+
+        print(f"\n{name}: {result['samples']} samples, {result['duration_ms'] / 1000.0:.1f} s of board time "
+              f"in {elapsed:.3f} s")
+        for gesture_idx, trigger_ms, detected_ms, score in result['detections']:
+            print(f"{detected_ms / 1000.0:10.3f} s  {GESTURE_NAMES[gesture_idx]:<9} {score:.2f}  "
+                  f"latency {detected_ms - trigger_ms} ms after the trigger")
+        print(f"{len(result['detections'])} gestures | {result['windows']} windows | {result['invocations']} invocations "
+              f"({result['invocations_per_minute']:.1f} per minute)")
+        total_ms += result['duration_ms']
+        total_invocations += result['invocations']
+
+        if args.check:
+            start = time.perf_counter()
+            reference = emulate_per_sample(recording, evaluator, args.threshold, args.debounce_ms)
+            reference_elapsed = time.perf_counter() - start
+            differences = compare_results(result, reference)
+            if differences:
+                mismatches += 1
+                print(f"Error: the per-sample reference ({reference_elapsed:.3f} s) differs: {'; '.join(differences)}")
+            else:
+                print(f"Identical to the per-sample reference ({reference_elapsed:.3f} s).")
+
+    if len(args.recordings) > 1 and total_ms:
+        print(f"\nAll recordings: {total_invocations} invocations ({total_invocations / (total_ms / 60000.0):.1f} per minute)")
+    if mismatches:
+        exit(1)
@@ -0,0 +1,293 @@
+import threading
+import time
+import numpy as np
+
+from windowing import sliding_windows
+from batch_inference import BatchEvaluator
+
+# Host-side inference: with STREAM_RAW_IMU 1 in final.ino the wand only streams raw IMU samples over
+# RAW_IMU_CHAR_UUID and magic_wand.py runs the .tflite model itself, so bigger models fit and a new model
+# needs no reflashing.
+#
+# Samples are normalized on arrival and appended to one preallocated ring; a worker thread evaluates every
+# stride-th window of WINDOW_SIZE samples. When the worker falls behind, all windows that are due are
+# quantized into one int8 batch and run with a single invoke() by batch_inference.BatchEvaluator. A
+# prediction is reported the way the firmware does it: int8 argmax, junk ignored, then a cooldown on the
+# board clock.
+
+RAW_IMU_CHAR_UUID = "8e6f3a44-2b1c-4d0e-9a57-3c1b7f2e6d90" # BLE_RAW_CHAR_UUID u final.ino
+SENSOR_SAMPLE_RATE_HZ = 88
+WINDOW_SIZE = int(3 * SENSOR_SAMPLE_RATE_HZ)
+NUM_FEATURES = 6
+DEFAULT_STRIDE = 22 # 0.25 s
+MAX_BATCH = 16
+MAX_PENDING_WINDOWS = 64 # ako worker kasni vise od ovoga, najstariji prozori se preskacu (osim s lossless)
+COOLDOWN_MS = 5000 # kao DEBOUNCE_MS u final.ino
+JUNK_INDEX = 3
+
+# isto kao u final.ino
+MEANS = np.array([0.157700, -0.303717, 0.655390, 1.477335, -2.782316, -7.167620], dtype=np.float32)
+STDS = np.array([0.314980, 0.295075, 0.531993, 98.251744, 59.885257, 32.191821], dtype=np.float32)
+
+# one sample in a RAW_IMU notification (RawSample in final.ino); a notification may carry several
+RAW_SAMPLE_DTYPE = np.dtype([('timestamp', '<u4'), ('values', '<f4', NUM_FEATURES)])
+
+
+def load_interpreter(model_path, num_threads=None):
+    """
+    tflite_runtime if it is installed (much smaller in the PyInstaller build), else TensorFlow's interpreter.
+    """
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=model_path, num_threads=num_threads)
+
+
+def decode_raw_samples(data):
+    """
+    (timestamps in ms as int64, samples as float32 (n, 6)) from one RAW_IMU notification.
+    """
+    frames = np.frombuffer(bytes(data), dtype=RAW_SAMPLE_DTYPE, count=len(data) // RAW_SAMPLE_DTYPE.itemsize)
+    return frames['timestamp'].astype(np.int64), frames['values'].astype(np.float32)
+
+
+def encode_raw_samples(timestamps, samples):
+    frames = np.zeros(len(timestamps), dtype=RAW_SAMPLE_DTYPE)
+    frames['timestamp'] = timestamps
+    frames['values'] = samples
+    return frames.tobytes()
+
+
+class InferenceWorker:
+    """
+    One thread that evaluates the due windows of any number of StreamingClassifiers (one per wand), so
+    another wand adds no thread. Classifiers share its condition as their lock.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.classifiers = []
+        self.running = False
+        self.thread = None
+        self.error = None
+
+    def add(self, classifier):
+        with self.cond:
+            self.classifiers.append(classifier)
+
+    def remove(self, classifier):
+        with self.cond:
+            if classifier in self.classifiers:
+                self.classifiers.remove(classifier)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='host-inference', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        try:
+            while True:
+                with self.cond:
+                    while self.running and not any(c.due() for c in self.classifiers):
+                        self.cond.wait()
+                    if not self.running:
+                        return
+                    # kopija pod lockom, push() smije pomaknuti ring cim ga pustimo
+                    batches = [(c, c.take_batch()) for c in self.classifiers if c.due()]
+                    self.cond.notify_all() # lossless push() ceka da se prozori preuzmu
+                for classifier, batch in batches:
+                    classifier.evaluate(*batch)
+        except Exception as e:
+            with self.cond:
+                self.error = e
+                self.running = False
+                self.cond.notify_all()
+
+
+class StreamingClassifier:
+    """
+    push() raw samples from any thread (e.g. the BLE callback); predictions come back on the worker thread
+    as on_prediction(gesture_idx, score, board_ms, received), where received is the time.perf_counter()
+    of the push that completed the window. Use as a context manager or call start() / stop(); without a
+    shared worker, start() runs a worker of its own.
+    With lossless=True, push() blocks until the worker has taken the windows it would otherwise skip, so
+    a replay faster than real time evaluates every window and its predictions do not depend on timing.
+    resample_rate puts the samples on a uniform grid first (resample.Resampler), for a model trained with
+    --stage resampled.
+    """
+
+    def __init__(self, interpreter, on_prediction, stride=DEFAULT_STRIDE, max_batch=MAX_BATCH, cooldown_ms=COOLDOWN_MS,
+                 min_score=0.0, window_size=WINDOW_SIZE, means=MEANS, stds=STDS, latency=None, worker=None,
+                 lossless=False, resample_rate=None):
+        self.interpreter = interpreter
+        self.on_prediction = on_prediction
+        self.stride = stride
+        self.max_batch = max_batch
+        self.cooldown_ms = cooldown_ms
+        self.min_score = min_score
+        self.window_size = window_size
+        self.means = np.asarray(means, dtype=np.float32)
+        self.stds = np.asarray(stds, dtype=np.float32)
+        self.latency = latency
+        self.lossless = lossless
+        self.resample_rate = resample_rate
+        self.resampler = self.new_resampler()
+
+        capacity = window_size + stride * MAX_PENDING_WINDOWS
+        self.samples = np.zeros((capacity, NUM_FEATURES), dtype=np.float32)
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.received = np.zeros(capacity, dtype=np.float64)
+        self.base = 0 # apsolutni indeks uzorka u self.samples[0]
+        self.count = 0
+        self.next_window = 0 # apsolutni pocetak sljedeceg prozora
+
+        self.work = np.zeros((max_batch, window_size, NUM_FEATURES), dtype=np.float32)
+        self.own_worker = worker is None
+        self.worker = worker or InferenceWorker()
+        self.cond = self.worker.cond
+
+        self.windows = 0
+        self.dropped_windows = 0
+        self.last_prediction_ms = None
+
+        # kvantizacija kao na plocici: round() pa clip
+        self.engine = BatchEvaluator(interpreter, max_batch, rounding='round')
+
+    def new_resampler(self):
+        if not self.resample_rate:
+            return None
+        from resample import Resampler
+        return Resampler(self.resample_rate)
+
+    def start(self):
+        self.worker.add(self)
+        if self.own_worker:
+            self.worker.start()
+        return self
+
+    def stop(self):
+        self.worker.remove(self)
+        if self.own_worker:
+            self.worker.stop()
+
+    @property
+    def running(self):
+        return self.worker.running
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def reset(self):
+        """
+        Forgets the buffered samples, e.g. after a reconnect, so no window spans the gap.
+        """
+        with self.cond:
+            self.base += self.count
+            self.count = 0
+            self.next_window = self.base
+        self.resampler = self.new_resampler()
+
+    def push(self, timestamps, samples):
+        received = time.perf_counter()
+        if self.resampler is not None:
+            # board ms -> grid; samples after the last grid point wait for the next push
+            grid_ts, samples, _ = self.resampler.push(np.asarray(timestamps, dtype=np.float64) / 1000.0, samples)
+            timestamps = np.round(grid_ts * 1000.0)
+        normalized = (np.asarray(samples, dtype=np.float32) - self.means) / self.stds
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        chunk = len(self.samples) - self.window_size
+        with self.cond:
+            for start in range(0, len(timestamps), chunk):
+                self.append(timestamps[start:start + chunk], normalized[start:start + chunk], received)
+            if self.due():
+                self.cond.notify()
+
+    def append(self, timestamps, normalized, received):
+        n = len(timestamps)
+        overflow = self.count + n - len(self.samples)
+        while self.lossless and overflow > self.next_window - self.base and self.worker.running:
+            self.cond.notify_all()
+            self.cond.wait()
+        if overflow > 0:
+            # uzorci prije najstarijeg prozora koji jos ceka vise ne trebaju
+            keep_from = self.next_window - self.base
+            if keep_from < overflow:
+                skipped = -(-(overflow - keep_from) // self.stride)
+                self.next_window += skipped * self.stride
+                self.dropped_windows += skipped
+                keep_from += skipped * self.stride
+            keep_from = min(keep_from, self.count)
+            kept = self.count - keep_from
+            self.samples[:kept] = self.samples[keep_from:self.count]
+            self.timestamps[:kept] = self.timestamps[keep_from:self.count]
+            self.received[:kept] = self.received[keep_from:self.count]
+            self.base += keep_from
+            self.count = kept
+            if self.next_window < self.base:
+                self.next_window = self.base
+        self.samples[self.count:self.count + n] = normalized
+        self.timestamps[self.count:self.count + n] = timestamps
+        self.received[self.count:self.count + n] = received
+        self.count += n
+
+    def due(self):
+        """
+        Number of windows that are complete and not evaluated yet.
+        """
+        last_start = self.base + self.count - self.window_size
+        if last_start < self.next_window:
+            return 0
+        return (last_start - self.next_window) // self.stride + 1
+
+    def take_batch(self):
+        """
+        Copies up to max_batch due windows into the work buffer; called by the worker with cond held.
+        Returns (n, board time of each window's last sample, its receive time).
+        """
+        n = min(self.due(), self.max_batch)
+        starts = self.next_window - self.base + np.arange(n) * self.stride
+        ends = starts + self.window_size - 1
+        np.take(sliding_windows(self.samples[:self.count], self.window_size), starts, axis=0, out=self.work[:n])
+        self.next_window += n * self.stride
+        return n, self.timestamps[ends].copy(), self.received[ends].copy()
+
+    def evaluate(self, n, board_ms, received):
+        start = time.perf_counter()
+        self.engine.quantize(self.work[:n])
+        outputs = self.engine.invoke(n)
+        if self.latency is not None:
+            self.latency.record('inference', start, time.perf_counter())
+        self.windows += n
+
+        predicted = np.argmax(outputs, axis=1)
+        scores = self.engine.dequantize(outputs[np.arange(n), predicted].astype(np.float32))
+        for idx, score, t, r in zip(predicted, scores, board_ms, received):
+            if idx == JUNK_INDEX or score < self.min_score:
+                continue
+            if self.last_prediction_ms is not None and t - self.last_prediction_ms <= self.cooldown_ms:
+                continue
+            self.last_prediction_ms = int(t)
+            self.on_prediction(int(idx), float(score), int(t), float(r))
+
+    @property
+    def invocations(self):
+        return self.engine.invocations
+
+    def status(self):
+        return f"{self.windows} windows | {self.invocations} invokes | {self.dropped_windows} skipped"
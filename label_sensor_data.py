@@ -1,32 +1,24 @@
 import os
-import pandas as pd
+import argparse
+from labeling import label_stored_recordings
+from parallel import add_jobs_argument
 
 gestures = ['infinity', 'kiss', 'double', 'flick']
 folder = "gesture_data"
 
+recordings = []
 for gesture in gestures:
-    raw_path = os.path.join(folder, f"{gesture}_raw_data.csv")
+    raw_base = os.path.join(folder, f"{gesture}_raw_data")
     interval_path = os.path.join(folder, f"{gesture}_intervals.txt")
-    output_path = os.path.join(folder, f"{gesture}_labeled.csv")
-
-    df = pd.read_csv(raw_path)
-    intervals = pd.read_csv(interval_path)
-
-    df['label'] = 'junk'
-
-    current_index = 0
-    num_intervals = len(intervals)
-
-    for i, row in df.iterrows():
-        t = row['timestamp']
-
-        while current_index < num_intervals and t > intervals.loc[current_index, 'end_time'] * 1000:
-            current_index += 1
-
-        if current_index < num_intervals:
-            start = intervals.loc[current_index, 'start_time'] * 1000
-            end = intervals.loc[current_index, 'end_time'] * 1000
-            if start <= t <= end:
-                df.at[i, 'label'] = gesture
-
-    df.to_csv(output_path, index=False) # index=False da ne doda br. reda
\ No newline at end of file
+    output_base = os.path.join(folder, f"{gesture}_labeled")
+    recordings.append((raw_base, interval_path, output_base, gesture))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Label the raw gesture recordings with their intervals.")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    # svaki uzorak unutar bilo kojeg intervala dobiva ime geste, ostali su 'junk'
+    # cita <gesture>_raw_data.rec (ili .csv ako .rec ne postoji), pise <gesture>_labeled.rec
+    for output_base, rows in label_stored_recordings(recordings, jobs=args.jobs).items():
+        print(f"{output_base}.rec: {rows} rows")
@@ -0,0 +1,152 @@
+import time
+import threading
+import numpy as np
+
+from labeling import merge_intervals, in_intervals, default_label
+from recording_store import label_names
+
+# Labeled capture: the operator marks gesture start / end while recording and the samples are written
+# already labeled, together with the intervals file, on the board's clock (no label_sensor_data.py or
+# shift_timestamps.py pass afterwards).
+#
+# Key presses happen on the host clock, samples carry the board's millis(). ClockSync keeps the smallest
+# host - board offset seen when a batch arrives (the batch whose last sample is the freshest), which maps a
+# key press to board time to within about one sample period plus the USB latency.
+# Samples wait holdback_seconds in a fixed-size ring before they are labeled and written, so a mark that
+# arrives slightly after the samples it covers still labels them. A mark can only be undone while none of
+# the samples from its start on are written, otherwise the .rec would keep labels the intervals file drops.
+
+holdback_seconds = 2.0
+sensor_sample_rate = 88
+
+
+class ClockSync:
+    def __init__(self):
+        self.offset_ms = None
+
+    def update(self, last_board_ms):
+        offset = time.monotonic() * 1000.0 - float(last_board_ms)
+        if self.offset_ms is None or offset < self.offset_ms:
+            self.offset_ms = offset
+
+    def board_now_ms(self):
+        if self.offset_ms is None:
+            return None
+        return time.monotonic() * 1000.0 - self.offset_ms
+
+
+class LabeledCapture:
+    """
+    SerialIngest sink: holds the newest samples in a ring of holdback_seconds, labels what falls out of it
+    (label inside a marked interval, junk elsewhere) and appends it to a RecordingWriter with has_label=True.
+    toggle() and undo() are called from the key thread; call finish() once the ingest has stopped.
+    """
+
+    def __init__(self, writer, label, sample_rate=sensor_sample_rate, holdback=holdback_seconds, names=label_names):
+        self.writer = writer
+        self.label_code = names.index(label)
+        self.junk_code = names.index(default_label)
+        self.holdback_ms = holdback * 1000.0
+        capacity = int(holdback * sample_rate * 4) + 1
+        self.ring_ts = np.zeros(capacity, dtype=np.int64)
+        self.ring_samples = np.zeros((capacity, 6), dtype=np.float32)
+        self.count = 0
+        self.clock = ClockSync()
+        self.lock = threading.Lock()
+        self.starts = []
+        self.ends = []
+        self.open_start = None
+        self.written_ms = None # timestamp zadnjeg zapisanog (labeliranog) uzorka
+
+    def toggle(self):
+        """
+        Starts or ends an interval at the current board time; returns (event, board time in ms) or None
+        before the first samples arrived.
+        """
+        now = self.clock.board_now_ms()
+        if now is None:
+            return None
+        with self.lock:
+            if self.open_start is None:
+                self.open_start = now
+                return 'start', now
+            self.starts.append(self.open_start)
+            self.ends.append(now)
+            self.open_start = None
+            return 'end', now
+
+    def undo(self):
+        """
+        Drops the open start, else the last interval. Returns (event, start in board ms): event is 'start' or
+        'interval' when it was dropped and 'written' when it was kept because samples after its start are
+        already in the recording. None if there is nothing to undo.
+        """
+        with self.lock:
+            if self.open_start is not None:
+                start, event = self.open_start, 'start'
+            elif self.starts:
+                start, event = self.starts[-1], 'interval'
+            else:
+                return None
+            if self.written_ms is not None and self.written_ms >= start:
+                return 'written', start
+            if event == 'start':
+                self.open_start = None
+            else:
+                self.starts.pop()
+                self.ends.pop()
+            return event, start
+
+    def __call__(self, timestamps, samples):
+        self.clock.update(timestamps[-1])
+        self.push(np.asarray(timestamps, dtype=np.int64), np.asarray(samples, dtype=np.float32))
+        newest = self.ring_ts[self.count - 1]
+        ready = int(np.searchsorted(self.ring_ts[:self.count], newest - self.holdback_ms, side='left'))
+        self.emit(ready)
+
+    def push(self, timestamps, samples):
+        capacity = len(self.ring_ts)
+        for start in range(0, len(timestamps), capacity):
+            ts, xs = timestamps[start:start + capacity], samples[start:start + capacity]
+            # ring je pun: najstariji uzorci se labeliraju i pisu ranije
+            self.emit(self.count + len(ts) - capacity)
+            self.ring_ts[self.count:self.count + len(ts)] = ts
+            self.ring_samples[self.count:self.count + len(ts)] = xs
+            self.count += len(ts)
+
+    def emit(self, n):
+        if n <= 0:
+            return
+        ts = self.ring_ts[:n]
+        with self.lock:
+            starts = self.starts + ([self.open_start] if self.open_start is not None else [])
+            ends = self.ends + ([np.inf] if self.open_start is not None else [])
+            newest = int(ts.max())
+            self.written_ms = newest if self.written_ms is None else max(self.written_ms, newest)
+        inside = in_intervals(ts, *merge_intervals(starts, ends))
+        self.writer.append(self.ring_samples[:n], ts, np.where(inside, self.label_code, self.junk_code))
+        self.ring_ts[:self.count - n] = self.ring_ts[n:self.count]
+        self.ring_samples[:self.count - n] = self.ring_samples[n:self.count]
+        self.count -= n
+
+    def finish(self):
+        """
+        Closes an open interval at the last sample and writes out the ring. Returns the intervals in ms.
+        """
+        with self.lock:
+            if self.open_start is not None and self.count:
+                self.starts.append(self.open_start)
+                self.ends.append(float(self.ring_ts[self.count - 1]))
+                self.open_start = None
+        self.emit(self.count)
+        return list(zip(self.starts, self.ends))
+
+
+def write_intervals(path, intervals_ms):
+    """
+    The same start_time,end_time file (seconds) label_sensor_data.py and create_windows.py read.
+    """
+    with open(path, 'w') as f:
+        f.write("start_time,end_time\n")
+        for start, end in sorted(intervals_ms):
+            f.write(f"{start / 1000.0:.3f},{end / 1000.0:.3f}\n")
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from recording_store import load_recording, RecordingWriter, timestamp_units
+from parallel import run_jobs
+
+default_label = 'junk'
+chunk_rows = 1_000_000
+
+
+def merge_intervals(starts, ends):
+    """
+    Sorts intervals by start and merges overlapping or touching ones,
+    so every sample can be matched against a single disjoint, sorted set.
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    if len(starts) == 0:
+        return starts, ends
+
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+
+    # an interval opens a new group when it starts after everything before it has ended
+    running_end = np.maximum.accumulate(ends)
+    new_group = np.empty(len(starts), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = starts[1:] > running_end[:-1]
+
+    group_starts = starts[new_group]
+    group_ends = np.maximum.reduceat(ends, np.flatnonzero(new_group))
+    return group_starts, group_ends
+
+
+def in_intervals(timestamps, starts, ends):
+    """
+    Returns a boolean mask of timestamps that fall in any [start, end] interval (inclusive).
+    starts/ends must come from merge_intervals.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if len(starts) == 0:
+        return np.zeros(len(timestamps), dtype=bool)
+    pos = np.searchsorted(starts, timestamps, side='right') - 1
+    inside = pos >= 0
+    inside &= timestamps <= ends[np.maximum(pos, 0)]
+    return inside
+
+
+def load_interval_bounds(interval_path, scale=1000.0):
+    # intervals files are in seconds, raw recordings in milliseconds
+    intervals = pd.read_csv(interval_path)
+    return intervals['start_time'].to_numpy(dtype=np.float64) * scale, intervals['end_time'].to_numpy(dtype=np.float64) * scale
+
+
+def label_stored_recording(raw_base, interval_path, output_base, label, chunk_size=chunk_rows):
+    """
+    Labels one raw recording against its intervals file: reads "<raw_base>.rec" (or .csv) and writes
+    "<output_base>.rec" with int8 label codes, `label` inside an interval and junk elsewhere.
+    Returns the number of labeled rows.
+    """
+    recording = load_recording(raw_base)
+    header = dict(recording.header)
+    names = header['label_names']
+    scale = float(timestamp_units[header['timestamp_unit']])
+    starts, ends = merge_intervals(*load_interval_bounds(interval_path, scale=scale))
+    label_code, junk_code = names.index(label), names.index(default_label)
+
+    with RecordingWriter(output_base, has_timestamp=True, has_label=True, **header) as writer:
+        for start in range(0, len(recording), chunk_size):
+            stop = start + chunk_size
+            timestamps = recording.timestamps[start:stop]
+            inside = in_intervals(timestamps, starts, ends)
+            writer.append(recording.samples[start:stop], timestamps, np.where(inside, label_code, junk_code))
+    return len(recording)
+
+
+def label_stored_recordings(recordings, chunk_size=chunk_rows, jobs=1):
+    """
+    label_stored_recording for many (raw_base, interval_path, output_base, label) tuples, `jobs` at a time.
+    """
+    recordings = list(recordings)
+    counts = run_jobs(label_stored_recording, [(*r, chunk_size) for r in recordings], jobs)
+    return {r[2]: count for r, count in zip(recordings, counts)}
@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+
+# In-memory latency histograms for the host side of a gesture: every measurement is rounded to
+# LATENCY_RESOLUTION and counted, so memory does not grow with the session and percentiles are exact to
+# the resolution. All timestamps are time.perf_counter() (monotonic) seconds.
+#
+# Stages recorded by magic_wand.GestureApp:
+#   queue     BLE notification received -> action submitted to the ActionDispatcher
+#   dispatch  submitted -> the dispatcher thread starts the action
+#   action    pyautogui call itself
+#   total     notification received -> action done
+#   inference quantize + invoke of one batch (host-side inference only; there queue also includes it,
+#             since it starts at the notification that completed the window)
+
+LATENCY_RESOLUTION = 1e-4 # 0.1 ms
+LATENCY_PERCENTILES = (50, 95, 99)
+LATENCY_STAGES = ('queue', 'dispatch', 'action', 'total')
+
+
+class LatencyHistogram:
+    def __init__(self, resolution=LATENCY_RESOLUTION):
+        self.resolution = resolution
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        seconds = max(seconds, 0.0)
+        b = int(round(seconds / self.resolution))
+        self.counts[b] = self.counts.get(b, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentiles(self, percentiles=LATENCY_PERCENTILES):
+        """
+        {'p50': seconds, ...}; empty before the first measurement.
+        """
+        if not self.count:
+            return {}
+        result = {}
+        bins = sorted(self.counts)
+        i, seen = 0, self.counts[bins[0]]
+        for p in sorted(percentiles):
+            target = p / 100.0 * self.count
+            while seen < target and i + 1 < len(bins):
+                i += 1
+                seen += self.counts[bins[i]]
+            result[f"p{p:g}"] = bins[i] * self.resolution
+        return result
+
+    def summary(self):
+        """
+        Count, mean, max and percentiles in milliseconds.
+        """
+        if not self.count:
+            return {'count': 0}
+        summary = {'count': self.count, 'mean_ms': round(self.total / self.count * 1000, 3),
+                   'max_ms': round(self.max * 1000, 3)}
+        summary.update({k + '_ms': round(v * 1000, 3) for k, v in self.percentiles().items()})
+        return summary
+
+
+class LatencyTracker:
+    """
+    One LatencyHistogram per stage. record() can be called from any thread.
+    """
+
+    def __init__(self, stages=LATENCY_STAGES):
+        self.histograms = {stage: LatencyHistogram() for stage in stages}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, stage, start, end):
+        with self.lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = LatencyHistogram()
+            self.histograms[stage].add(end - start)
+
+    def record_gesture(self, received, dequeued, dispatched, done):
+        with self.lock:
+            self.histograms['queue'].add(dequeued - received)
+            self.histograms['dispatch'].add(dispatched - dequeued)
+            self.histograms['action'].add(done - dispatched)
+            self.histograms['total'].add(done - received)
+
+    def summary(self):
+        with self.lock:
+            return {stage: h.summary() for stage, h in self.histograms.items()}
+
+    def format(self, stage='total'):
+        """
+        One line for the GUI, e.g. "total (12 gestures): p50 101.2 ms | p95 ... | p99 ...".
+        """
+        s = self.summary().get(stage, {'count': 0})
+        if not s['count']:
+            return f"{stage}: no gestures yet"
+        parts = [f"p{p:g} {s[f'p{p:g}_ms']:.1f} ms" for p in LATENCY_PERCENTILES]
+        return f"{stage} ({s['count']} gestures): " + " | ".join(parts)
+
+    def report(self):
+        return {'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+                'stages': self.summary()}
+
+
+def save_latency_report(path, trackers):
+    """
+    One JSON file with the stages of every tracker, trackers being {name: LatencyTracker} (one per wand).
+    """
+    report = {'saved': time.strftime('%Y-%m-%d %H:%M:%S'),
+              'resolution_ms': LATENCY_RESOLUTION * 1000,
+              'wands': {name: tracker.report() for name, tracker in trackers.items()}}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+    return report
@@ -1,26 +1,39 @@
 import serial
-import csv
-import time
 import os
+import argparse
+import numpy as np
+
+from recording_store import RecordingWriter, store_path, label_names
+from serial_ingest import SerialIngest
 
 port = 'COM9'
 baud_rate = 115200
 data_dir = 'gesture_data'
 duration_seconds = 30
+output_name = 'junk_labeled'
 
-output_file = os.path.join(data_dir, 'junk_labeled.csv')
+junk_code = label_names.index('junk')
 
-ser = serial.Serial(port, baud_rate, timeout=1)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record junk movement (no gestures) for duration seconds.")
+    parser.add_argument('--port', default=port, help=f"serial port (default: {port}; a pty from serial_replay.py works too)")
+    parser.add_argument('--baud', type=int, default=baud_rate)
+    parser.add_argument('--output', default=output_name, help=f"recording name in {data_dir} (default: {output_name})")
+    parser.add_argument('--binary', action='store_true', help="the sketch sends binary frames (BINARY_FRAMES 1)")
+    parser.add_argument('--duration', type=float, default=duration_seconds)
+    args = parser.parse_args()
 
-with open(output_file, mode='w', newline='') as f:
-    writer = csv.writer(f)
-    writer.writerow(['ax', 'ay', 'az', 'gx', 'gy', 'gz', 'label'])
+    output_file = store_path(os.path.join(data_dir, args.output))
+    ser = serial.Serial(args.port, args.baud, timeout=1)
 
-    start_time = time.time()
-    while time.time() - start_time < duration_seconds:
-        line = ser.readline().decode().strip()
-        if line:
-            row = line.split(',')
-            writer.writerow(row + ['junk'])
+    with RecordingWriter(output_file, has_timestamp=False, has_label=True) as writer:
+        # timestamp se ne sprema, linije sa samo 6 vrijednosti (stari sketch) se prihvacaju
+        ingest = SerialIngest(ser, lambda timestamps, samples: writer.append(samples, labels=np.full(len(samples), junk_code)),
+                              binary=args.binary, allow_missing_timestamp=True)
+        try:
+            with ingest:
+                ingest.report(duration=args.duration)
+        finally:
+            ser.close()
 
-ser.close()
\ No newline at end of file
+    print(f"{ingest.stats.samples} junk samples written to {output_file}")
@@ -1,30 +1,95 @@
 import serial
-import csv
 import os
+import argparse
+import threading
+
+from recording_store import RecordingWriter, store_path, label_names
+from serial_ingest import SerialIngest
+from labeled_capture import LabeledCapture, write_intervals
 
 port = 'COM9' 
 baud_rate = 115200
 data_dir = 'gesture_data'
+output_name = 'novi_raw_data'
+
 
-file_name = os.path.join(data_dir, 'novi_raw_data.csv')
+def read_marks(capture, ingest):
+    """
+    Enter oznacava pocetak / kraj geste, 'u' + Enter ponistava zadnju oznaku, 'q' + Enter zavrsava snimanje.
+    """
+    while ingest.running.is_set():
+        try:
+            command = input().strip().lower()
+        except EOFError:
+            return
+        if command == 'q':
+            ingest.running.clear()
+            return
+        if command == 'u':
+            undone = capture.undo()
+            if undone is None:
+                print("nothing to undo")
+            elif undone[0] == 'written':
+                print(f"mark at {undone[1] / 1000.0:.3f} s kept: its samples are already written, "
+                      f"undo within {capture.holdback_ms / 1000.0:.0f} s of the start")
+            else:
+                print(f"{undone[0]} at {undone[1] / 1000.0:.3f} s undone")
+            continue
+        event = capture.toggle()
+        if event is None:
+            print("no samples yet, mark ignored")
+        else:
+            print(f"{event[0]} at {event[1] / 1000.0:.3f} s")
 
-try:
-    ser = serial.Serial(port, baud_rate, timeout=1) # timeout je za .readline()
-    print(f"connected to {port} at {baud_rate} baud")
-except serial.SerialException as e:
-    print(e)
-    exit()
 
-with open(file_name, mode='w', newline='') as file: # newline='' zbog windows formatiranja
-    writer = csv.writer(file)
-    writer.writerow(['timestamp', 'ax', 'ay', 'az', 'gx', 'gy', 'gz'])
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record the board's IMU stream into a .rec recording until Ctrl+C.")
+    parser.add_argument('--port', default=port, help=f"serial port (default: {port}; a pty from serial_replay.py works too)")
+    parser.add_argument('--baud', type=int, default=baud_rate)
+    parser.add_argument('--output', default=None, help=f"recording name in {data_dir} (default: {output_name}, "
+                                                      "or <label>_capture with --label)")
+    parser.add_argument('--binary', action='store_true', help="the sketch sends binary frames (BINARY_FRAMES 1)")
+    parser.add_argument('--duration', type=float, default=None, help="stop after this many seconds")
+    parser.add_argument('--label', choices=[name for name in label_names if name != 'junk'], default=None,
+                        help="labeled capture: mark each gesture with Enter at its start and end; writes "
+                             "<output>_labeled.rec and <output>_intervals.txt")
+    args = parser.parse_args()
 
     try:
-        while True:
-            line = ser.readline().decode('utf-8').strip()
-            if line:
-                parts = line.split(',')
-                writer.writerow(parts)
-    finally:
-        ser.close()
-        print("serial connection closed")
\ No newline at end of file
+        ser = serial.Serial(args.port, args.baud, timeout=1) # timeout je za .read() u reader threadu
+        print(f"connected to {args.port} at {args.baud} baud")
+    except serial.SerialException as e:
+        print(e)
+        exit()
+
+    if args.label is None:
+        file_name = store_path(os.path.join(data_dir, args.output or output_name))
+        writer = RecordingWriter(file_name, has_timestamp=True, timestamp_unit='ms')
+        capture = None
+        sink = lambda timestamps, samples: writer.append(samples, timestamps)
+    else:
+        output_base = os.path.join(data_dir, args.output or f"{args.label}_capture")
+        file_name = store_path(output_base + '_labeled')
+        writer = RecordingWriter(file_name, has_timestamp=True, has_label=True, timestamp_unit='ms')
+        capture = sink = LabeledCapture(writer, args.label)
+        print(f"press Enter at the start and at the end of every '{args.label}', u + Enter to undo, q + Enter to stop")
+
+    # reader thread puni ring buffer, writer thread svakih 0.25 s parsira i upisuje cijeli batch
+    with writer:
+        ingest = SerialIngest(ser, sink, binary=args.binary)
+        try:
+            with ingest:
+                if capture is not None:
+                    threading.Thread(target=read_marks, args=(capture, ingest), daemon=True).start()
+                ingest.report(duration=args.duration) # do Ctrl+C
+        finally:
+            ser.close()
+            if capture is not None:
+                intervals = capture.finish()
+                write_intervals(output_base + '_intervals.txt', intervals)
+                print(f"{len(intervals)} intervals written to {output_base}_intervals.txt")
+            if ingest.parser.last_skipped:
+                print(f"last skipped line: {ingest.parser.last_skipped}")
+            print(ingest.status())
+            print(f"{file_name}: {writer.rows} rows")
+            print("serial connection closed")
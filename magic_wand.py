@@ -8,15 +8,61 @@ import queue
 from PIL import Image, ImageTk
 import os
 import sys
+import time
+
+from latency_stats import LatencyTracker, save_latency_report
+from host_inference import RAW_IMU_CHAR_UUID, InferenceWorker, StreamingClassifier, load_interpreter, decode_raw_samples
+from fake_wand import FakeWandClient
+from resample import input_stages, stage_rate
+from ble_reconnect import load_known_addresses, remember_address, Backoff, DIRECT_CONNECT_TIMEOUT
+from action_dispatch import ActionDispatcher, parse_action
 
 GESTURE_CHAR_UUID = "24b077e2-a798-49ea-821f-824bd3998bde"
 GESTURE_NAMES = ['double', 'flick', 'infinity', 'junk', 'kiss']
+LATENCY_REPORT_FILE = "gesture_latency.json"
+WAKEUP_EVENT = "<<TaskQueued>>"
+HOST_MODEL_FILE = "model_quantized.tflite"
+REPLAY_ENV = "MAGIC_WAND_REPLAY" # recordings (os.pathsep separated) to replay as wands through FakeWandClient
+STAGE_ENV = "MAGIC_WAND_STAGE" # "resampled" for a host model trained with --stage resampled
+WAND_NAME = "magic_wand"
+SCAN_TIMEOUT = 60.0 # s, najdulje cekanje na prvi stapic
+DEFAULT_PROFILE = "Default"
+DEFAULT_HOTKEYS = {'double': 'l', 'flick': 'k', 'infinity': '0', 'kiss': '120+enter'}
+
+
+def app_base_path():
+    if getattr(sys, 'frozen', False):
+        return sys._MEIPASS
+    return os.path.dirname(__file__)
+
+
+class WandConnection:
+    """
+    One wand served by GestureApp: its client, host-side classifier and counters. The connection itself
+    lives on the asyncio loop; status, gestures and latency are shown on the Tk thread.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.client = None
+        self.status = "Found"
+        self.gestures = 0
+        self.coalesced = 0
+        self.latency = LatencyTracker()
+        self.classifier = None
+        self.notify_uuid = GESTURE_CHAR_UUID
+        self.disconnected = asyncio.Event()
+        self.row = None
+
+    def summary(self):
+        coalesced = f" | {self.coalesced} coalesced" if self.coalesced else ""
+        return f"{self.address}: {self.status} | {self.latency.format()}{coalesced}"
 
 class GestureApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Magic Wand")
-        self.root.geometry("540x540")
+        self.root.geometry("540x600")
         self.root.configure(bg="#E0FFFF")
 
         self.hotkey_entries = {}
@@ -37,17 +83,32 @@ class GestureApp:
         self.fish_x_positions = []
         self.fish_speed = 1
         
-        self.client = None
+        self.wands = {}
+        self.wand_tasks = []
+        self.profiles = {DEFAULT_PROFILE: dict(DEFAULT_HOTKEYS)}
+        # hotkeyi parsirani jednom, kad se promijene; citaju ih BLE i inference thread
+        self.actions = {DEFAULT_PROFILE: {gesture: parse_action(hotkey) for gesture, hotkey in DEFAULT_HOTKEYS.items()}}
+        self.dispatcher = ActionDispatcher(on_done=self.on_action_done).start()
+        self.hotkey_vars = {}
         self.ble_thread = None
         self.asyncio_loop = None
         self.task_queue = queue.Queue()
+        self.wakeup_lock = threading.Lock()
+        self.wakeup_pending = False
+        self.closing = False
         self.is_listening = False
         self.ble_connection_task = None
+        self.replay_paths = [path for path in os.environ.get(REPLAY_ENV, "").split(os.pathsep) if path]
+        self.host_stage = os.environ.get(STAGE_ENV, input_stages[0])
+        if self.host_stage not in input_stages:
+            raise ValueError(f"{STAGE_ENV} must be one of {input_stages}, not {self.host_stage!r}")
+        self.use_host_inference = False
+        self.inference_worker = None
 
         self.create_widgets()
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
-        self.process_queue()
+        self.root.bind(WAKEUP_EVENT, self.process_queue)
 
     def create_widgets(self):
         main_frame = tk.Frame(self.root, padx=15, pady=15, bg="#E0FFFF")
@@ -59,7 +120,17 @@ class GestureApp:
             "or combinations like 'ctrl+j'."
         )
         instruction_label = tk.Label(main_frame, text=instruction_text, wraplength=400, justify="left", bg="#E0FFFF", fg="#191970", font=("Arial", 9), anchor="w")
-        instruction_label.pack(pady=(0, 15), fill="x")
+        instruction_label.pack(pady=(0, 10), fill="x")
+
+        profile_frame = tk.Frame(main_frame, bg="#E0FFFF")
+        profile_frame.pack(pady=(0, 5), fill="x")
+        profile_label = tk.Label(profile_frame, text="Hotkeys for:", bg="#E0FFFF", fg="#483D8B", font=("Arial", 10, "bold"))
+        profile_label.pack(side="left", padx=(0, 10))
+        self.profile_var = tk.StringVar(value=DEFAULT_PROFILE)
+        self.profile_menu = tk.OptionMenu(profile_frame, self.profile_var, DEFAULT_PROFILE)
+        self.profile_menu.config(bg="#ADD8E6", activebackground="#E0FFFF", font=("Arial", 9))
+        self.profile_menu.pack(side="left", expand=True, fill="x")
+        self.refresh_profile_menu()
 
         for i, gesture in enumerate(GESTURE_NAMES): 
             if gesture != 'junk':
@@ -76,26 +147,40 @@ class GestureApp:
                 label = tk.Label(row_frame, text=f"{gesture.capitalize()}:", width=10, anchor="w", bg="#E0FFFF", fg="#483D8B", font=("Arial", 10, "bold"))
                 label.pack(side="left", padx=(0, 10))
 
-                entry = tk.Entry(row_frame, width=30, bg="white", fg="black", insertbackground="purple", bd=2, relief="groove")
+                hotkey_var = tk.StringVar(value=self.profiles[DEFAULT_PROFILE][gesture])
+                hotkey_var.trace_add("write", lambda *args, g=gesture: self.on_hotkey_edited(g))
+                self.hotkey_vars[gesture] = hotkey_var
+
+                entry = tk.Entry(row_frame, width=30, textvariable=hotkey_var, bg="white", fg="black", insertbackground="purple", bd=2, relief="groove")
                 entry.pack(side="left", expand=True, fill="x")
                 self.hotkey_entries[gesture] = entry
-
-                if gesture == 'infinity':
-                    entry.insert(0, '0')
-                elif gesture == 'double':
-                    entry.insert(0, 'l')
-                elif gesture == 'flick':
-                    entry.insert(0, 'k')
-                elif gesture == 'kiss':
-                    entry.insert(0, '120+enter')
                 
                 capture_button = tk.Button(row_frame, text="Capture", command=lambda g=gesture: self.start_hotkey_capture(g),
                                         bg="#FF69B4", fg="white", activebackground="#FFC0CB", relief="raised", bd=3, font=("Arial", 9, "bold"))
                 capture_button.pack(side="right", padx=(5,0))
 
+        self.host_inference_var = tk.BooleanVar(value=bool(self.replay_paths))
+        host_inference_check = tk.Checkbutton(main_frame, text="Run the model on this PC (wand streams raw IMU data)",
+                                              variable=self.host_inference_var, bg="#E0FFFF", fg="#191970",
+                                              activebackground="#E0FFFF", font=("Arial", 9), anchor="w")
+        host_inference_check.pack(pady=(15, 0), fill="x")
+
         self.start_button = tk.Button(main_frame, text="Start listening for gestures", command=self.start_listening,
                                        bg="#8A2BE2", fg="white", activebackground="#DDA0DD", relief="ridge", bd=4, font=("Arial", 11, "bold"))
-        self.start_button.pack(pady=25)
+        self.start_button.pack(pady=(10, 5))
+
+        wands_header = tk.Frame(main_frame, bg="#E0FFFF")
+        wands_header.pack(pady=(0, 2), fill="x")
+        wands_label = tk.Label(wands_header, text="Wands:", anchor="w", bg="#E0FFFF", fg="#483D8B", font=("Arial", 9, "bold"))
+        wands_label.pack(side="left")
+        save_latency_button = tk.Button(wands_header, text="Save latency", command=self.save_latency,
+                                        bg="#ADD8E6", fg="black", relief="raised", bd=2, font=("Arial", 8))
+        save_latency_button.pack(side="right")
+
+        self.wand_frame = tk.Frame(main_frame, bg="#E0FFFF")
+        self.wand_frame.pack(fill="x")
+        self.no_wands_label = tk.Label(self.wand_frame, text="none connected", anchor="w", bg="#E0FFFF", fg="#191970", font=("Arial", 8))
+        self.no_wands_label.pack(fill="x")
 
         self.fish_canvas = tk.Canvas(main_frame, height=50, bg="#E0FFFF", highlightthickness=0)
         self.fish_canvas.pack(side="bottom", fill="x", padx=10, pady=5)
@@ -104,12 +189,7 @@ class GestureApp:
 
     def load_fish_image(self):
         try:
-            if getattr(sys, 'frozen', False):
-                base_path = sys._MEIPASS
-            else:
-                base_path = os.path.dirname(__file__)
-            
-            image_path = os.path.join(base_path, "media", "ribice.webp")
+            image_path = os.path.join(app_base_path(), "media", "ribice.webp")
             
             original_image = Image.open(image_path)
             
@@ -150,12 +230,12 @@ class GestureApp:
         except FileNotFoundError:
             print(f"Error: ribice.webp not found at expected path: {image_path}")
             self.fish_canvas.destroy()
-            self.root.geometry("540x486")
+            self.root.geometry("540x546")
             messagebox.showwarning("Image Not Found", f"Could not load ribice.webp. Please ensure it's in a 'media' subfolder next to the executable.")
         except Exception as e:
             print(f"An error occurred loading fish image: {e}")
             self.fish_canvas.destroy()
-            self.root.geometry("540x486")
+            self.root.geometry("540x546")
             messagebox.showerror("Image Error", f"An error occurred loading ribice.webp: {e}")
 
     def animate_fish(self):
@@ -243,8 +323,10 @@ class GestureApp:
     def start_listening(self):
         if not self.is_listening:
             self.is_listening = True
+            self.use_host_inference = self.host_inference_var.get()
             self.start_button.config(state=tk.DISABLED, text="Connecting...")
-            self.update_status("Scanning for magic_wand...", "blue")
+            self.update_status(f"Scanning for {WAND_NAME}...", "blue")
+            self.clear_wand_rows()
 
             self.asyncio_loop = asyncio.new_event_loop() 
             self.ble_thread = threading.Thread(target=self.run_ble_loop)
@@ -253,7 +335,7 @@ class GestureApp:
         else:
             self.is_listening = False
             self.start_button.config(state=tk.DISABLED, text="Disconnecting...")
-            self.update_status("Disconnecting from magic_wand...", "orange")
+            self.update_status(f"Disconnecting from {WAND_NAME}...", "orange")
             
             if self.asyncio_loop.is_running() and self.ble_connection_task and not self.ble_connection_task.done():
                 self.asyncio_loop.call_soon_threadsafe(self.ble_connection_task.cancel)
@@ -265,6 +347,7 @@ class GestureApp:
         try:
             self.ble_connection_task = self.asyncio_loop.create_task(self.connect_and_listen())
             self.asyncio_loop.run_until_complete(self.ble_connection_task)
+            self.asyncio_loop.run_until_complete(self._perform_disconnection_and_cleanup())
         except asyncio.CancelledError:
             print("BLE loop task was cancelled. Initiating cleanup.")
             self.asyncio_loop.run_until_complete(self._perform_disconnection_and_cleanup())
@@ -279,32 +362,26 @@ class GestureApp:
             print("BLE loop finished and closed.")
 
     async def connect_and_listen(self):
+        """
+        Serves every wand as its own listen_wand task on this loop until the task is cancelled; replayed
+        wands until every recording has ended.
+        """
+        self.wand_tasks = []
         try:
-            device = await BleakScanner.find_device_by_name("magic_wand", timeout=60.0)
-            if not device:
-                self.queue_task(lambda: self.update_status("magic_wand not found within 1 minute.", "red"))
+            if self.use_host_inference:
+                # model se provjerava prije skeniranja, da greska ne dode tek nakon spajanja
+                if not os.path.exists(self.model_path()):
+                    raise FileNotFoundError(f"{HOST_MODEL_FILE} not found next to the application")
+                self.inference_worker = InferenceWorker().start()
+
+            if self.replay_paths:
+                for wand in self.replay_wands():
+                    self.serve_wand(wand)
+                await asyncio.gather(*self.wand_tasks)
+            elif not await self.find_wands():
+                self.queue_task(lambda: self.update_status(f"{WAND_NAME} not found within 1 minute.", "red"))
                 self.queue_task(lambda: self.start_button.config(state=tk.NORMAL, text="Start listening for gestures"))
                 self.is_listening = False
-                return
-
-            self.client = BleakClient(device)
-            await self.client.connect()
-            self.queue_task(lambda: self.update_status("Connected to magic_wand.", "green"))
-            self.queue_task(lambda: self.start_button.config(state=tk.NORMAL, text="Stop listening for gestures")) 
-
-            def handle_notification(_, data):
-                gesture_idx = int.from_bytes(data, byteorder='little', signed=True)
-                self.queue_task(lambda: self.process_gesture(gesture_idx))
-
-            await self.client.start_notify(GESTURE_CHAR_UUID, handle_notification)
-            self.queue_task(lambda: self.update_status("Listening for gestures...", "blue"))
-
-            while self.client.is_connected and self.is_listening: 
-                await asyncio.sleep(1)
-            
-            if self.client and self.client.is_connected and not self.is_listening:
-                 print("Connect loop ended naturally (self.is_listening became False). Initiating cleanup.")
-                 self.asyncio_loop.create_task(self._perform_disconnection_and_cleanup())
 
         except asyncio.CancelledError:
             print("Connect and listen coroutine explicitly cancelled. Cleanup will be handled by run_ble_loop.")
@@ -315,6 +392,165 @@ class GestureApp:
             self.queue_task(lambda: self.start_button.config(state=tk.NORMAL, text="Start listening for gestures"))
             self.is_listening = False
             raise
+        finally:
+            for task in self.wand_tasks:
+                task.cancel()
+            await asyncio.gather(*self.wand_tasks, return_exceptions=True)
+
+    def serve_wand(self, wand):
+        """
+        Lists the wand and starts its listen_wand task.
+        """
+        first = not self.wands
+        self.wands[wand.address] = wand
+        count = len(self.wands)
+        self.queue_task(lambda: self.add_wand_row(wand))
+        if first:
+            self.queue_task(lambda: self.start_button.config(state=tk.NORMAL, text="Stop listening for gestures"))
+        self.queue_task(lambda: self.update_status(f"Listening for gestures from {count} wand(s)...", "blue"))
+        self.wand_tasks.append(asyncio.create_task(self.listen_wand(wand)))
+
+    async def find_wands(self):
+        """
+        Connects to the remembered addresses directly and scans for wands at the same time, until cancelled.
+        A wand is served once it connects or advertises, so a wand that never connected before can join at
+        any time; known wands that do not answer are left to the scan instead of being listed. Returns False
+        if no wand was found within SCAN_TIMEOUT seconds.
+        """
+        loop = asyncio.get_running_loop()
+        found = asyncio.Queue()
+        known = load_known_addresses()
+        connecting = set(known) # te adrese scan preskace dok direktno spajanje traje
+
+        def detected(device, advertisement_data):
+            if (advertisement_data.local_name or device.name) == WAND_NAME:
+                found.put_nowait(device)
+
+        async def connect_known(address):
+            wand = self.ble_wand(address, address)
+            if await self.connect_wand(wand, DIRECT_CONNECT_TIMEOUT):
+                self.serve_wand(wand)
+            connecting.discard(address)
+
+        if known:
+            self.queue_task(lambda: self.update_status(f"Connecting to {len(known)} known wand(s), scanning for {WAND_NAME}...", "blue"))
+        else:
+            self.queue_task(lambda: self.update_status(f"Scanning for {WAND_NAME}...", "blue"))
+        direct = [asyncio.create_task(connect_known(address)) for address in known]
+        deadline = loop.time() + SCAN_TIMEOUT
+        try:
+            async with BleakScanner(detection_callback=detected):
+                while True:
+                    try:
+                        device = await asyncio.wait_for(found.get(), None if self.wands else deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        if not self.wands:
+                            return False
+                        continue
+                    # spojeni stapici ne oglasavaju; oni koji su pali spaja njihov listen_wand
+                    if device.address not in self.wands and device.address not in connecting:
+                        self.serve_wand(self.ble_wand(device.address, device))
+        finally:
+            for task in direct:
+                task.cancel()
+            await asyncio.gather(*direct, return_exceptions=True)
+
+    def ble_wand(self, address, device):
+        wand = WandConnection(address)
+        wand.client = BleakClient(device, disconnected_callback=self.disconnect_handler(wand))
+        return wand
+
+    async def connect_wand(self, wand, timeout):
+        try:
+            await asyncio.wait_for(wand.client.connect(), timeout)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"{wand.address}: direct connect failed: {e!r}")
+            return False
+
+    def replay_wands(self):
+        wands = []
+        for path in self.replay_paths:
+            wand = WandConnection("replay:" + os.path.basename(path))
+            wand.client = FakeWandClient.from_path(path, disconnected_callback=self.disconnect_handler(wand), address=wand.address)
+            wands.append(wand)
+        return wands
+
+    def disconnect_handler(self, wand):
+        loop = asyncio.get_running_loop()
+        # bleak backend moze zvati callback iz svog threada
+        return lambda client: loop.call_soon_threadsafe(wand.disconnected.set)
+
+    async def listen_wand(self, wand):
+        """
+        Keeps the wand connected until the task is cancelled: after a dropped link or a failed attempt it
+        reconnects with exponential backoff and subscribes to the notifications again.
+        """
+        backoff = Backoff()
+        try:
+            if self.use_host_inference:
+                interpreter = load_interpreter(self.model_path())
+                wand.classifier = StreamingClassifier(interpreter, lambda *prediction: self.on_host_prediction(wand, *prediction),
+                                                      latency=wand.latency, worker=self.inference_worker,
+                                                      resample_rate=stage_rate(self.host_stage)).start()
+                wand.notify_uuid = RAW_IMU_CHAR_UUID
+
+                def handle_notification(_, data):
+                    wand.classifier.push(*decode_raw_samples(data))
+            else:
+                wand.notify_uuid = GESTURE_CHAR_UUID
+
+                def handle_notification(_, data):
+                    received = time.perf_counter()
+                    gesture_idx = int.from_bytes(data, byteorder='little', signed=True)
+                    self.process_gesture(wand, gesture_idx, received)
+
+            while True:
+                try:
+                    if not wand.client.is_connected:
+                        wand.disconnected.clear()
+                        self.set_wand_status(wand, "Connecting...")
+                        await wand.client.connect()
+                    if wand.classifier is not None:
+                        wand.classifier.reset()
+                    await wand.client.start_notify(wand.notify_uuid, handle_notification)
+                    self.set_wand_status(wand, "Listening")
+                    if not self.replay_paths:
+                        remember_address(wand.address)
+                    backoff.reset()
+                    await wand.disconnected.wait()
+                    print(f"{wand.address}: connection lost.")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"{wand.address}: connection error: {e!r}")
+                delay = backoff.next()
+                self.set_wand_status(wand, f"Reconnecting in {delay:.1f} s")
+                await asyncio.sleep(delay)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"{wand.address}: error: {e}")
+            self.set_wand_status(wand, f"Error: {e}")
+        finally:
+            await self.disconnect_wand(wand)
+
+    async def disconnect_wand(self, wand):
+        try:
+            if wand.client and wand.client.is_connected:
+                await wand.client.stop_notify(wand.notify_uuid)
+                await wand.client.disconnect()
+                print(f"{wand.address}: disconnected gracefully.")
+                self.set_wand_status(wand, "Disconnected")
+        except Exception as e:
+            print(f"{wand.address}: error during disconnection: {e}")
+        if wand.classifier is not None:
+            wand.classifier.stop()
+            print(f"{wand.address}: host inference stopped, {wand.classifier.status()}")
+            wand.classifier = None
 
     async def _perform_disconnection_and_cleanup(self, error=None):
         """
@@ -324,19 +560,14 @@ class GestureApp:
         """
         print("Attempting _perform_disconnection_and_cleanup...")
         try:
-            if self.client and self.client.is_connected:
-                await self.client.stop_notify(GESTURE_CHAR_UUID)
-                await self.client.disconnect()
-                print("Bluetooth client disconnected gracefully during cleanup.")
-            elif self.client and not self.client.is_connected:
-                print("Bluetooth client already disconnected when _perform_disconnection_and_cleanup called.")
-            else:
-                print("Bluetooth client object not initialized when _perform_disconnection_and_cleanup called.")
+            await asyncio.gather(*(self.disconnect_wand(wand) for wand in self.wands.values()))
+            if self.inference_worker is not None:
+                self.inference_worker.stop()
 
             self.queue_task(lambda: self.start_button.config(state=tk.NORMAL, text="Start listening for gestures"))
             if error:
                 self.queue_task(lambda: self.update_status(f"Disconnected (Error: {error}).", "red"))
-            else:
+            elif self.wands:
                 self.queue_task(lambda: self.update_status("Disconnected.", "black"))
             self.queue_task(lambda: setattr(self, 'is_listening', False))
 
@@ -344,65 +575,141 @@ class GestureApp:
             print(f"Critical error during _perform_disconnection_and_cleanup: {e}")
             self.queue_task(lambda: self.update_status(f"Critical Disconnect Error: {e}", "red"))
         finally:
-            self.client = None
-
-
-    def process_gesture(self, gesture_idx):
-        if 0 <= gesture_idx < len(GESTURE_NAMES): 
-            gesture_name = GESTURE_NAMES[gesture_idx]
-            hotkey_str = self.hotkey_entries[gesture_name].get().strip()
-
-            self.update_status(f"Gesture received: {gesture_name} (index {gesture_idx})", "purple")
-            print(f"Gesture received: {gesture_name} (index {gesture_idx}), hotkey: '{hotkey_str}'")
-
-            if hotkey_str: 
-                if '+' in hotkey_str:
-                    keys = hotkey_str.split('+')
-                    pyautogui.hotkey(*keys)
-                elif len(hotkey_str) > 1 and not hotkey_str.isdigit() and not hotkey_str.isalpha():
-                    pyautogui.typewrite(hotkey_str)
-                else:
-                    pyautogui.press(hotkey_str)
-                self.update_status(f"Performed action for: {gesture_name} - '{hotkey_str}'", "green")
-            else:
-                self.update_status(f"No hotkey mapped for gesture: {gesture_name}", "orange")
-                print(f"No hotkey mapped for gesture: {gesture_name}")
-        else:
-            self.update_status(f"Received invalid gesture index: {gesture_idx}", "red")
+            self.inference_worker = None
+
+
+    def model_path(self):
+        return os.path.join(app_base_path(), HOST_MODEL_FILE)
+
+    def on_host_prediction(self, wand, gesture_idx, score, board_ms, received):
+        # poziva se iz host-inference threada
+        print(f"{wand.address}: host inference {GESTURE_NAMES[gesture_idx]} ({score:.2f}) at board time {board_ms / 1000.0:.3f} s")
+        self.process_gesture(wand, gesture_idx, received)
+
+    def set_wand_status(self, wand, status):
+        wand.status = status
+        self.queue_task(lambda: self.update_wand_row(wand))
+
+    def add_wand_row(self, wand):
+        self.no_wands_label.pack_forget()
+        if wand.address not in self.profiles:
+            self.profiles[wand.address] = dict(self.profiles[DEFAULT_PROFILE])
+            self.actions[wand.address] = dict(self.actions[DEFAULT_PROFILE])
+        self.refresh_profile_menu()
+        wand.row = tk.Label(self.wand_frame, text=wand.summary(), anchor="w", bg="#E0FFFF", fg="#191970", font=("Arial", 8))
+        wand.row.pack(fill="x")
+
+    def update_wand_row(self, wand):
+        if wand.row is not None:
+            wand.row.config(text=wand.summary())
+
+    def clear_wand_rows(self):
+        for wand in self.wands.values():
+            if wand.row is not None:
+                wand.row.destroy()
+        self.wands = {}
+        self.no_wands_label.pack(fill="x")
+
+    def refresh_profile_menu(self):
+        menu = self.profile_menu["menu"]
+        menu.delete(0, tk.END)
+        for name in self.profiles:
+            menu.add_command(label=name, command=lambda name=name: self.select_profile(name))
+
+    def select_profile(self, name):
+        # profile_var prvo, da trace upise vrijednosti u novi profil
+        self.profile_var.set(name)
+        for gesture, hotkey_var in self.hotkey_vars.items():
+            hotkey_var.set(self.profiles[name].get(gesture, ""))
+
+    def on_hotkey_edited(self, gesture):
+        name = self.profile_var.get()
+        hotkey_str = self.hotkey_vars[gesture].get().strip()
+        self.profiles[name][gesture] = hotkey_str
+        self.actions[name][gesture] = parse_action(hotkey_str)
+
+    def process_gesture(self, wand, gesture_idx, received=None):
+        """
+        Runs on the BLE loop (or the host-inference thread): hands the wand's pre-parsed action to the
+        dispatcher. Only the status updates go through the Tk queue.
+        """
+        if not 0 <= gesture_idx < len(GESTURE_NAMES):
+            self.queue_task(lambda: self.update_status(f"Received invalid gesture index: {gesture_idx}", "red"))
             print(f"Received invalid gesture index: {gesture_idx}")
+            return
+
+        gesture_name = GESTURE_NAMES[gesture_idx]
+        action = self.actions.get(wand.address, self.actions[DEFAULT_PROFILE]).get(gesture_name)
+        print(f"Gesture received from {wand.address}: {gesture_name} (index {gesture_idx}), action: {action}")
+        if action is None:
+            self.queue_task(lambda: self.update_status(f"No hotkey mapped for gesture: {gesture_name}", "orange"))
+            print(f"No hotkey mapped for gesture: {gesture_name}")
+        elif self.dispatcher.submit((wand.address, gesture_name), action, wand, received):
+            self.queue_task(lambda: self.update_status(f"Gesture received from {wand.address}: {gesture_name} (index {gesture_idx})", "purple"))
+        else:
+            wand.coalesced += 1
+            print(f"{gesture_name} from {wand.address} coalesced into the previous one")
+            self.queue_task(lambda: self.update_wand_row(wand))
+
+    def on_action_done(self, job):
+        # dispatcher thread
+        wand, (_, gesture_name) = job.context, job.key
+        if job.error is not None:
+            print(f"Action for {gesture_name} failed: {job.error}")
+            self.queue_task(lambda: self.update_status(f"Action for {gesture_name} failed: {job.error}", "red"))
+            return
+        wand.gestures += 1
+        if job.received is not None:
+            wand.latency.record_gesture(job.received, job.submitted, job.dispatched, job.done)
+        self.queue_task(lambda: self.update_wand_row(wand))
+        self.queue_task(lambda: self.update_status(f"Performed action for: {gesture_name} - '{job.action.text}'", "green"))
+
+    def save_latency(self):
+        try:
+            save_latency_report(LATENCY_REPORT_FILE, {wand.address: wand.latency for wand in list(self.wands.values())})
+            self.update_status(f"Latency stats saved to {os.path.abspath(LATENCY_REPORT_FILE)}", "green")
+        except OSError as e:
+            self.update_status(f"Could not save latency stats: {e}", "red")
 
     def update_status(self, message, color="black"):
         self.status_label.config(text=message, fg=color)
 
     def queue_task(self, task):
+        """
+        Can be called from any thread. The first task queued since the last drain generates one virtual
+        event on the Tk loop; tasks queued before that event is handled are drained with it in one batch.
+        """
         self.task_queue.put(task)
-
-    def process_queue(self):
+        with self.wakeup_lock:
+            if self.wakeup_pending or self.closing:
+                return
+            self.wakeup_pending = True
+        try:
+            self.root.event_generate(WAKEUP_EVENT, when="tail")
+        except (tk.TclError, RuntimeError):
+            pass # prozor je vec zatvoren
+
+    def process_queue(self, event=None):
+        # zastavica se spusta prije praznjenja, task dodan za vrijeme praznjenja salje novi event
+        with self.wakeup_lock:
+            self.wakeup_pending = False
+        tasks = []
         try:
             while True:
-                task = self.task_queue.get_nowait()
-                task()
+                tasks.append(self.task_queue.get_nowait())
         except queue.Empty:
             pass
-        finally:
-            self.root.after(100, self.process_queue)
-
-    async def disconnect_client(self):
-        if self.client and self.client.is_connected:
-            try:
-                await self.client.stop_notify(GESTURE_CHAR_UUID)
-                await self.client.disconnect()
-                print("Bluetooth client disconnected gracefully via disconnect_client.")
-            except Exception as e:
-                print(f"Error during Bluetooth disconnection in disconnect_client: {e}")
-        else:
-            print("Client not connected when disconnect_client was called.")
+        for task in tasks:
+            task()
 
     def on_closing(self):
+        # BLE thread ne smije cekati na Tk loop dok ga ovdje joinamo
+        with self.wakeup_lock:
+            self.closing = True
         if self.is_listening:
             self.is_listening = False 
         
-        if self.asyncio_loop.is_running():
+        if self.asyncio_loop and self.asyncio_loop.is_running():
             if self.ble_connection_task and not self.ble_connection_task.done():
                 self.asyncio_loop.call_soon_threadsafe(self.ble_connection_task.cancel)
             else:
@@ -410,7 +717,11 @@ class GestureApp:
 
         if self.ble_thread and self.ble_thread.is_alive():
             self.ble_thread.join(timeout=3) 
+        self.dispatcher.stop(timeout=1)
 
+        for wand in list(self.wands.values()): # BLE thread moze dodati stapic
+            if wand.latency.histograms['total'].count:
+                print(f"{wand.address}: {wand.latency.format()}")
         self.root.destroy()
         print("Application closed.")
 
@@ -5,7 +5,7 @@ a = Analysis(
     ['magic_wand.py'],
     pathex=[],
     binaries=[],
-    datas=[('media', 'media')],
+    datas=[('media', 'media'), ('model_quantized.tflite', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,162 @@
+import os
+import json
+import numpy as np
+
+from recording_store import iter_recording, store_path, samples_file, header_file
+from parallel import run_jobs
+from resample import Resampler
+
+# Normalization statistics that are accumulated in one streaming pass (Welford / Chan et al.),
+# can be merged across recordings or processes and are cached per recording in norm_stats.json,
+# so adding a session only scans the new file.
+
+stats_file_name = "norm_stats.json"
+chunk_rows = 500_000
+n_channels = 6
+
+
+class ChannelStats:
+    """
+    Per-channel count, mean and M2 (sum of squared deviations from the mean).
+    """
+
+    def __init__(self, count=0, mean=None, m2=None, channels=n_channels):
+        self.count = int(count)
+        self.mean = np.zeros(channels) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.m2 = np.zeros(channels) if m2 is None else np.asarray(m2, dtype=np.float64)
+
+    def update(self, samples):
+        """
+        Adds a (n, channels) block: its own mean / M2 are computed vectorized and merged in.
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        if len(samples) == 0:
+            return self
+        block_mean = samples.mean(axis=0)
+        block_m2 = ((samples - block_mean) ** 2).sum(axis=0)
+        self.merge(ChannelStats(len(samples), block_mean, block_m2))
+        return self
+
+    def merge(self, other):
+        """
+        Merges another ChannelStats into this one in place (parallel variance formula).
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean.copy(), other.m2.copy()
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.m2 = self.m2 + other.m2 + delta * delta * (self.count * other.count / count)
+        self.count = count
+        return self
+
+    @property
+    def variance(self):
+        # sample variance (ddof=1), like the pandas .std() normalize_data.py used
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean.tolist(), 'm2': self.m2.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['count'], d['mean'], d['m2'])
+
+
+def merge_all(stats):
+    total = ChannelStats()
+    for s in stats:
+        total.merge(s)
+    return total
+
+
+def recording_stats(base_path, rows=chunk_rows, rate=None):
+    """
+    Streams one recording ("<base_path>.rec" or .csv) and returns its ChannelStats.
+    With rate, the stats are those of the recording resampled to rate Hz (as resample_data.py writes it).
+    """
+    resampler = Resampler(rate) if rate else None
+    stats = ChannelStats()
+    for chunk in iter_recording(base_path, rows):
+        samples = chunk.samples
+        if resampler is not None and chunk.timestamps is not None:
+            _, samples, _ = resampler.push(chunk.timestamps_in_seconds(), samples)
+        stats.update(samples)
+    return stats
+
+
+def fingerprint(base_path):
+    """
+    Size and mtime of the file holding the samples; a changed recording gets a new fingerprint.
+    """
+    rec_path = store_path(base_path)
+    if os.path.exists(os.path.join(rec_path, header_file)):
+        path = os.path.join(rec_path, samples_file)
+    else:
+        path = base_path + '.csv'
+    st = os.stat(path)
+    return [os.path.basename(path), st.st_size, st.st_mtime_ns]
+
+
+def load_stats_file(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_stats_file(path, entries):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def stats_key(base_path, rate=None):
+    name = os.path.basename(base_path)
+    return f"{name}@{rate:g}Hz" if rate else name
+
+
+def dataset_stats(base_paths, stats_path=None, rows=chunk_rows, jobs=1, rate=None):
+    """
+    Combined stats over base_paths. Per-recording stats are cached in stats_path (default: norm_stats.json
+    next to the first recording); recordings whose fingerprint did not change are not read again,
+    the others are scanned `jobs` at a time in worker processes. rate is passed on to recording_stats.
+    Returns (combined ChannelStats, list of the base paths that had to be scanned).
+    """
+    if stats_path is None:
+        stats_path = os.path.join(os.path.dirname(base_paths[0]), stats_file_name)
+    entries = load_stats_file(stats_path)
+
+    fingerprints = {base_path: fingerprint(base_path) for base_path in base_paths}
+    scanned = [base_path for base_path in dict.fromkeys(base_paths)
+               if entries.get(stats_key(base_path, rate), {}).get('fingerprint') != fingerprints[base_path]]
+    for base_path, stats in zip(scanned, run_jobs(recording_stats, [(base_path, rows, rate) for base_path in scanned], jobs)):
+        entries[stats_key(base_path, rate)] = {'fingerprint': fingerprints[base_path], 'stats': stats.to_dict()}
+
+    per_recording = [ChannelStats.from_dict(entries[stats_key(base_path, rate)]['stats']) for base_path in base_paths]
+
+    if scanned:
+        save_stats_file(stats_path, entries)
+    return merge_all(per_recording), scanned
+
+
+def write_norm_data(path, stats):
+    """
+    The means / stds C arrays pasted into final.ino.
+    """
+    with open(path, "w") as f:
+        f.write(f"const float means[{len(stats.mean)}] = {{")
+        f.write(", ".join(f"{m:.6f}" for m in stats.mean))
+        f.write("};\n")
+
+        f.write(f"const float stds[{len(stats.std)}] = {{")
+        f.write(", ".join(f"{s:.6f}" for s in stats.std))
+        f.write("};\n")
@@ -1,38 +1,46 @@
 import os
-import pandas as pd
+import sys
+import argparse
 import numpy as np
 
+from recording_store import load_recording, write_recording
+from norm_stats import dataset_stats, write_norm_data
+from parallel import add_jobs_argument, run_jobs
+from resample import add_stage_argument
+
 DATA_DIR = "gesture_data"
 GESTURES = ['infinity', 'kiss', 'double', 'flick', 'junk']
-SENSOR_COLUMNS = ['ax', 'ay', 'az', 'gx', 'gy', 'gz']
-
-all_data = []
-
-for gesture in GESTURES:
-    file_path = os.path.join(DATA_DIR, f"{gesture}_labeled.csv")
-    df = pd.read_csv(file_path)
-    all_data.append(df[SENSOR_COLUMNS])
-
-combined_df = pd.concat(all_data)
-means = combined_df.mean()
-stds = combined_df.std()
-
-for gesture in GESTURES:
-    file_path = os.path.join(DATA_DIR, f"{gesture}_labeled.csv")
-    df = pd.read_csv(file_path)
-    
-    df_normalized = df.copy()
-    for col in SENSOR_COLUMNS:
-        df_normalized[col] = (df[col] - means[col]) / stds[col]
-    
-    out_path = os.path.join(DATA_DIR, f"{gesture}_normalized.csv")
-    df_normalized.to_csv(out_path, index=False)
-
-with open("norm_data.txt", "w") as f:
-    f.write("const float means[6] = {")
-    f.write(", ".join(f"{means[col]:.6f}" for col in SENSOR_COLUMNS))
-    f.write("};\n")
-
-    f.write("const float stds[6] = {")
-    f.write(", ".join(f"{stds[col]:.6f}" for col in SENSOR_COLUMNS))
-    f.write("};\n")
\ No newline at end of file
+# --stage resampled cita izlaz resample_data.py; isti --stage treba dati test_novi_data.py i fake_wand.py
+# (magic_wand: MAGIC_WAND_STAGE), final.ino ne resampla pa je za plocicu samo "labeled"
+
+
+def normalize_recording(base_path, out_base, means, stds):
+    recording = load_recording(base_path)
+    normalized = ((recording.samples - means) / stds).astype(np.float32)
+
+    header = dict(recording.header, normalized=True, means=means, stds=stds)
+    write_recording(out_base, normalized, recording.timestamps, recording.labels, **header)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize the labeled (or resampled) recordings with the dataset mean / std.")
+    add_jobs_argument(parser)
+    add_stage_argument(parser)
+    args = parser.parse_args()
+
+    base_paths = [os.path.join(DATA_DIR, f"{gesture}_{args.stage}") for gesture in GESTURES]
+    # stats per snimku su spremljene u gesture_data/norm_stats.json, skeniraju se samo nove/promijenjene snimke
+    try:
+        stats, scanned = dataset_stats(base_paths, jobs=args.jobs)
+    except FileNotFoundError as e:
+        print(f"Error: {e}. Run {'resample_data.py' if args.stage == 'resampled' else 'label_sensor_data.py'} first.")
+        sys.exit(1)
+    print(f"Normalization stats: {len(scanned)} of {len(base_paths)} recordings scanned, {stats.count} samples total")
+    means = stats.mean
+    stds = stats.std
+
+    out_bases = [os.path.join(DATA_DIR, f"{gesture}_normalized") for gesture in GESTURES]
+    run_jobs(normalize_recording, [(base_path, out_base, means, stds) for base_path, out_base in zip(base_paths, out_bases)],
+             args.jobs)
+
+    write_norm_data("norm_data.txt", stats)
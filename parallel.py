@@ -0,0 +1,34 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pool helper for the dataset scripts. Every recording is processed independently, and the
+# workers write their results straight to .rec / .npy files, so only paths and small summaries travel
+# back through pickling.
+
+
+def add_jobs_argument(parser):
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help="worker processes, one recording per worker (0 = one per CPU core, default: 1)")
+
+
+def resolve_jobs(jobs):
+    if jobs == 0:
+        return os.cpu_count() or 1
+    return max(jobs, 1)
+
+
+def run_jobs(func, items, jobs=1, initializer=None, initargs=()):
+    """
+    [func(*item) for item in items], spread over `jobs` worker processes when jobs > 1.
+    Results are returned in the order of items, whatever order the workers finish in.
+    func must be a module level function (it is pickled by name for the workers).
+    initializer(*initargs) runs once in every worker (or once here, without workers) before any item.
+    """
+    items = [tuple(item) for item in items]
+    jobs = min(resolve_jobs(jobs), len(items))
+    if jobs <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(*item) for item in items]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as pool:
+        return list(pool.map(func, *zip(*items)))
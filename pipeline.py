@@ -0,0 +1,353 @@
+import os
+import random
+import argparse
+from collections import deque
+import numpy as np
+
+from create_windows import (label_map, gesture_names, window_size, junk_stride, sensor_sample_rate, load_intervals,
+                            max_injected_junk_samples,
+                            MAX_WINDOWS_PER_TRAIN_CLASS, JUNK_MULTIPLIER, test_win_per_class, split_dataset, save_dataset)
+from labeling import merge_intervals, in_intervals
+from recording_store import iter_recording, RecordingWriter, timestamp_units
+from windowing import sliding_windows, gyro_trigger_threshold
+from norm_stats import dataset_stats, write_norm_data
+from resample import Resampler, add_stage_argument, stage_rate, output_timestamp_unit
+
+# One pass from raw recordings to train/test npz:
+#   label -> (resample, with --stage resampled) -> normalize -> encode -> inject junk -> window
+# Every recording is streamed in chunk_rows chunks; only window_size - 1 rows (plus the rows of a junk gap,
+# see JunkInjector) are carried between chunks, so memory does not grow with recording length.
+
+data_dir = "gesture_data"
+norm_data_path = "norm_data.txt"
+stats_recordings = ['infinity', 'kiss', 'double', 'flick', 'junk'] # isti skup kao normalize_data.py
+chunk_rows = 100_000
+junk_label = 'junk'
+junk_code = label_map[junk_label]
+
+
+def raw_base_path(name):
+    # junk is logged already labeled and without timestamps
+    return os.path.join(data_dir, "junk_labeled" if name == junk_label else f"{name}_raw_data")
+
+
+class WindowReservoir:
+    """
+    Keeps a uniform random sample of at most `capacity` windows (reservoir sampling),
+    which is all the train/test split ever uses. capacity=None keeps every window.
+    """
+
+    def __init__(self, capacity=None, rng=None):
+        self.capacity = capacity
+        self.rng = rng or random.Random()
+        self.items = []
+        self.seen = 0
+
+    def add(self, window):
+        self.seen += 1
+        if self.capacity is None or len(self.items) < self.capacity:
+            self.items.append(np.array(window))
+            return
+        slot = self.rng.randrange(self.seen)
+        if slot < self.capacity:
+            self.items[slot] = np.array(window)
+
+
+class WindowCollector:
+    """
+    Cuts windows out of a stream of feature chunks.
+    With stride set it takes a window every `stride` samples (junk); otherwise a window starts at the first
+    trigger row of every interval id in `trigger_ids` (gestures). Windows that straddle a chunk boundary are
+    completed from the next chunk; only the last window_size - 1 rows are kept between chunks.
+    """
+
+    def __init__(self, sink, size=window_size, stride=None, n_features=6):
+        self.sink = sink
+        self.size = size
+        self.stride = stride
+        self.tail = np.empty((0, n_features), dtype=np.float32)
+        self.tail_start = 0
+        self.pending = []
+        self.triggered = set()
+        self.next_stride_start = 0
+
+    def push(self, features, trigger_ids=None):
+        features = np.asarray(features, dtype=np.float32)
+        buffer = np.concatenate([self.tail, features]) if len(self.tail) else features
+        buffer_start = self.tail_start
+        buffer_end = buffer_start + len(buffer)
+        chunk_start = buffer_end - len(features)
+
+        if self.stride is not None:
+            while self.next_stride_start + self.size <= buffer_end:
+                self.pending.append(self.next_stride_start)
+                self.next_stride_start += self.stride
+        elif trigger_ids is not None:
+            is_trigger = trigger_ids >= 0
+            if is_trigger.any():
+                ids, first = np.unique(trigger_ids[is_trigger], return_index=True)
+                positions = np.flatnonzero(is_trigger)[first]
+                for interval_id, position in sorted(zip(ids.tolist(), positions.tolist()), key=lambda x: x[1]):
+                    if interval_id not in self.triggered:
+                        self.triggered.add(interval_id)
+                        self.pending.append(chunk_start + position)
+
+        ready = [s for s in self.pending if s + self.size <= buffer_end]
+        self.pending = [s for s in self.pending if s + self.size > buffer_end]
+        if ready:
+            views = sliding_windows(buffer, self.size)
+            for start in ready:
+                self.sink.add(views[start - buffer_start])
+
+        keep = min(len(buffer), self.size - 1)
+        self.tail = buffer[len(buffer) - keep:].copy()
+        self.tail_start = buffer_end - keep
+
+
+class JunkInjector:
+    """
+    Streaming version of create_windows.inject_junk_between_intervals: after every interval but the last,
+    min(gap * sample_rate, max_rows) copies of the sample closest to the middle of the gap are inserted.
+    That sample lies ahead of the insertion point, so rows after an interval end are held back until it is known.
+    Rows are (timestamp in s, float32 features, trigger interval id); injected rows get trigger id -1.
+    """
+
+    def __init__(self, starts, ends, sample_rate=sensor_sample_rate, max_rows=max_injected_junk_samples):
+        self.plan = deque()
+        for i in range(len(starts) - 1):
+            gap = starts[i + 1] - ends[i]
+            if gap > 0:
+                count = min(int(gap * sample_rate), max_rows)
+                if count > 0:
+                    self.plan.append((ends[i], (ends[i] + starts[i + 1]) / 2, count))
+        self.held = None
+        self.previous = None
+
+    def push(self, timestamps, features, trigger_ids):
+        piece = (timestamps, features, trigger_ids)
+        self.held = piece if self.held is None else tuple(np.concatenate([a, b]) for a, b in zip(self.held, piece))
+        return self._drain(final=False)
+
+    def finish(self):
+        return self._drain(final=True)
+
+    def _emit(self, stop, out):
+        timestamps, features, trigger_ids = self.held
+        if stop > 0:
+            # remember the first row carrying the last emitted timestamp (idxmin picks the first of equal rows)
+            last = timestamps[stop - 1]
+            first = int(np.searchsorted(timestamps[:stop], last, side='left'))
+            if not (first == 0 and self.previous is not None and self.previous[0] == last):
+                self.previous = (last, features[first])
+            out.append((features[:stop], trigger_ids[:stop]))
+        self.held = (timestamps[stop:], features[stop:], trigger_ids[stop:])
+
+    def _closest_row(self, mid):
+        timestamps, features, _ = self.held
+        q = int(np.searchsorted(timestamps, mid, side='left'))
+        left = None
+        if q > 0:
+            first = int(np.searchsorted(timestamps, timestamps[q - 1], side='left'))
+            if first == 0 and self.previous is not None and self.previous[0] == timestamps[q - 1]:
+                left = self.previous
+            else:
+                left = (timestamps[first], features[first])
+        elif self.previous is not None:
+            left = self.previous
+        right = (timestamps[q], features[q]) if q < len(timestamps) else None
+
+        if left is None:
+            return right
+        if right is None or abs(left[0] - mid) <= abs(right[0] - mid):
+            return left
+        return right
+
+    def _drain(self, final):
+        out = []
+        if self.held is None:
+            return out
+        while self.plan:
+            end, mid, count = self.plan[0]
+            timestamps = self.held[0]
+            insert_at = int(np.searchsorted(timestamps, end, side='right'))
+            if insert_at == len(timestamps) and not final:
+                self._emit(insert_at, out)
+                return out
+            self._emit(insert_at, out)
+
+            if np.searchsorted(self.held[0], mid, side='left') == len(self.held[0]) and not final:
+                return out
+            closest = self._closest_row(mid)
+            if closest is not None:
+                out.append((np.repeat(closest[1][None, :], count, axis=0), np.full(count, -1, dtype=np.int64)))
+            self.plan.popleft()
+
+        self._emit(len(self.held[0]), out)
+        return out
+
+
+class StageWriters:
+    """
+    --debug: also writes the labeled / resampled / normalized / final .rec intermediates the separate scripts produce.
+    """
+
+    def __init__(self, name, header, has_timestamp, stages, stage_headers=None):
+        self.writers = {}
+        for stage in stages:
+            stage_header = (stage_headers or {}).get(stage, header)
+            self.writers[stage] = RecordingWriter(os.path.join(data_dir, f"{name}_{stage}"), has_timestamp=has_timestamp,
+                                                  has_label=True, **stage_header)
+
+    def append(self, stage, samples, timestamps, labels):
+        if stage in self.writers:
+            self.writers[stage].append(samples, timestamps, labels)
+
+    def update_header(self, stages, **header):
+        for stage in stages:
+            if stage in self.writers:
+                self.writers[stage].header.update(header)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+def stream_gesture(gesture, means, stds, sink, rows=chunk_rows, debug=False, rate=None):
+    intervals = load_intervals(os.path.join(data_dir, f"{gesture}_intervals.txt"))
+    intervals = sorted(intervals, key=lambda x: x['start_time'])
+    starts = np.array([iv['start_time'] for iv in intervals], dtype=np.float64)
+    ends = np.array([iv['end_time'] for iv in intervals], dtype=np.float64)
+
+    injector = JunkInjector(starts, ends)
+    collector = WindowCollector(sink)
+    resampler = Resampler(rate) if rate else None
+    grid_stages = ['resampled', 'normalized', 'final']
+    writers = None
+    gesture_code = label_map[gesture]
+
+    for chunk in iter_recording(raw_base_path(gesture), rows):
+        scale = float(timestamp_units[chunk.header['timestamp_unit']])
+        if writers is None and debug:
+            header = dict(chunk.header, label_names=list(label_map), normalized=True, means=means, stds=stds)
+            if resampler is None:
+                writers = StageWriters(gesture, header, True, ['labeled', 'normalized', 'final'])
+            else:
+                grid_header = dict(header, sample_rate=rate, timestamp_unit=output_timestamp_unit, resampled=True)
+                writers = StageWriters(gesture, header, True, ['labeled'] + grid_stages,
+                                       {stage: grid_header for stage in grid_stages})
+
+        # label: the same interval join as labeling.label_stored_recording, already encoded with label_map
+        merged_starts, merged_ends = merge_intervals(starts * scale, ends * scale)
+        inside = in_intervals(chunk.timestamps, merged_starts, merged_ends)
+        labels = np.where(inside, gesture_code, junk_code).astype(np.int8)
+        if writers is not None:
+            writers.append('labeled', chunk.samples, chunk.timestamps, labels)
+
+        seconds = chunk.timestamps / scale
+        samples = chunk.samples
+        timestamps = chunk.timestamps
+        if resampler is not None:
+            # as resample_data.py: uniform grid, labels from the nearest labeled sample
+            seconds, samples, labels = resampler.push(seconds, samples, labels)
+            timestamps = np.round(seconds * timestamp_units[output_timestamp_unit]).astype(np.int64)
+            if writers is not None:
+                writers.append('resampled', samples, timestamps, labels)
+
+        # normalize
+        normalized = (np.asarray(samples, dtype=np.float64) - means) / stds
+
+        # trigger rows: first |g| >= threshold of each interval, as in create_windows.extract_gesture_windows
+        interval_ids = np.searchsorted(starts, seconds, side='right') - 1
+        in_interval = (interval_ids >= 0) & (seconds <= ends[np.maximum(interval_ids, 0)])
+        is_trigger = in_interval & (labels == gesture_code) & (np.abs(normalized[:, 3:6]) >= gyro_trigger_threshold).any(axis=1)
+        trigger_ids = np.where(is_trigger, interval_ids, -1)
+
+        features = normalized.astype(np.float32)
+        if writers is not None:
+            writers.append('normalized', features, timestamps, labels)
+            writers.append('final', features, timestamps, labels)
+
+        for piece_features, piece_triggers in injector.push(seconds, features, trigger_ids):
+            collector.push(piece_features, piece_triggers)
+
+    for piece_features, piece_triggers in injector.finish():
+        collector.push(piece_features, piece_triggers)
+    if writers is not None:
+        if resampler is not None:
+            writers.update_header(grid_stages, grid_segments=resampler.segments)
+        writers.close()
+
+
+def stream_junk(means, stds, sink, rows=chunk_rows, debug=False):
+    collector = WindowCollector(sink, stride=junk_stride)
+    writers = None
+    for chunk in iter_recording(raw_base_path(junk_label), rows):
+        if writers is None and debug:
+            header = dict(chunk.header, label_names=list(label_map), normalized=True, means=means, stds=stds)
+            writers = StageWriters(junk_label, header, chunk.timestamps is not None, ['normalized', 'final'])
+
+        features = ((np.asarray(chunk.samples, dtype=np.float64) - means) / stds).astype(np.float32)
+        if writers is not None:
+            labels = np.full(len(features), junk_code, dtype=np.int8)
+            writers.append('normalized', features, chunk.timestamps, labels)
+            writers.append('final', features, chunk.timestamps, labels)
+        collector.push(features)
+    if writers is not None:
+        writers.close()
+
+
+def build_windows(means, stds, rows=chunk_rows, debug=False, keep_all=False, rng=None, rate=None):
+    """
+    Streams every gesture recording and the junk recording; returns ({label: [windows]}, {label: [labels]}).
+    Unless keep_all, each class keeps only the windows the split can use (reservoir sampling).
+    With rate, the gesture recordings are resampled to rate Hz (junk has no timestamps and is used as is).
+    """
+    rng = rng or random.Random()
+    all_windows = {}
+    all_labels = {}
+
+    for gesture in gesture_names:
+        sink = WindowReservoir(None if keep_all else test_win_per_class + MAX_WINDOWS_PER_TRAIN_CLASS, rng)
+        try:
+            stream_gesture(gesture, means, stds, sink, rows=rows, debug=debug, rate=rate)
+        except FileNotFoundError as e:
+            print(f"Error: Missing files for '{gesture}' gesture ({e}). Skipping.")
+            continue
+        all_windows[gesture] = sink.items
+        all_labels[gesture] = [label_map[gesture]] * len(sink.items)
+        print(f"Processed {sink.seen} windows for gesture '{gesture}'.")
+
+    sink = WindowReservoir(None if keep_all else test_win_per_class + int(MAX_WINDOWS_PER_TRAIN_CLASS * JUNK_MULTIPLIER), rng)
+    try:
+        stream_junk(means, stds, sink, rows=rows, debug=debug)
+        all_windows[junk_label] = sink.items
+        all_labels[junk_label] = [junk_code] * len(sink.items)
+        print(f"Processed {sink.seen} windows for 'junk'.")
+    except FileNotFoundError as e:
+        print(f"Error: Missing junk data ({e}). No junk windows will be included.")
+
+    return all_windows, all_labels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Raw recordings -> train/test npz in one streaming pass.")
+    parser.add_argument('--chunk-rows', type=int, default=chunk_rows, help="rows read per chunk")
+    parser.add_argument('--seed', type=int, default=None, help="seed for the reservoirs and the train/test split")
+    parser.add_argument('--debug', action='store_true', help="also write the *_labeled/_resampled/_normalized/_final .rec intermediates")
+    add_stage_argument(parser)
+    args = parser.parse_args()
+    rate = stage_rate(args.stage)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    rng = random.Random(args.seed)
+
+    stats, scanned = dataset_stats([raw_base_path(name) for name in stats_recordings], rows=args.chunk_rows, rate=rate)
+    means, stds = stats.mean, stats.std
+    write_norm_data(norm_data_path, stats)
+    print(f"Normalization stats written to {norm_data_path} ({len(scanned)} recordings scanned).")
+
+    all_windows, all_labels = build_windows(means, stds, rows=args.chunk_rows, debug=args.debug, rng=rng, rate=rate)
+
+    X_train, y_train, X_test, y_test = split_dataset(all_windows, all_labels)
+    save_dataset(X_train, y_train, X_test, y_test)
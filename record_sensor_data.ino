@@ -1,7 +1,17 @@
 #include <Arduino_BMI270_BMM150.h> // bmi270 akc i ziro, bmi150 mag
 
+#define BINARY_FRAMES 0 // 1 = binarni okviri od 31 bajt umjesto teksta (log_sensor_data.py --binary / log_junk_data.py --binary)
+
 unsigned long startTime;
 
+// 0xA5 0x5A, uint32 timestamp, 6 x float32, XOR payload bajtova; little endian kao i nRF52840
+struct __attribute__((packed)) Frame {
+  uint8_t sync[2];
+  uint32_t timestamp;
+  float values[6];
+  uint8_t checksum;
+};
+
 void setup() {
   Serial.begin(115200); // serial.begin() ne vraca nis
   // 115200 brzina prijenosa, otp duplo od prosjecne brzine ulaznih podataka sa senzora
@@ -25,9 +35,18 @@ void loop() {
 
     unsigned long timestamp = millis() - startTime;
 
+#if BINARY_FRAMES
+    Frame frame = {{0xA5, 0x5A}, (uint32_t)timestamp, {ax, ay, az, gx, gy, gz}, 0};
+    const uint8_t* payload = (const uint8_t*)&frame.timestamp;
+    for (size_t i = 0; i < sizeof(frame.timestamp) + sizeof(frame.values); i++) {
+      frame.checksum ^= payload[i];
+    }
+    Serial.write((const uint8_t*)&frame, sizeof(frame));
+#else
     char buffer[128];
     snprintf(buffer, sizeof(buffer), "%lu,%.6f,%.6f,%.6f,%.6f,%.6f,%.6f",
               timestamp, ax, ay, az, gx, gy, gz);
     Serial.println(buffer);
+#endif
   }
 }
\ No newline at end of file
@@ -0,0 +1,242 @@
+import os
+import json
+import numpy as np
+
+from recording_store import iter_recording, csv_chunk_rows
+
+# Timing / labeling quality of a recording, computed chunk by chunk so multi-hour captures never have to
+# be loaded. Everything that crosses a chunk boundary (last timestamp, the open segment, the open label
+# run) is carried in the analyzer, so the result does not depend on the chunk size.
+#
+# A segment is a stretch of samples without a clock reset (timestamp going backwards) or a pause longer
+# than segment_break_seconds. Inside a segment, an interval longer than gap_factor sample periods is a
+# gap and round(interval / period) - 1 samples are counted as dropped there.
+
+gap_factor = 1.5
+segment_break_seconds = 1.0
+histogram_resolution = 1e-4 # 0.1 ms
+histogram_max_seconds = 1.0
+rate_tolerance = 0.1 # segment efektivne frekvencije izvan +-10% nominalne je los
+max_dropped_fraction = 0.05
+max_listed_resets = 100
+report_file_name = "quality_report.json"
+
+
+class RecordingQuality:
+    """
+    Feed chunks with update(timestamps in seconds, label codes), then call report().
+    Either array may be None (e.g. junk recordings have no timestamps).
+    """
+
+    def __init__(self, sample_rate=88, label_names=None):
+        self.sample_rate = sample_rate
+        self.period = 1.0 / sample_rate
+        self.label_names = label_names
+        self.samples = 0
+
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.histogram = np.zeros(int(round(histogram_max_seconds / histogram_resolution)) + 2, dtype=np.int64)
+        self.interval_sum = 0.0
+        self.interval_count = 0
+        self.gaps = 0
+        self.dropped = 0
+        self.longest_gap = 0.0
+        self.resets = 0
+        self.reset_indices = []
+        self.segments = []
+        self.segment = None
+
+        self.run_label = None
+        self.run_length = 0
+        self.runs = {}
+
+    def update(self, timestamps=None, labels=None):
+        n = len(timestamps) if timestamps is not None else len(labels)
+        if timestamps is not None and n:
+            self.update_timestamps(np.asarray(timestamps, dtype=np.float64))
+        if labels is not None and n:
+            self.update_labels(np.asarray(labels))
+        self.samples += n
+        return self
+
+    def update_timestamps(self, ts):
+        if self.last_timestamp is None:
+            self.first_timestamp = float(ts[0])
+            self.segment = self.new_segment(self.samples, ts[0], 'start')
+            full = ts
+            first_index = self.samples + 1
+        else:
+            full = np.concatenate([[self.last_timestamp], ts])
+            first_index = self.samples
+        dt = np.diff(full)
+        # indeks uzorka u kojem interval zavrsava
+        ends = np.arange(len(dt)) + first_index
+
+        forward = dt >= 0
+        bins = np.minimum(np.round(dt[forward] / histogram_resolution).astype(np.int64), len(self.histogram) - 1)
+        self.histogram += np.bincount(bins, minlength=len(self.histogram))
+        self.interval_sum += float(dt[forward].sum())
+        self.interval_count += int(forward.sum())
+
+        resets = dt < 0
+        pauses = dt > segment_break_seconds
+        breaks = resets | pauses
+        gaps = (dt > gap_factor * self.period) & ~breaks
+        dropped = np.where(gaps, np.round(dt / self.period) - 1, 0).astype(np.int64)
+        self.gaps += int(gaps.sum())
+        self.dropped += int(dropped.sum())
+        if gaps.any():
+            self.longest_gap = max(self.longest_gap, float(dt[gaps].max()))
+        self.resets += int(resets.sum())
+        self.reset_indices.extend(ends[resets][:max_listed_resets - len(self.reset_indices)].tolist())
+
+        # interval i pripada segmentu segment_of[i]; prekid otvara novi segment u uzorku ends[i]
+        segment_of = np.cumsum(breaks)
+        per_segment_samples = np.bincount(segment_of, minlength=int(breaks.sum()) + 1)
+        per_segment_gaps = np.bincount(segment_of, weights=gaps, minlength=len(per_segment_samples)).astype(np.int64)
+        per_segment_dropped = np.bincount(segment_of, weights=dropped, minlength=len(per_segment_samples)).astype(np.int64)
+
+        for k, i in enumerate(np.flatnonzero(breaks)):
+            self.add_to_segment(per_segment_samples[k], per_segment_gaps[k], per_segment_dropped[k])
+            self.close_segment(ends[i] - 1, full[i])
+            self.segment = self.new_segment(ends[i], full[i + 1], 'clock_reset' if resets[i] else 'pause')
+            self.segment['samples'] = 0
+        k = len(per_segment_samples) - 1
+        self.add_to_segment(per_segment_samples[k], per_segment_gaps[k], per_segment_dropped[k])
+        self.last_timestamp = float(full[-1])
+
+    def new_segment(self, start_index, start_time, reason):
+        return {'start_index': int(start_index), 'start_time': float(start_time), 'starts_with': reason,
+                'samples': 1, 'gaps': 0, 'dropped': 0}
+
+    def add_to_segment(self, samples, gaps, dropped):
+        self.segment['samples'] += int(samples)
+        self.segment['gaps'] += int(gaps)
+        self.segment['dropped'] += int(dropped)
+
+    def close_segment(self, end_index, end_time):
+        self.segments.append(self.finish_segment(self.segment, end_index, end_time))
+
+    def finish_segment(self, segment, end_index, end_time):
+        seg = dict(segment, end_index=int(end_index), end_time=float(end_time))
+        duration = seg['end_time'] - seg['start_time']
+        seg['rate_hz'] = (seg['samples'] - 1) / duration if duration > 0 else None
+        seg['dropped_fraction'] = seg['dropped'] / (seg['samples'] + seg['dropped'])
+        seg['ok'] = (seg['rate_hz'] is not None and abs(seg['rate_hz'] / self.sample_rate - 1) <= rate_tolerance
+                     and seg['dropped_fraction'] <= max_dropped_fraction)
+        return seg
+
+    def update_labels(self, labels):
+        change = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+        starts = np.concatenate([[0], change])
+        lengths = np.diff(np.concatenate([starts, [len(labels)]]))
+        run_labels = labels[starts]
+
+        if self.run_label is not None and run_labels[0] == self.run_label:
+            lengths[0] += self.run_length
+        elif self.run_label is not None:
+            self.add_runs(np.array([self.run_label]), np.array([self.run_length]))
+        # zadnji run mozda nastavlja u sljedecem chunku
+        self.add_runs(run_labels[:-1], lengths[:-1])
+        self.run_label, self.run_length = run_labels[-1], int(lengths[-1])
+
+    def add_runs(self, run_labels, lengths):
+        for label in np.unique(run_labels):
+            label_lengths = lengths[run_labels == label]
+            name = self.label_name(label)
+            stats = self.runs.setdefault(name, {'count': 0, 'total': 0, 'min': None, 'max': None})
+            stats['count'] += len(label_lengths)
+            stats['total'] += int(label_lengths.sum())
+            stats['min'] = int(label_lengths.min()) if stats['min'] is None else min(stats['min'], int(label_lengths.min()))
+            stats['max'] = int(label_lengths.max()) if stats['max'] is None else max(stats['max'], int(label_lengths.max()))
+
+    def label_name(self, code):
+        if self.label_names is not None and 0 <= code < len(self.label_names):
+            return self.label_names[code]
+        return str(code)
+
+    def interval_percentiles(self, percentiles=(50, 90, 99, 99.9)):
+        """
+        Interval percentiles in seconds from the histogram (histogram_resolution precision;
+        intervals over histogram_max_seconds all land in the last bin).
+        """
+        total = self.histogram.sum()
+        if total == 0:
+            return {}
+        cumulative = np.cumsum(self.histogram)
+        bins = np.searchsorted(cumulative, np.array(percentiles) / 100.0 * total, side='left')
+        return {f"p{p:g}": round(float(b * histogram_resolution), 6) for p, b in zip(percentiles, bins)}
+
+    def report(self):
+        report = {'samples': self.samples, 'nominal_rate_hz': self.sample_rate}
+
+        if self.last_timestamp is not None:
+            # otvoreni segment se zatvara samo u izvjestaju, update() moze nastaviti
+            segments = self.segments + [self.finish_segment(self.segment, self.samples - 1, self.last_timestamp)]
+            mean_interval = self.interval_sum / self.interval_count if self.interval_count else None
+            nonzero = np.flatnonzero(self.histogram)
+            report.update({
+                'first_timestamp_s': self.first_timestamp,
+                'last_timestamp_s': self.last_timestamp,
+                'duration_s': sum(seg['end_time'] - seg['start_time'] for seg in segments),
+                'interval_s': {
+                    'mean': mean_interval,
+                    'min': round(float(nonzero[0] * histogram_resolution), 6) if len(nonzero) else None,
+                    'max': round(float(nonzero[-1] * histogram_resolution), 6) if len(nonzero) else None,
+                    **self.interval_percentiles(),
+                },
+                'rate_hz': 1.0 / mean_interval if mean_interval else None,
+                'gaps': {'count': self.gaps, 'dropped_samples': self.dropped, 'longest_s': self.longest_gap},
+                'clock_resets': {'count': self.resets, 'at_samples': self.reset_indices},
+                'segments': segments,
+                'bad_segments': sum(not seg['ok'] for seg in segments),
+            })
+
+        if self.run_label is not None:
+            runs = {name: dict(stats) for name, stats in self.runs.items()}
+            # otvoreni run na kraju snimke
+            stats = runs.setdefault(self.label_name(self.run_label), {'count': 0, 'total': 0, 'min': None, 'max': None})
+            stats['count'] += 1
+            stats['total'] += self.run_length
+            stats['min'] = self.run_length if stats['min'] is None else min(stats['min'], self.run_length)
+            stats['max'] = self.run_length if stats['max'] is None else max(stats['max'], self.run_length)
+            for stats in runs.values():
+                stats['mean'] = stats['total'] / stats['count']
+                if report.get('interval_s', {}).get('mean'):
+                    stats['mean_s'] = stats['mean'] * report['interval_s']['mean']
+            report['label_runs'] = dict(sorted(runs.items()))
+
+        return report
+
+
+def analyze_recording(base_path, chunk_rows=csv_chunk_rows):
+    """
+    Streams "<base_path>.rec" (or .csv) through a RecordingQuality and returns its report.
+    """
+    quality = None
+    for chunk in iter_recording(base_path, chunk_rows):
+        if quality is None:
+            quality = RecordingQuality(chunk.sample_rate, chunk.label_names)
+        timestamps = None if chunk.timestamps is None else chunk.timestamps_in_seconds()
+        quality.update(timestamps, chunk.labels)
+    if quality is None:
+        return {'samples': 0}
+    return quality.report()
+
+
+def save_report(path, reports):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(reports, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def bad_segments(report_path, name):
+    """
+    (start_time, end_time) in seconds of the segments of recording `name` the report marks as not ok,
+    for create_windows.py --reject-bad-segments to skip.
+    """
+    with open(report_path) as f:
+        report = json.load(f).get(name, {})
+    return [(seg['start_time'], seg['end_time']) for seg in report.get('segments', []) if not seg['ok']]
@@ -0,0 +1,372 @@
+import os
+import json
+import struct
+import numpy as np
+import pandas as pd
+
+# A recording is stored as a directory "<name>.rec" holding
+#   samples.npy    float32 (n, 6)   ax, ay, az, gx, gy, gz
+#   timestamp.npy  int64 (n,)       only for recordings that have timestamps
+#   label.npy      int8 (n,)        index into label_names, -1 = unlabeled
+#   header.json    sample rate, timestamp unit, label names, normalization stats
+# The .npy files are plain NumPy arrays, so opening a recording is a memmap and nothing is parsed.
+
+store_suffix = '.rec'
+format_version = 1
+
+sensor_cols = ['ax', 'ay', 'az', 'gx', 'gy', 'gz']
+label_names = ['double', 'flick', 'infinity', 'junk', 'kiss']
+default_sample_rate = 88
+unlabeled = -1
+
+samples_file = 'samples.npy'
+timestamp_file = 'timestamp.npy'
+label_file = 'label.npy'
+header_file = 'header.json'
+
+timestamp_units = {'s': 1, 'ms': 1000, 'us': 1000000}
+
+# fixed npy header size so a streamed file can be finalized in place
+npy_header_size = 128
+csv_chunk_rows = 500_000
+
+
+class Recording:
+    """
+    One IMU recording: float32 samples (n, 6), optional int64 timestamps, int8 label codes and the header.
+    Arrays are read-only memmaps when the recording was opened from disk.
+    """
+
+    def __init__(self, samples, timestamps=None, labels=None, header=None):
+        self.samples = samples
+        self.timestamps = timestamps
+        self.labels = labels
+        self.header = make_header(**(header or {}))
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def sample_rate(self):
+        return self.header['sample_rate']
+
+    @property
+    def label_names(self):
+        return self.header['label_names']
+
+    def timestamps_in_seconds(self):
+        return self.timestamps / float(timestamp_units[self.header['timestamp_unit']])
+
+    def label_strings(self):
+        names = np.array(self.label_names + [''], dtype=object)
+        return names[self.labels]
+
+    def to_dataframe(self):
+        """
+        Same columns as the CSV stages: timestamp (if any), the sensor columns and label (if any).
+        """
+        df = pd.DataFrame(np.asarray(self.samples), columns=sensor_cols)
+        if self.timestamps is not None:
+            df.insert(0, 'timestamp', np.asarray(self.timestamps))
+        if self.labels is not None:
+            df['label'] = np.asarray(self.labels)
+        return df
+
+
+def make_header(sample_rate=default_sample_rate, timestamp_unit='ms', label_names=label_names,
+                normalized=False, means=None, stds=None, **extra):
+    header = {
+        'format_version': format_version,
+        'columns': list(sensor_cols),
+        'sample_rate': sample_rate,
+        'timestamp_unit': timestamp_unit,
+        'label_names': list(label_names),
+        'normalized': normalized,
+        'means': None if means is None else [float(m) for m in means],
+        'stds': None if stds is None else [float(s) for s in stds],
+    }
+    header.update(extra)
+    header.pop('rows', None)
+    header.pop('has_timestamp', None)
+    header.pop('has_label', None)
+    return header
+
+
+def store_path(base_path):
+    return base_path if base_path.endswith(store_suffix) else base_path + store_suffix
+
+
+def recording_files(base_path):
+    """
+    Files holding the recording load_recording(base_path) would open: the .rec store files if the store
+    exists, otherwise the CSV.
+    """
+    rec_path = store_path(base_path)
+    if os.path.exists(os.path.join(rec_path, header_file)):
+        names = [header_file, samples_file, timestamp_file, label_file]
+        return [os.path.join(rec_path, name) for name in names if os.path.exists(os.path.join(rec_path, name))]
+    csv_path = base_path + '.csv'
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Neither {rec_path} nor {csv_path} exists")
+    return [csv_path]
+
+
+def _npy_header(dtype, shape):
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': tuple(shape)})
+    header = header.encode('latin1')
+    magic = np.lib.format.magic(1, 0)
+    padding = npy_header_size - len(magic) - 2 - len(header) - 1
+    if padding < 0:
+        raise ValueError(f"npy header for shape {shape} does not fit in {npy_header_size} bytes")
+    return magic + struct.pack('<H', len(header) + padding + 1) + header + b' ' * padding + b'\n'
+
+
+class RecordingWriter:
+    """
+    Appends blocks of samples (and timestamps / labels) to a new recording without keeping them in memory.
+    The npy headers are rewritten with the final row count on close().
+    """
+
+    def __init__(self, path, has_timestamp=True, has_label=False, **header):
+        self.path = store_path(path)
+        self.has_timestamp = has_timestamp
+        self.has_label = has_label
+        self.header = make_header(**header)
+        self.rows = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        # a stale header.json would make a half-written recording look complete
+        if os.path.exists(os.path.join(self.path, header_file)):
+            os.remove(os.path.join(self.path, header_file))
+
+        self.columns = [(samples_file, np.float32, (len(sensor_cols),))]
+        if has_timestamp:
+            self.columns.append((timestamp_file, np.int64, ()))
+        if has_label:
+            self.columns.append((label_file, np.int8, ()))
+
+        self.files = {}
+        for name, dtype, tail in self.columns:
+            f = open(os.path.join(self.path, name), 'wb')
+            f.write(_npy_header(dtype, (0,) + tail))
+            self.files[name] = f
+
+        for name in (timestamp_file, label_file):
+            if name not in self.files and os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+
+    def append(self, samples, timestamps=None, labels=None):
+        samples = np.ascontiguousarray(samples, dtype=np.float32).reshape(-1, len(sensor_cols))
+        self.files[samples_file].write(samples.tobytes())
+        if self.has_timestamp:
+            self.files[timestamp_file].write(np.ascontiguousarray(timestamps, dtype=np.int64).tobytes())
+        if self.has_label:
+            self.files[label_file].write(np.ascontiguousarray(labels, dtype=np.int8).tobytes())
+        self.rows += len(samples)
+
+    def close(self):
+        for name, dtype, tail in self.columns:
+            f = self.files[name]
+            f.seek(0)
+            f.write(_npy_header(dtype, (self.rows,) + tail))
+            f.close()
+        self.files = {}
+
+        header = dict(self.header, rows=self.rows, has_timestamp=self.has_timestamp, has_label=self.has_label)
+        with open(os.path.join(self.path, header_file), 'w') as f:
+            json.dump(header, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_recording(path, samples, timestamps=None, labels=None, chunk_rows=csv_chunk_rows, **header):
+    """
+    Writes a whole recording. timestamps / labels may be None.
+    """
+    with RecordingWriter(path, has_timestamp=timestamps is not None, has_label=labels is not None, **header) as writer:
+        for start in range(0, len(samples), chunk_rows):
+            stop = start + chunk_rows
+            writer.append(samples[start:stop],
+                          None if timestamps is None else timestamps[start:stop],
+                          None if labels is None else labels[start:stop])
+    return store_path(path)
+
+
+def open_recording(path, mmap=True):
+    """
+    Opens a .rec recording. With mmap=True the arrays are read-only memmaps (zero-copy).
+    """
+    path = store_path(path)
+    with open(os.path.join(path, header_file)) as f:
+        header = json.load(f)
+    if header.get('format_version', 0) > format_version:
+        raise ValueError(f"{path} has format version {header['format_version']}, this reader supports {format_version}")
+
+    # an empty file cannot be memory-mapped
+    mmap_mode = 'r' if mmap and header.get('rows', 0) > 0 else None
+    samples = np.load(os.path.join(path, samples_file), mmap_mode=mmap_mode)
+    timestamps = np.load(os.path.join(path, timestamp_file), mmap_mode=mmap_mode) if header.get('has_timestamp') else None
+    labels = np.load(os.path.join(path, label_file), mmap_mode=mmap_mode) if header.get('has_label') else None
+    return Recording(samples, timestamps, labels, header)
+
+
+def labels_are_codes(values):
+    """
+    True if a label column is already enumerated (every value a number), False if it holds names.
+    """
+    return bool(pd.to_numeric(pd.Series(values), errors='coerce').notna().all())
+
+
+def encode_labels(values, names=label_names, numeric=None):
+    """
+    Label column from a CSV to int8 codes. Accepts names ('kiss') or an already enumerated column (4);
+    anything unknown becomes -1. numeric says which of the two the column is (None: labels_are_codes(values));
+    a chunked reader decides it once per file, so the same value never gets two codes.
+    """
+    values = pd.Series(values)
+    if numeric is None:
+        numeric = labels_are_codes(values)
+    if numeric:
+        codes = pd.to_numeric(values, errors='coerce').fillna(unlabeled).to_numpy(dtype=np.int64, copy=True)
+    else:
+        # old gesture names like '4' or '8' must not be mistaken for codes, so names are matched as names only
+        lookup = {name: idx for idx, name in enumerate(names)}
+        codes = values.astype(str).map(lookup).fillna(unlabeled).to_numpy(dtype=np.int64, copy=True)
+    codes[(codes < 0) | (codes >= len(names))] = unlabeled
+    return codes.astype(np.int8)
+
+
+def guess_timestamp_unit(timestamps, sample_rate=default_sample_rate):
+    """
+    The loggers wrote millis() but some sessions (novi) were recorded with micros().
+    Picks the unit whose median sample interval is closest to 1 / sample_rate.
+    """
+    if len(timestamps) < 2:
+        return 'ms'
+    median_step = float(np.median(np.diff(np.asarray(timestamps[:10000], dtype=np.float64))))
+    if median_step <= 0:
+        return 'ms'
+    expected = 1.0 / sample_rate
+    return min(timestamp_units, key=lambda unit: abs(np.log(median_step / timestamp_units[unit] / expected)))
+
+
+def _csv_chunk_to_arrays(chunk, names, numeric_labels=None):
+    """
+    (samples, timestamps, labels, numeric_labels) of one CSV chunk. numeric_labels is decided from the first
+    chunk with rows; pass it back in for the following chunks of the same file.
+    """
+    for col in sensor_cols:
+        if col not in chunk.columns:
+            raise ValueError(f"Missing sensor column: {col}")
+    # raw logs contain repeated header lines and status messages ("IMU initialized...")
+    numeric = chunk[sensor_cols].apply(pd.to_numeric, errors='coerce')
+    timestamps = None
+    if 'timestamp' in chunk.columns:
+        timestamps = pd.to_numeric(chunk['timestamp'], errors='coerce')
+        keep = numeric.notna().all(axis=1) & timestamps.notna()
+        timestamps = timestamps[keep].to_numpy(dtype=np.int64)
+    else:
+        keep = numeric.notna().all(axis=1)
+    samples = numeric[keep].to_numpy(dtype=np.float32)
+    labels = None
+    if 'label' in chunk.columns:
+        values = chunk.loc[keep, 'label']
+        if numeric_labels is None and len(values):
+            numeric_labels = labels_are_codes(values)
+        labels = encode_labels(values, names, numeric_labels)
+    return samples, timestamps, labels, numeric_labels
+
+
+def convert_csv(csv_path, rec_path=None, timestamp_unit=None, chunk_rows=csv_chunk_rows, **header):
+    """
+    Streams a CSV recording (any pipeline stage) into a .rec store next to it. Returns the store path.
+    """
+    rec_path = store_path(rec_path or os.path.splitext(csv_path)[0])
+    names = header.get('label_names', label_names)
+
+    writer = None
+    numeric_labels = None
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=str):
+            samples, timestamps, labels, numeric_labels = _csv_chunk_to_arrays(chunk, names, numeric_labels)
+            if writer is None:
+                if timestamps is not None and timestamp_unit is None:
+                    timestamp_unit = guess_timestamp_unit(timestamps, header.get('sample_rate', default_sample_rate))
+                writer = RecordingWriter(rec_path, has_timestamp=timestamps is not None, has_label=labels is not None,
+                                         timestamp_unit=timestamp_unit or 'ms', **header)
+            writer.append(samples, timestamps, labels)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError(f"{csv_path} has no rows")
+    return rec_path
+
+
+def export_csv(rec_path, csv_path, label_as_name=True, chunk_rows=csv_chunk_rows):
+    """
+    Writes a .rec recording back out as CSV, e.g. for the plotting scripts.
+    """
+    recording = open_recording(rec_path)
+    names = np.array(recording.label_names + [''], dtype=object)
+    with open(csv_path, 'w', newline='') as f:
+        for start in range(0, len(recording), chunk_rows):
+            stop = start + chunk_rows
+            df = pd.DataFrame(np.asarray(recording.samples[start:stop]), columns=sensor_cols)
+            if recording.timestamps is not None:
+                df.insert(0, 'timestamp', np.asarray(recording.timestamps[start:stop]))
+            if recording.labels is not None:
+                codes = np.asarray(recording.labels[start:stop])
+                df['label'] = names[codes] if label_as_name else codes
+            df.to_csv(f, index=False, header=start == 0)
+
+
+def load_recording(base_path, mmap=True, **header):
+    """
+    Opens "<base_path>.rec" if it exists, otherwise reads "<base_path>.csv" into an in-memory Recording.
+    base_path is a stage path without extension, e.g. gesture_data/kiss_final.
+    """
+    rec_path = store_path(base_path)
+    if os.path.exists(os.path.join(rec_path, header_file)):
+        return open_recording(rec_path, mmap=mmap)
+
+    csv_path = base_path + '.csv'
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Neither {rec_path} nor {csv_path} exists")
+    chunk = pd.read_csv(csv_path, dtype=str)
+    samples, timestamps, labels, _ = _csv_chunk_to_arrays(chunk, header.get('label_names', label_names))
+    if timestamps is not None and 'timestamp_unit' not in header:
+        header['timestamp_unit'] = guess_timestamp_unit(timestamps, header.get('sample_rate', default_sample_rate))
+    return Recording(samples, timestamps, labels, header)
+
+
+def iter_recording(base_path, chunk_rows=csv_chunk_rows, **header):
+    """
+    Yields a recording as consecutive Recording chunks of at most chunk_rows rows, so a stage can
+    stream it without loading it. Uses "<base_path>.rec" (memmap slices) if present, else the CSV.
+    """
+    rec_path = store_path(base_path)
+    if os.path.exists(os.path.join(rec_path, header_file)):
+        recording = open_recording(rec_path)
+        for start in range(0, len(recording), chunk_rows):
+            stop = start + chunk_rows
+            yield Recording(recording.samples[start:stop],
+                            None if recording.timestamps is None else recording.timestamps[start:stop],
+                            None if recording.labels is None else recording.labels[start:stop],
+                            recording.header)
+        return
+
+    csv_path = base_path + '.csv'
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Neither {rec_path} nor {csv_path} exists")
+    names = header.get('label_names', label_names)
+    numeric_labels = None
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=str):
+        samples, timestamps, labels, numeric_labels = _csv_chunk_to_arrays(chunk, names, numeric_labels)
+        if timestamps is not None and 'timestamp_unit' not in header:
+            header['timestamp_unit'] = guess_timestamp_unit(timestamps, header.get('sample_rate', default_sample_rate))
+        yield Recording(samples, timestamps, labels, header)
@@ -0,0 +1,153 @@
+import numpy as np
+
+from recording_store import iter_recording, RecordingWriter, csv_chunk_rows, timestamp_units
+from recording_quality import segment_break_seconds
+from windowing import grid_eps
+
+# Resampling onto an exact uniform time grid, so that window_size samples really are window_size / rate
+# seconds. Samples are linearly interpolated, labels come from the nearest input sample. The grid restarts
+# at a clock reset or a pause longer than segment_break_seconds instead of interpolating across it; the
+# start of every grid segment goes into the header as grid_segments, which is what lets windowing map
+# times to indices with arithmetic instead of searching the timestamps.
+
+default_rate = 88
+output_timestamp_unit = 'us'
+# which recordings normalization reads; training, test_novi_data.py and host inference have to use the same one
+input_stages = ['labeled', 'resampled']
+
+
+class Resampler:
+    """
+    push() input chunks (timestamps in seconds, samples, optional label codes) and get back the grid samples
+    up to the last input timestamp. The last input sample is carried over, so the output does not depend on
+    how the recording is chunked.
+    """
+
+    def __init__(self, rate=default_rate):
+        self.rate = rate
+        self.prev = None
+        self.grid_start = None
+        self.k = 0
+        self.out_rows = 0
+        self.segments = []
+
+    def push(self, timestamps, samples, labels=None):
+        ts = np.asarray(timestamps, dtype=np.float64)
+        xs = np.asarray(samples, dtype=np.float64)
+        ls = np.zeros(len(ts), dtype=np.int8) if labels is None else np.asarray(labels, dtype=np.int8)
+        if len(ts) == 0:
+            return self.empty(labels is not None)
+
+        if self.prev is None:
+            self.start_segment(ts[0])
+        else:
+            prev_t, prev_x, prev_l = self.prev
+            ts = np.concatenate([[prev_t], ts])
+            xs = np.concatenate([prev_x[None, :], xs])
+            ls = np.concatenate([[prev_l], ls])
+
+        dt = np.diff(ts)
+        breaks = np.flatnonzero((dt < 0) | (dt > segment_break_seconds)) + 1
+        bounds = np.concatenate([[0], breaks, [len(ts)]])
+
+        out = []
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if a > 0:
+                self.start_segment(ts[a])
+            out.append(self.interpolate(ts[a:b], xs[a:b], ls[a:b]))
+        self.prev = (ts[-1], xs[-1], ls[-1])
+
+        grid_ts = np.concatenate([o[0] for o in out])
+        grid_samples = np.concatenate([o[1] for o in out]).astype(np.float32)
+        grid_labels = np.concatenate([o[2] for o in out]) if labels is not None else None
+        return grid_ts, grid_samples, grid_labels
+
+    def start_segment(self, start_time):
+        self.grid_start = float(start_time)
+        self.k = 0
+        self.segments.append([self.out_rows, self.grid_start])
+
+    def interpolate(self, ts, xs, ls):
+        k_end = int(np.floor((ts[-1] - self.grid_start) * self.rate + grid_eps)) + 1
+        if k_end <= self.k:
+            return np.empty(0), np.empty((0, xs.shape[1])), np.empty(0, dtype=np.int8)
+        grid = self.grid_start + np.arange(self.k, k_end) / self.rate
+        self.k = k_end
+        self.out_rows += len(grid)
+        if len(ts) == 1:
+            return grid, np.repeat(xs, len(grid), axis=0), np.repeat(ls, len(grid))
+
+        # lijevi susjed svake tocke grida; kod jednakih timestampova zadnji od njih
+        idx = np.clip(np.searchsorted(ts, grid, side='right') - 1, 0, len(ts) - 2)
+        span = ts[idx + 1] - ts[idx]
+        w = np.clip(np.where(span > 0, (grid - ts[idx]) / np.where(span > 0, span, 1), 0), 0, 1)
+        samples = xs[idx] + w[:, None] * (xs[idx + 1] - xs[idx])
+        labels = np.where(w < 0.5, ls[idx], ls[idx + 1])
+        return grid, samples, labels
+
+    @property
+    def grid(self):
+        """
+        (grid_start in seconds, rate) while the output is a single grid segment, else None (see recording_grid).
+        """
+        if len(self.segments) != 1:
+            return None
+        return self.segments[0][1], self.rate
+
+    def empty(self, has_label):
+        return np.empty(0), np.empty((0, 6), dtype=np.float32), np.empty(0, dtype=np.int8) if has_label else None
+
+
+def add_stage_argument(parser):
+    parser.add_argument('--stage', choices=input_stages, default=input_stages[0],
+                        help=f"'resampled' puts the samples on a uniform {default_rate} Hz grid before normalizing "
+                             f"(default: {input_stages[0]})")
+
+
+def stage_rate(stage):
+    """
+    Resampling rate for an input stage, None if the samples are used as recorded.
+    """
+    return default_rate if stage == 'resampled' else None
+
+
+def recording_grid(header):
+    """
+    (grid_start in seconds, rate) if the recording is a single uniform grid segment, else None.
+    """
+    segments = header.get('grid_segments')
+    if not header.get('resampled') or not segments or len(segments) != 1:
+        return None
+    return segments[0][1], header['sample_rate']
+
+
+def resample_recording(in_base, out_base, rate=default_rate, chunk_rows=csv_chunk_rows):
+    """
+    Streams "<in_base>.rec" (or .csv) onto a uniform grid at rate Hz and writes "<out_base>.rec" with
+    timestamps in microseconds. Recordings without timestamps (junk) are copied unchanged.
+    Returns (input rows, output rows).
+    """
+    resampler = Resampler(rate)
+    writer = None
+    rows_in = 0
+    try:
+        for chunk in iter_recording(in_base, chunk_rows):
+            if writer is None:
+                has_timestamp = chunk.timestamps is not None
+                header = dict(chunk.header)
+                if has_timestamp:
+                    header.update(sample_rate=rate, timestamp_unit=output_timestamp_unit, resampled=True)
+                writer = RecordingWriter(out_base, has_timestamp=has_timestamp, has_label=chunk.labels is not None, **header)
+            rows_in += len(chunk)
+            if not has_timestamp:
+                writer.append(chunk.samples, labels=chunk.labels)
+                continue
+            grid_ts, samples, labels = resampler.push(chunk.timestamps_in_seconds(), chunk.samples, chunk.labels)
+            scale = timestamp_units[output_timestamp_unit]
+            writer.append(samples, np.round(grid_ts * scale).astype(np.int64), labels)
+    finally:
+        if writer is not None:
+            if writer.has_timestamp:
+                writer.header['grid_segments'] = resampler.segments
+            writer.close()
+    return rows_in, (writer.rows if writer is not None else 0)
@@ -0,0 +1,20 @@
+import os
+import argparse
+
+from resample import resample_recording, default_rate
+from parallel import add_jobs_argument, run_jobs
+
+data_dir = "gesture_data"
+recordings = ['infinity', 'kiss', 'double', 'flick', 'junk']
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resample the labeled recordings onto an exact uniform time grid.")
+    parser.add_argument('--rate', type=float, default=default_rate, help=f"output sample rate in Hz (default: {default_rate})")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    # <name>_labeled -> <name>_resampled; normalize_data.py / pipeline.py --stage resampled
+    jobs = [(os.path.join(data_dir, f"{name}_labeled"), os.path.join(data_dir, f"{name}_resampled"), args.rate)
+            for name in recordings]
+    for (in_base, out_base, _), (rows_in, rows_out) in zip(jobs, run_jobs(resample_recording, jobs, args.jobs)):
+        print(f"{out_base}.rec: {rows_in} -> {rows_out} rows")
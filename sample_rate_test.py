@@ -1,52 +1,53 @@
 import os
-import pandas as pd
+import argparse
+
+from recording_store import csv_chunk_rows
+from recording_quality import analyze_recording, save_report, report_file_name
 
 data_dir = "gesture_data"
 gesture_names = ['double', 'flick', 'infinity', 'kiss']
 
-for gesture in gesture_names:
-    print(f"\n--- {gesture} ---")
-    raw_path = os.path.join(data_dir, f"{gesture}_raw_data.csv")
-    if not os.path.exists(raw_path):
-        print(f"  {raw_path} not found.")
-        continue
-    df_raw = pd.read_csv(raw_path)
-    if 'timestamp' not in df_raw.columns or len(df_raw) < 2:
-        print("  Not enough data or no timestamp column.")
-    else:
-        ts = df_raw['timestamp'].values
-        intervals = (ts[1:] - ts[:-1]) / 1000.0
-        avg_interval = intervals.mean()
-        sample_rate = 1 / avg_interval if avg_interval > 0 else float('nan')
-        print(f"  Raw data: {len(ts)} samples")
-        print(f"  Average interval: {avg_interval:.4f} s")
-        print(f"  Estimated sample rate: {sample_rate:.2f} Hz")
-
-    labeled_path = os.path.join(data_dir, f"{gesture}_labeled.csv")
-    if not os.path.exists(labeled_path):
-        print(f"  {labeled_path} not found.")
-        continue
-    df_labeled = pd.read_csv(labeled_path)
-    if 'label' not in df_labeled.columns:
-        print("  No label column.")
-        continue
-
-    lengths = []
-    current_len = 0
-    for label in df_labeled['label']:
-        if label == gesture:
-            current_len += 1
-        else:
-            if current_len > 0:
-                lengths.append(current_len)
-                current_len = 0
-    if current_len > 0:
-        lengths.append(current_len)
-
-    if lengths:
-        avg_len = sum(lengths) / len(lengths)
-        print(f"  Avg. consecutive '{gesture}' window: {avg_len:.2f} samples")
-        if 'timestamp' in df_raw.columns and len(df_raw) > 1:
-            print(f"  Avg. consecutive '{gesture}' window: {avg_len * avg_interval:.2f} seconds")
+default_recordings = [f"{gesture}_labeled" for gesture in gesture_names] + ['junk_labeled', 'novi_raw_data']
+
+
+def print_summary(name, report):
+    print(f"\n--- {name} ---")
+    print(f"  {report['samples']} samples")
+    if 'interval_s' in report:
+        interval = report['interval_s']
+        print(f"  Average interval: {interval['mean']:.4f} s, p50 {interval['p50'] * 1000:.1f} ms, "
+              f"p99 {interval['p99'] * 1000:.1f} ms, max {interval['max'] * 1000:.1f} ms")
+        print(f"  Estimated sample rate: {report['rate_hz']:.2f} Hz")
+        gaps = report['gaps']
+        print(f"  Gaps: {gaps['count']} ({gaps['dropped_samples']} samples dropped), clock resets: {report['clock_resets']['count']}")
+        for seg in report['segments']:
+            rate = f"{seg['rate_hz']:.2f} Hz" if seg['rate_hz'] is not None else "-"
+            print(f"    segment {seg['start_index']}-{seg['end_index']} ({seg['starts_with']}): {rate}, "
+                  f"{seg['dropped']} dropped{'' if seg['ok'] else '  <-- BAD'}")
     else:
-        print(f"  No consecutive '{gesture}' windows found.")
\ No newline at end of file
+        print("  No timestamps.")
+    for label, runs in report.get('label_runs', {}).items():
+        seconds = f", {runs['mean_s']:.2f} s" if 'mean_s' in runs else ""
+        print(f"  Avg. consecutive '{label}' run: {runs['mean']:.2f} samples{seconds} ({runs['count']} runs)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Timing and label-run quality of recordings, streamed chunk by chunk.")
+    parser.add_argument('recordings', nargs='*', default=default_recordings,
+                        help=f"recording names in {data_dir} without extension (.rec or .csv)")
+    parser.add_argument('--chunk-rows', type=int, default=csv_chunk_rows, help="rows read per chunk")
+    parser.add_argument('--report', default=os.path.join(data_dir, report_file_name), help="JSON report path")
+    args = parser.parse_args()
+
+    reports = {}
+    for name in args.recordings:
+        base_path = os.path.join(data_dir, name)
+        try:
+            reports[name] = analyze_recording(base_path, args.chunk_rows)
+        except FileNotFoundError as e:
+            print(f"\n--- {name} ---\n  {e}")
+            continue
+        print_summary(name, reports[name])
+
+    save_report(args.report, reports)
+    print(f"\nReport written to {args.report}")
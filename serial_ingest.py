@@ -0,0 +1,306 @@
+import time
+import struct
+import threading
+import numpy as np
+
+# Serial ingestion split over two threads: the reader only moves bytes from the port into a ring buffer
+# (one ser.read(in_waiting) per wakeup), the writer drains the ring in batches, parses the whole batch
+# and hands arrays to a sink (usually RecordingWriter.append). A slow disk then only delays the writer;
+# the reader keeps emptying the port's buffer.
+#
+# Two wire formats from record_sensor_data.ino:
+#   text    "timestamp,ax,ay,az,gx,gy,gz\r\n"
+#   binary  frame_sync, uint32 timestamp (ms), 6 x float32, uint8 XOR of the 28 payload bytes, little endian
+
+ring_bytes = 1 << 20
+flush_seconds = 0.25
+sensor_sample_rate = 88
+gap_factor = 1.5 # razmak veci od 1.5 perioda uzorkovanja se broji kao rupa
+
+frame_sync = b'\xa5\x5a'
+frame_payload = struct.Struct('<I6f')
+frame_size = len(frame_sync) + frame_payload.size + 1
+frame_dtype = np.dtype([('sync', 'u1', 2), ('timestamp', '<u4'), ('values', '<f4', 6), ('checksum', 'u1')])
+
+
+class ByteRing:
+    """
+    Fixed-size byte ring between the reader and the writer thread. If the writer falls more than capacity
+    bytes behind, the oldest bytes are overwritten and counted in dropped instead of blocking the reader.
+    """
+
+    def __init__(self, capacity=ring_bytes):
+        self.buf = bytearray(capacity)
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        if not data:
+            return
+        with self.lock:
+            if len(data) >= self.capacity:
+                self.dropped += self.size + len(data) - self.capacity
+                data = data[-self.capacity:]
+                self.start, self.size = 0, 0
+            overflow = self.size + len(data) - self.capacity
+            if overflow > 0:
+                self.start = (self.start + overflow) % self.capacity
+                self.size -= overflow
+                self.dropped += overflow
+
+            end = (self.start + self.size) % self.capacity
+            first = min(len(data), self.capacity - end)
+            self.buf[end:end + first] = data[:first]
+            self.buf[:len(data) - first] = data[first:]
+            self.size += len(data)
+
+    def read_all(self):
+        """
+        Takes everything buffered.
+        """
+        with self.lock:
+            end = self.start + self.size
+            if end <= self.capacity:
+                data = bytes(self.buf[self.start:end])
+            else:
+                data = bytes(self.buf[self.start:]) + bytes(self.buf[:end - self.capacity])
+            self.start, self.size = 0, 0
+            return data
+
+
+class TextParser:
+    """
+    Parses "timestamp,ax,ay,az,gx,gy,gz" lines. A partial last line is kept for the next batch.
+    With allow_missing_timestamp, 6-value lines are accepted too and get timestamp -1.
+    """
+
+    def __init__(self, allow_missing_timestamp=False):
+        self.rest = b''
+        self.allow_missing_timestamp = allow_missing_timestamp
+        self.errors = 0
+        self.last_skipped = None
+
+    def feed(self, data):
+        lines = (self.rest + data).split(b'\n')
+        self.rest = lines.pop()
+        lines = [line.strip() for line in lines]
+        lines = [line for line in lines if line]
+        if not lines:
+            return np.empty(0, dtype=np.int64), np.empty((0, 6), dtype=np.float32)
+
+        try:
+            # brzi put: cijeli batch su ispravne linije sa 7 vrijednosti
+            table = np.array([line.split(b',') for line in lines], dtype=np.float64)
+            if table.ndim == 2 and table.shape[1] == 7:
+                return table[:, 0].astype(np.int64), table[:, 1:].astype(np.float32)
+        except ValueError:
+            pass
+
+        timestamps, samples = [], []
+        for line in lines:
+            parts = line.split(b',')
+            try:
+                if len(parts) == 7:
+                    timestamp = int(parts[0])
+                    values = [float(p) for p in parts[1:]]
+                elif len(parts) == 6 and self.allow_missing_timestamp:
+                    timestamp = -1
+                    values = [float(p) for p in parts]
+                else:
+                    raise ValueError
+            except ValueError:
+                self.errors += 1
+                self.last_skipped = line.decode('utf-8', errors='replace') # npr. "IMU initialized..."
+                continue
+            timestamps.append(timestamp)
+            samples.append(values)
+        return np.array(timestamps, dtype=np.int64), np.array(samples, dtype=np.float32).reshape(-1, 6)
+
+
+class BinaryParser:
+    """
+    Parses frame_size-byte frames. Runs of consecutive valid frames are decoded with one frombuffer;
+    after a bad sync or checksum the parser counts an error and resynchronizes on the next frame_sync.
+    """
+
+    def __init__(self):
+        self.rest = b''
+        self.errors = 0
+        self.last_skipped = None # kao TextParser; binarni stream nema tekstualnih linija
+
+    def feed(self, data):
+        buf = self.rest + data
+        timestamps, samples = [], []
+        pos = 0
+        resync = False
+        while True:
+            sync = buf.find(frame_sync, pos)
+            if sync < 0:
+                # zadnji bajt moze biti prva polovica sync-a
+                pos = max(len(buf) - 1, pos)
+                break
+            if sync > pos and not resync:
+                self.errors += 1
+            n = (len(buf) - sync) // frame_size
+            if n == 0:
+                pos = sync
+                break
+            frames = np.frombuffer(buf, dtype=frame_dtype, count=n, offset=sync)
+            raw = np.frombuffer(buf, dtype=np.uint8, count=n * frame_size, offset=sync).reshape(n, frame_size)
+            valid = ((frames['sync'] == np.frombuffer(frame_sync, dtype=np.uint8)).all(axis=1)
+                     & (np.bitwise_xor.reduce(raw[:, len(frame_sync):-1], axis=1) == frames['checksum']))
+            good = n if valid.all() else int(np.argmin(valid))
+            timestamps.append(frames['timestamp'][:good].astype(np.int64))
+            samples.append(frames['values'][:good].astype(np.float32))
+            pos = sync + good * frame_size
+            resync = good < n
+            if resync:
+                self.errors += 1
+                pos += 1
+        self.rest = buf[pos:]
+        if not timestamps:
+            return np.empty(0, dtype=np.int64), np.empty((0, 6), dtype=np.float32)
+        return np.concatenate(timestamps), np.concatenate(samples).reshape(-1, 6)
+
+
+def encode_frames(timestamps, samples):
+    """
+    Binary frames as the sketch sends them (for tests and replaying recordings).
+    """
+    frames = np.zeros(len(timestamps), dtype=frame_dtype)
+    frames['sync'] = np.frombuffer(frame_sync, dtype=np.uint8)
+    frames['timestamp'] = timestamps
+    frames['values'] = samples
+    raw = frames.view(np.uint8).reshape(len(frames), frame_size)
+    frames['checksum'] = np.bitwise_xor.reduce(raw[:, len(frame_sync):-1], axis=1)
+    return frames.tobytes()
+
+
+class IngestStats:
+    """
+    Counters shared by the threads; rate() is samples per second since the previous rate() call.
+    """
+
+    def __init__(self, sample_rate=sensor_sample_rate):
+        self.samples = 0
+        self.bytes = 0
+        self.gaps = 0
+        self.last_timestamp = None
+        self.gap_ms = gap_factor * 1000.0 / sample_rate
+        self.rate_samples = 0
+        self.rate_time = time.monotonic()
+
+    def add(self, timestamps):
+        self.samples += len(timestamps)
+        timestamps = timestamps[timestamps >= 0]
+        if len(timestamps) == 0:
+            return
+        if self.last_timestamp is not None:
+            timestamps = np.concatenate([[self.last_timestamp], timestamps])
+        steps = np.diff(timestamps)
+        # preskoci u vremenu ili reset sata (npr. restart plocice)
+        self.gaps += int(np.count_nonzero((steps > self.gap_ms) | (steps < 0)))
+        self.last_timestamp = int(timestamps[-1])
+
+    def rate(self):
+        now = time.monotonic()
+        rate = (self.samples - self.rate_samples) / max(now - self.rate_time, 1e-9)
+        self.rate_samples, self.rate_time = self.samples, now
+        return rate
+
+
+class SerialIngest:
+    """
+    Reader thread: ser.read(in_waiting) into a ByteRing. Writer thread: every flush_interval seconds drains
+    the ring, parses the batch and calls sink(timestamps, samples) once.
+    ser needs read(), in_waiting and a timeout so read() returns now and then; use as a context manager
+    or call start() / stop().
+    """
+
+    def __init__(self, ser, sink, binary=False, allow_missing_timestamp=False, sample_rate=sensor_sample_rate,
+                 ring_size=ring_bytes, flush_interval=flush_seconds):
+        self.ser = ser
+        self.sink = sink
+        self.parser = BinaryParser() if binary else TextParser(allow_missing_timestamp)
+        self.ring = ByteRing(ring_size)
+        self.stats = IngestStats(sample_rate)
+        self.flush_interval = flush_interval
+        self.running = threading.Event()
+        self.error = None
+        self.threads = []
+
+    @property
+    def parse_errors(self):
+        return self.parser.errors
+
+    def start(self):
+        self.running.set()
+        self.threads = [threading.Thread(target=self.read_loop, name='serial-reader', daemon=True),
+                        threading.Thread(target=self.write_loop, name='serial-writer', daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.running.clear()
+        for thread in self.threads:
+            thread.join()
+        self.flush()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def read_loop(self):
+        try:
+            while self.running.is_set():
+                # blokira do prvog bajta (ili ser.timeout), ostatak buffera porta uzima odjednom
+                data = self.ser.read(max(self.ser.in_waiting, 1))
+                if data:
+                    self.stats.bytes += len(data)
+                    self.ring.write(data)
+        except Exception as e:
+            self.error = e
+            self.running.clear()
+
+    def write_loop(self):
+        try:
+            while self.running.is_set():
+                time.sleep(self.flush_interval)
+                self.flush()
+        except Exception as e:
+            self.error = e
+            self.running.clear()
+
+    def flush(self):
+        data = self.ring.read_all()
+        if not data:
+            return
+        timestamps, samples = self.parser.feed(data)
+        if len(samples):
+            self.stats.add(timestamps)
+            self.sink(timestamps, samples)
+
+    def status(self):
+        return (f"{self.stats.rate():7.1f} samples/s | {self.stats.samples} samples | "
+                f"{self.parse_errors} parse errors | {self.stats.gaps} gaps | {self.ring.dropped} bytes dropped")
+
+    def report(self, interval=1.0, duration=None):
+        """
+        Prints status() every interval seconds until Ctrl+C, duration elapses or a thread fails.
+        """
+        start = time.monotonic()
+        try:
+            while self.running.is_set() and (duration is None or time.monotonic() - start < duration):
+                time.sleep(interval)
+                print(f"\r{self.status()}", end='', flush=True)
+        except KeyboardInterrupt:
+            pass
+        print()
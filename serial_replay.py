@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+import tty
+import argparse
+import threading
+import numpy as np
+
+from recording_store import load_recording
+from serial_ingest import encode_frames, SerialIngest
+
+# Replays a recorded session through a local pseudo-terminal, so the loggers (and SerialIngest) can be
+# run and load-tested without the board:
+#
+#   python serial_replay.py kiss_raw_data --speed 4
+#   python log_sensor_data.py --port /dev/pts/N --output replay_test
+#
+# The master end is non-blocking: when the reader does not keep up and the pty buffer is full, the bytes
+# are dropped and counted, like a UART overrun, instead of throttling the replay. With --speed 0 writes
+# block instead, so the replay runs as fast as the reader thread takes the bytes; losses then come from
+# the ingest ring overflowing. The highest --speed that --check passes is the sustainable ingest rate.
+# Linux / macOS only (os.openpty).
+
+data_dir = "gesture_data"
+default_recording = "kiss_raw_data"
+send_tick = 0.002 # s, najmanji razmak izmedu dva os.write
+max_batch_samples = 1000
+
+
+def format_lines(timestamps, samples):
+    """
+    Lines exactly as record_sensor_data.ino prints them.
+    """
+    return [f"{t},{s[0]:.6f},{s[1]:.6f},{s[2]:.6f},{s[3]:.6f},{s[4]:.6f},{s[5]:.6f}\r\n".encode()
+            for t, s in zip(timestamps, samples)]
+
+
+def send_times(timestamps_s, speed=1.0, jitter_ms=0.0, burst_every=0.0, burst_ms=0.0, rng=None):
+    """
+    Send time of every sample relative to the start: the recorded spacing divided by speed (speed 0 = as fast
+    as possible), plus gaussian jitter, plus bursts where everything in a burst_ms hold window every
+    burst_every seconds is released at once. Times never go backwards.
+    """
+    rng = rng or np.random.default_rng()
+    if speed == 0:
+        times = np.zeros(len(timestamps_s))
+    else:
+        times = (timestamps_s - timestamps_s[0]) / speed
+    if jitter_ms > 0:
+        times = times + np.abs(rng.normal(0, jitter_ms / 1000.0, len(times)))
+    if burst_every > 0 and burst_ms > 0:
+        phase = np.mod(times, burst_every)
+        held = phase < burst_ms / 1000.0
+        times = np.where(held, times - phase + burst_ms / 1000.0, times)
+    return np.maximum.accumulate(times)
+
+
+class SerialReplay:
+    """
+    Streams payloads (one bytes object per sample) into the master side of a new pty at the given send
+    times. port is the slave device path to open with pyserial. With overrun=False writes block until the
+    reader makes room instead of dropping bytes.
+    """
+
+    def __init__(self, payloads, times, overrun=True):
+        self.payloads = payloads
+        self.times = times
+        self.overrun = overrun
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, not overrun)
+        self.port = os.ttyname(self.slave)
+        self.sent_samples = 0
+        self.sent_bytes = 0
+        self.overrun_bytes = 0
+        self.elapsed = 0.0
+        self.thread = None
+
+    def run(self):
+        start = time.perf_counter()
+        i = 0
+        while i < len(self.payloads):
+            now = time.perf_counter() - start
+            j = int(np.searchsorted(self.times, now, side='right'))
+            if j <= i:
+                time.sleep(min(max(self.times[i] - now, 0), 0.05))
+                continue
+            j = min(j, i + max_batch_samples)
+            data = b''.join(self.payloads[i:j])
+            written = self.write(data)
+            self.overrun_bytes += len(data) - written
+            self.sent_bytes += written
+            self.sent_samples += j - i
+            i = j
+            if self.overrun:
+                time.sleep(send_tick)
+        self.elapsed = time.perf_counter() - start
+
+    def write(self, data):
+        if not self.overrun:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.master, view):]
+            return len(data)
+        try:
+            return os.write(self.master, data)
+        except BlockingIOError:
+            return 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='serial-replay', daemon=True)
+        self.thread.start()
+        return self
+
+    def join(self):
+        self.thread.join()
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def build_payloads(recording, binary=False, corrupt_rate=0.0, rng=None):
+    """
+    One payload per sample; a corrupt_rate fraction of them is damaged so the parser has to reject them
+    (a 0xFF byte in the middle of a text line, a flipped payload byte in a binary frame).
+    Returns (payloads, number corrupted).
+    """
+    rng = rng or np.random.default_rng()
+    timestamps = np.asarray(recording.timestamps) if recording.timestamps is not None else np.arange(len(recording)) * 11
+    samples = np.asarray(recording.samples)
+    if binary:
+        frames = encode_frames(timestamps, samples)
+        size = len(frames) // len(timestamps)
+        payloads = [frames[i * size:(i + 1) * size] for i in range(len(timestamps))]
+    else:
+        payloads = format_lines(timestamps, samples)
+
+    corrupt = np.flatnonzero(rng.random(len(payloads)) < corrupt_rate)
+    for i in corrupt:
+        p = bytearray(payloads[i])
+        k = len(p) // 2
+        if binary:
+            p[k] ^= 0xFF
+        else:
+            p[k:k] = b'\xff'
+        payloads[i] = bytes(p)
+    return payloads, len(corrupt)
+
+
+def check_ingest(replay, binary, expected, timeout=1.0):
+    """
+    Reads the replay back through SerialIngest in this process; returns the ingest object.
+    """
+    import serial
+    ser = serial.Serial(replay.port, 115200, timeout=timeout)
+    received = []
+    ingest = SerialIngest(ser, lambda timestamps, samples: received.append(len(samples)), binary=binary)
+    with ingest:
+        replay.start()
+        replay.join()
+        # pricekaj da reader isprazni pty
+        deadline = time.monotonic() + 5
+        while ingest.stats.samples + ingest.parse_errors < expected and time.monotonic() < deadline:
+            time.sleep(0.05)
+            ingest.flush()
+    ser.close()
+    return ingest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recording through a pseudo-terminal as if it were the board.")
+    parser.add_argument('recording', nargs='?', default=default_recording,
+                        help=f"recording name in {data_dir} (.rec or .csv, default: {default_recording})")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed factor, 0 = as fast as possible")
+    parser.add_argument('--repeat', type=int, default=1, help="replay the recording this many times back to back")
+    parser.add_argument('--binary', action='store_true', help="send binary frames instead of text lines")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="gaussian send-time jitter (std, ms)")
+    parser.add_argument('--corrupt-rate', type=float, default=0.0, help="fraction of samples sent damaged")
+    parser.add_argument('--burst-every', type=float, default=0.0, help="seconds between bursts")
+    parser.add_argument('--burst-ms', type=float, default=0.0, help="how long data is held back before each burst")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--check', action='store_true',
+                        help="read the replay back with SerialIngest and exit 1 if samples were lost (for CI)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    recording = load_recording(os.path.join(data_dir, args.recording))
+    payloads, corrupted = build_payloads(recording, args.binary, args.corrupt_rate, rng)
+    timestamps = recording.timestamps_in_seconds() if recording.timestamps is not None else np.arange(len(recording)) / recording.sample_rate
+    duration = timestamps[-1] - timestamps[0] + 1.0 / recording.sample_rate
+    timestamps = np.concatenate([timestamps + r * duration for r in range(args.repeat)])
+    payloads = payloads * args.repeat
+    corrupted *= args.repeat
+
+    replay = SerialReplay(payloads, send_times(timestamps, args.speed, args.jitter_ms, args.burst_every, args.burst_ms, rng),
+                          overrun=args.speed != 0)
+    print(f"replaying {args.recording} ({len(payloads)} samples, {corrupted} corrupted) on {replay.port}")
+
+    if args.check:
+        ingest = check_ingest(replay, args.binary, len(payloads))
+        lost = len(payloads) - corrupted - ingest.stats.samples
+        print(f"sent {replay.sent_samples} samples / {replay.sent_bytes} bytes in {replay.elapsed:.2f} s "
+              f"({replay.sent_samples / max(replay.elapsed, 1e-9):.0f} samples/s), overrun {replay.overrun_bytes} bytes")
+        print(f"received {ingest.stats.samples} samples, {ingest.parse_errors} parse errors, "
+              f"{ingest.ring.dropped} bytes dropped in the ring, lost {lost}")
+        replay.close()
+        sys.exit(1 if lost > 0 else 0)
+
+    print("start the logger with --port", replay.port)
+    try:
+        input("press Enter to start streaming...")
+        replay.start()
+        replay.join()
+        print(f"sent {replay.sent_samples} samples in {replay.elapsed:.2f} s, overrun {replay.overrun_bytes} bytes")
+        input("done, press Enter to close the port...")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replay.close()
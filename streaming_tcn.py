@@ -0,0 +1,207 @@
+import os
+import time
+import argparse
+import numpy as np
+
+from windowing import sliding_windows
+from recording_store import load_recording
+from host_inference import WINDOW_SIZE, MEANS, STDS, load_interpreter
+from batch_inference import BatchEvaluator
+
+# Streaming inference for the TCN from train_model.py, for untriggered detection with a prediction at
+# every new sample. A full-window run repeats ~99% of the work of the previous sample; here every causal
+# conv keeps the last (kernel_size - 1) * dilation inputs it saw and only the new timesteps are computed.
+#
+# The model's receptive field (1 + 2 * (kernel_size - 1) * sum(dilations) = 253 samples for the default
+# TCN) fits in WINDOW_SIZE, so the prediction after sample t equals the full-window prediction for the
+# window ending at t, up to float rounding. Only the weights come from Keras; inference is numpy.
+#
+#   python streaming_tcn.py                   # benchmark against full-window inference on novi_raw_data
+#   python streaming_tcn.py --chunk 8         # push 8 samples at a time, like a BLE notification
+
+DATA_DIR = "gesture_data"
+DEFAULT_MODEL = "gesture_model.h5"
+DEFAULT_TFLITE_MODEL = os.path.join("final", "model.tflite") # float konverzija istog modela iz train_model.py
+DEFAULT_RECORDING = "novi_raw_data"
+FULL_WINDOW_LIMIT = 500 # toliko prozora se mjeri jedan po jedan, ostatak samo batchano za usporedbu
+EQUIVALENCE_TOLERANCE = 1e-5
+
+
+def load_tcn_model(path=DEFAULT_MODEL):
+    from keras.models import load_model
+    from tcn import TCN
+    return load_model(path, custom_objects={'TCN': TCN}, compile=False)
+
+
+class CausalConv:
+    """
+    One dilated causal Conv1D with its input history.
+    """
+
+    def __init__(self, kernel, bias, dilation):
+        kernel = np.asarray(kernel, dtype=np.float32) # (kernel_size, in, out)
+        self.kernel_size, self.channels = kernel.shape[:2]
+        self.kernel = kernel.reshape(-1, kernel.shape[2]) # svi tapovi u jednom matmulu
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.dilation = dilation
+        self.history_size = (self.kernel_size - 1) * dilation
+        self.history = np.zeros((self.history_size, self.channels), dtype=np.float32)
+        self.taps = np.arange(self.kernel_size) * dilation
+
+    def reset(self):
+        self.history = np.zeros_like(self.history)
+
+    def push(self, x):
+        """
+        Outputs for the m new inputs x (m, in), the same as the causal conv over the whole stream.
+        """
+        m = len(x)
+        full = np.concatenate((self.history, x))
+        if m == 1:
+            taps = full[self.taps].reshape(1, -1)
+        else:
+            taps = np.concatenate([full[t:t + m] for t in self.taps], axis=1)
+        self.history = full[m:]
+        out = taps @ self.kernel
+        out += self.bias
+        return out
+
+
+class StreamingTCN:
+    """
+    push(samples) normalized samples (m, 6) -> class probabilities (m, classes), one row per sample.
+    State carries over between calls; reset() starts a new stream (zeros, like causal padding).
+    """
+
+    def __init__(self, blocks, dense):
+        # blocks: [(conv0, conv1, match)], match = (kernel, bias) of the 1x1 conv or None; dense: [(kernel, bias)]
+        self.blocks = blocks
+        self.dense = [(np.asarray(k, dtype=np.float32), np.asarray(b, dtype=np.float32)) for k, b in dense]
+        kernel_size = blocks[0][0].kernel_size
+        self.receptive_field = 1 + sum(conv.history_size for conv0, conv1, _ in blocks for conv in (conv0, conv1))
+        if self.receptive_field > WINDOW_SIZE:
+            print(f"Warning: receptive field {self.receptive_field} > window {WINDOW_SIZE}, "
+                  f"streaming outputs will differ from full-window ones (kernel size {kernel_size}).")
+
+    @classmethod
+    def from_keras(cls, model):
+        """
+        Weights of a Sequential([TCN, Dropout, Dense(relu), Dense(softmax)]) as saved by train_model.py.
+        """
+        tcn_layer = model.layers[0]
+        if tcn_layer.return_sequences or not tcn_layer.use_skip_connections or tcn_layer.padding != 'causal':
+            raise ValueError("Only causal TCNs with skip connections and return_sequences=False can be streamed.")
+        if tcn_layer.use_batch_norm or tcn_layer.use_layer_norm or getattr(tcn_layer, 'use_weight_norm', False):
+            raise ValueError("TCNs with normalization layers are not supported.")
+        blocks = []
+        for block in tcn_layer.residual_blocks:
+            convs = [layer for layer in block.layers if hasattr(layer, 'kernel')]
+            conv0, conv1 = [CausalConv(*layer.get_weights(), dilation=layer.dilation_rate[0]) for layer in convs]
+            match = block.shape_match_conv.get_weights() or None
+            blocks.append((conv0, conv1, match))
+        dense = [layer.get_weights() for layer in model.layers if layer.__class__.__name__ == 'Dense']
+        return cls(blocks, dense)
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL):
+        return cls.from_keras(load_tcn_model(path))
+
+    def reset(self):
+        for conv0, conv1, _ in self.blocks:
+            conv0.reset()
+            conv1.reset()
+
+    def push(self, samples):
+        x = np.asarray(samples, dtype=np.float32)
+        skips = None
+        for conv0, conv1, match in self.blocks:
+            h = np.maximum(conv0.push(x), 0.0)
+            h = np.maximum(conv1.push(h), 0.0)
+            residual = x if match is None else x @ match[0][0] + match[1]
+            x = np.maximum(residual + h, 0.0)
+            skips = h if skips is None else skips + h
+        x = skips
+        for kernel, bias in self.dense[:-1]:
+            x = np.maximum(x @ kernel + bias, 0.0)
+        logits = x @ self.dense[-1][0] + self.dense[-1][1]
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return probabilities
+
+
+def benchmark(model, samples, chunk=1, full_window_limit=FULL_WINDOW_LIMIT, interpreter=None):
+    """
+    Streaming vs full-window inference over one recording, one prediction per sample. Full windows are
+    timed with the Keras model and, if an interpreter is given, with one TFLite invoke() per window.
+    """
+    normalized = ((np.asarray(samples, dtype=np.float32) - MEANS) / STDS).astype(np.float32)
+    streaming = StreamingTCN.from_keras(model)
+
+    start = time.perf_counter()
+    outputs = np.concatenate([streaming.push(normalized[i:i + chunk]) for i in range(0, len(normalized), chunk)])
+    streaming_time = time.perf_counter() - start
+
+    windows = sliding_windows(normalized, WINDOW_SIZE)
+    n_single = min(full_window_limit, len(windows))
+    start = time.perf_counter()
+    for i in range(n_single):
+        model(windows[i:i + 1], training=False)
+    single_time = (time.perf_counter() - start) / max(n_single, 1)
+
+    tflite_time = None
+    if interpreter is not None:
+        evaluator = BatchEvaluator(interpreter, batch_size=1)
+        start = time.perf_counter()
+        for i in range(n_single):
+            evaluator.predict(windows[i:i + 1])
+        tflite_time = (time.perf_counter() - start) / max(n_single, 1)
+
+    start = time.perf_counter()
+    reference = model.predict(windows, batch_size=256, verbose=0)
+    batched_time = (time.perf_counter() - start) / max(len(windows), 1)
+
+    streamed = outputs[WINDOW_SIZE - 1:]
+    return {
+        'samples': len(normalized),
+        'windows': len(windows),
+        'receptive_field': streaming.receptive_field,
+        'streaming_us': streaming_time / len(normalized) * 1e6,
+        'full_window_us': single_time * 1e6,
+        'full_window_batched_us': batched_time * 1e6,
+        'full_window_tflite_us': tflite_time * 1e6 if tflite_time is not None else None,
+        'max_abs_diff': float(np.abs(streamed - reference).max()) if len(windows) else 0.0,
+        'argmax_agreement': float(np.mean(streamed.argmax(axis=1) == reference.argmax(axis=1))) if len(windows) else 1.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark streaming TCN inference against full-window inference.")
+    parser.add_argument('recording', nargs='?', default=DEFAULT_RECORDING,
+                        help=f"recording name in {DATA_DIR} (.rec or .csv, default: {DEFAULT_RECORDING})")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--tflite', default=DEFAULT_TFLITE_MODEL,
+                        help=f"TFLite model for the one-invoke-per-window timing (default: {DEFAULT_TFLITE_MODEL}, '' to skip)")
+    parser.add_argument('--chunk', type=int, default=1, help="samples pushed per call (1 = every sample on its own)")
+    parser.add_argument('--full-window-limit', type=int, default=FULL_WINDOW_LIMIT,
+                        help="windows timed one model call at a time")
+    args = parser.parse_args()
+
+    base_path = args.recording if os.path.dirname(args.recording) else os.path.join(DATA_DIR, args.recording)
+    recording = load_recording(base_path)
+    interpreter = load_interpreter(args.tflite) if args.tflite and os.path.exists(args.tflite) else None
+    result = benchmark(load_tcn_model(args.model), recording.samples, args.chunk, args.full_window_limit, interpreter)
+
+    print(f"{result['samples']} samples, {result['windows']} full windows, receptive field {result['receptive_field']}")
+    print(f"Streaming (chunk {args.chunk}): {result['streaming_us']:9.1f} us/sample")
+    print(f"Full window, one call:   {result['full_window_us']:9.1f} us/sample "
+          f"({result['full_window_us'] / result['streaming_us']:.1f}x)")
+    if result['full_window_tflite_us'] is not None:
+        print(f"Full window, TFLite:     {result['full_window_tflite_us']:9.1f} us/sample "
+              f"({result['full_window_tflite_us'] / result['streaming_us']:.1f}x)")
+    print(f"Full window, batched:    {result['full_window_batched_us']:9.1f} us/sample "
+          f"({result['full_window_batched_us'] / result['streaming_us']:.1f}x)")
+    print(f"Max |streaming - full window|: {result['max_abs_diff']:.2e}, argmax agreement {result['argmax_agreement']:.2%}")
+    if result['max_abs_diff'] > EQUIVALENCE_TOLERANCE:
+        print(f"Error: streaming outputs differ from full-window inference by more than {EQUIVALENCE_TOLERANCE}.")
+        exit(1)
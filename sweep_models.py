@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+from multiprocessing import shared_memory
+
+from parallel import run_jobs
+
+# Trains a grid of TCN variants in parallel and picks the accuracy / size / latency Pareto front for the
+# next firmware model:
+#
+#   python sweep_models.py --filters 4 6 8 --kernel-sizes 2 3 --dense-units 8 12 --jobs 0
+#   python sweep_models.py --dilations 1,2,4,8,16,32 1,2,4,8,16 --window-lengths 264 220
+#
+# The datasets are loaded once and put into shared memory; every worker maps them instead of getting its
+# own copy. Each worker caps TensorFlow at --threads-per-worker intra-op threads, so --jobs workers do not
+# fight over the cores. Every candidate is trained like train_model.py, quantized like quantize_model.py
+# and evaluated with the firmware's int8 quantization (batch_inference 'firmware') on test_dataset.npz.
+# Shorter window lengths keep the first samples of every window (windows start at the trigger).
+#
+# The .tflite of every candidate is kept in --output-dir, next to results.json. Latency is measured in this
+# process once all workers are done, one model at a time, so it is not skewed by the training still running.
+
+train_file = "train_dataset.npz"
+test_file = "test_dataset.npz"
+output_dir = "sweep"
+default_filters = [6]
+default_kernel_sizes = [3]
+default_dilations = ["1,2,4,8,16,32"]
+default_window_lengths = [264]
+default_dense_units = [12]
+default_epochs = 20
+default_batch_size = 8
+dropout_rate = 0.3
+validation_split = 0.2
+early_stopping_patience = 5
+latency_runs = 200
+# (key, 1 = vece je bolje / -1 = manje je bolje)
+pareto_objectives = (('int8_accuracy', 1), ('flash_bytes', -1), ('latency_p50_ms', -1))
+
+shared = {} # u workeru: ime -> np.ndarray nad shared memory
+attached = [] # SharedMemory objekti moraju zivjeti dok se polja koriste
+
+
+def share_arrays(arrays):
+    """
+    Copies the arrays into new shared memory blocks. Returns (blocks, descriptors for init_worker).
+    """
+    blocks, descriptors = [], {}
+    for name, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        descriptors[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, descriptors
+
+
+def init_worker(descriptors, threads):
+    # prije prvog importa TensorFlowa u ovom procesu
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    for name, (block_name, shape, dtype) in descriptors.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        attached.append(block)
+        shared[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def candidate_name(config):
+    return (f"f{config['filters']}_k{config['kernel_size']}_d{'-'.join(map(str, config['dilations']))}"
+            f"_w{config['window_length']}_u{config['dense_units']}")
+
+
+def train_candidate(config, out_dir):
+    import keras
+    from keras.models import Sequential
+    from keras.layers import Dense, Dropout
+    from keras.callbacks import EarlyStopping
+    from tcn import TCN
+    import tensorflow as tf
+    from benchmark_models import convert_keras, model_graph, plan_arena, firmware_arena_size
+    from batch_inference import BatchEvaluator
+
+    start = time.perf_counter()
+    keras.utils.set_random_seed(config['seed'])
+    length = config['window_length']
+    X, y = shared['X_train'][:, :length], shared['y_train']
+    X_test, y_test = shared['X_test'][:, :length], shared['y_test']
+
+    model = Sequential([
+        TCN(nb_filters=config['filters'], kernel_size=config['kernel_size'], dilations=config['dilations'],
+            input_shape=(length, X.shape[2])),
+        Dropout(dropout_rate),
+        Dense(config['dense_units'], activation='relu'),
+        Dense(len(np.unique(y)), activation='softmax')
+    ])
+    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    early_stopping = EarlyStopping(monitor='val_loss', patience=early_stopping_patience, restore_best_weights=True)
+    history = model.fit(X, y, epochs=config['epochs'], batch_size=config['batch_size'],
+                        validation_split=validation_split, callbacks=[early_stopping], verbose=0)
+    float_accuracy = model.evaluate(X_test, y_test, verbose=0)[1]
+
+    model_content = convert_keras(model, quantize=True, representative=X)
+    evaluator = BatchEvaluator(tf.lite.Interpreter(model_content=model_content), rounding='firmware')
+    int8_accuracy = float(np.mean(np.argmax(evaluator.run(X_test), axis=1) == y_test))
+    arena = plan_arena(*model_graph(model_content))
+    arena_limit = firmware_arena_size()
+
+    name = candidate_name(config)
+    model_path = os.path.join(out_dir, name + ".tflite")
+    with open(model_path, 'wb') as f:
+        f.write(model_content)
+
+    return {
+        'name': name,
+        'config': config,
+        'model': model_path,
+        'epochs_trained': len(history.history['loss']),
+        'float_accuracy': round(float(float_accuracy), 4),
+        'int8_accuracy': round(int8_accuracy, 4),
+        'flash_bytes': len(model_content),
+        'params': int(model.count_params()),
+        'arena_bytes': arena,
+        'arena_limit': arena_limit,
+        'fits_arena': arena_limit is None or arena <= arena_limit,
+        'train_seconds': round(time.perf_counter() - start, 1),
+    }
+
+
+def dominates(a, b, objectives=pareto_objectives):
+    """
+    a is at least as good as b in every objective and better in one.
+    """
+    at_least = all(sign * a[key] >= sign * b[key] for key, sign in objectives)
+    better = any(sign * a[key] > sign * b[key] for key, sign in objectives)
+    return at_least and better
+
+
+def pareto_front(results, objectives=pareto_objectives):
+    return [r for r in results if not any(dominates(other, r, objectives) for other in results)]
+
+
+def sweep_configs(args):
+    configs = []
+    for filters, kernel_size, dilations, length, dense in itertools.product(
+            args.filters, args.kernel_sizes, args.dilations, args.window_lengths, args.dense_units):
+        configs.append({'filters': filters, 'kernel_size': kernel_size,
+                        'dilations': [int(d) for d in dilations.split(',')], 'window_length': length,
+                        'dense_units': dense, 'epochs': args.epochs, 'batch_size': args.batch_size,
+                        'seed': args.seed})
+    return configs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train TCN variants in parallel and print the accuracy / size / latency Pareto front.")
+    parser.add_argument('--filters', type=int, nargs='+', default=default_filters)
+    parser.add_argument('--kernel-sizes', type=int, nargs='+', default=default_kernel_sizes)
+    parser.add_argument('--dilations', nargs='+', default=default_dilations, help="comma separated, e.g. 1,2,4,8")
+    parser.add_argument('--window-lengths', type=int, nargs='+', default=default_window_lengths)
+    parser.add_argument('--dense-units', type=int, nargs='+', default=default_dense_units)
+    parser.add_argument('--epochs', type=int, default=default_epochs)
+    parser.add_argument('--batch-size', type=int, default=default_batch_size)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', '-j', type=int, default=0,
+                        help="worker processes, one candidate per worker (0 = cores / threads per worker, default)")
+    parser.add_argument('--threads-per-worker', type=int, default=1, help="TensorFlow intra-op threads per worker")
+    parser.add_argument('--output-dir', default=output_dir)
+    args = parser.parse_args()
+
+    train, test = np.load(train_file), np.load(test_file)
+    arrays = {'X_train': train['X'].astype(np.float32), 'y_train': train['y'],
+              'X_test': test['X'].astype(np.float32), 'y_test': test['y']}
+    configs = sweep_configs(args)
+    too_long = [c for c in configs if c['window_length'] > arrays['X_train'].shape[1]]
+    if too_long:
+        print(f"Window length {too_long[0]['window_length']} is longer than the dataset windows "
+              f"({arrays['X_train'].shape[1]} samples).")
+        exit(1)
+
+    jobs = args.jobs or max((os.cpu_count() or 1) // args.threads_per_worker, 1)
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"{len(configs)} candidates, {min(jobs, len(configs))} workers x {args.threads_per_worker} thread(s)")
+
+    blocks, descriptors = share_arrays(arrays)
+    start = time.perf_counter()
+    try:
+        results = run_jobs(train_candidate, [(c, args.output_dir) for c in configs], jobs,
+                           initializer=init_worker, initargs=(descriptors, args.threads_per_worker))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    elapsed = time.perf_counter() - start
+
+    # latencija tek kad je pool gotov, jedan model za drugim, da mjerenja nisu pod opterecenjem treniranja
+    from benchmark_models import invoke_latency
+    print(f"Measuring latency of {len(results)} models one at a time...")
+    for r in results:
+        with open(r['model'], 'rb') as f:
+            latency = invoke_latency(f.read(), 1, latency_runs)
+        r['latency_p50_ms'] = latency['p50_ms']
+        r['latency_p99_ms'] = latency['p99_ms']
+
+    arena_limit = results[0]['arena_limit'] if results else None
+    fitting = [r for r in results if r['fits_arena']]
+    front = pareto_front(fitting)
+    front_names = {r['name'] for r in front}
+    print(f"\nTrained in {elapsed:.0f} s. * = Pareto front (int8 accuracy, flash, latency), "
+          f"- = does not fit kTensorArenaSize {arena_limit} B")
+    print(f"  {'candidate':<34} {'int8 acc':>8} {'float acc':>9} {'flash B':>8} {'arena B':>8} {'p50 ms':>7} {'epochs':>6}")
+    for r in sorted(results, key=lambda r: (-r['int8_accuracy'], r['flash_bytes'])):
+        mark = '*' if r['name'] in front_names else ('-' if not r['fits_arena'] else ' ')
+        print(f"{mark} {r['name']:<34} {r['int8_accuracy']:8.2%} {r['float_accuracy']:9.2%} {r['flash_bytes']:8d} "
+              f"{r['arena_bytes']:8d} {r['latency_p50_ms']:7.3f} {r['epochs_trained']:6d}")
+
+    results_path = os.path.join(args.output_dir, "results.json")
+    with open(results_path, 'w') as f:
+        json.dump({'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'arena_limit': arena_limit, 'candidates': results,
+                   'pareto_front': [r['name'] for r in front]}, f, indent=2)
+    print(f"\nResults saved to {results_path}, models in {args.output_dir}/")
@@ -5,13 +5,20 @@ from sklearn.metrics import classification_report, confusion_matrix
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import time
+import argparse
 import csv # To load intervals as CSV
 from collections import Counter # For final counts
 
+from windowing import interval_index_bounds, find_trigger_indices, strided_windows
+from batch_inference import BatchEvaluator, EVAL_BATCH_SIZE
+from resample import Resampler, add_stage_argument, stage_rate
+
 # --- Configuration ---
 RAW_DATA_FILE = os.path.join('gesture_data', 'novi_raw_data.csv')
 INTERVALS_FILE = os.path.join('gesture_data', 'novi_intervals.txt') # It's a TXT file but CSV format
 QUANTIZED_MODEL_PATH = 'model_quantized.tflite'
+FIRMWARE_MODEL_PATH = os.path.join('final', 'model.tflite') # the model compiled into final.ino
 
 SENSOR_SAMPLE_RATE_HZ = 88 # From your new Arduino code
 WINDOW_SIZE = int(3 * SENSOR_SAMPLE_RATE_HZ) # 3 seconds * 88 Hz = 264 samples
@@ -67,101 +74,100 @@ def load_intervals_from_txt(path):
             intervals.append({'start_time': float(row['start_time']), 'end_time': float(row['end_time'])})
     return intervals
 
+def resample_dataframe(df, rate):
+    """
+    The samples on a uniform rate Hz grid, as resample_data.py does it for the training recordings.
+    attrs['grid'] is set while the recording is a single grid segment, so intervals map by index arithmetic.
+    """
+    resampler = Resampler(rate)
+    grid_ts, samples, _ = resampler.push(df['timestamp'].to_numpy(), df[sensor_cols].to_numpy())
+    resampled = pd.DataFrame(samples, columns=sensor_cols)
+    resampled.insert(0, 'timestamp', grid_ts)
+    resampled.attrs['grid'] = resampler.grid
+    return resampled
+
 def normalize_sensor_data(df, means, stds, sensor_cols):
     df_norm = df.copy()
     for i, col in enumerate(sensor_cols):
         df_norm[col] = (df_norm[col] - means[i]) / stds[i]
     return df_norm
 
-def extract_gesture_window(full_df_normalized, interval, gesture_type_name):
+def extract_gesture_windows(full_df_normalized, intervals, gesture_type_name):
     """
-    Extracts a single window for a gesture based on its interval.
-    Finds the first gyro trigger within the interval and takes WINDOW_SIZE samples from there.
+    Extracts one window per interval for a gesture.
+    Finds the first gyro trigger within each interval and takes WINDOW_SIZE samples from there.
+    The trigger search runs over all intervals at once (see windowing.find_trigger_indices).
     """
     windows = []
     labels = []
 
-    # Get start and end indices of the interval in the full dataframe
-    interval_data_start_idx = full_df_normalized['timestamp'].searchsorted(interval['start_time'], side='left')
-    interval_data_end_idx = full_df_normalized['timestamp'].searchsorted(interval['end_time'], side='right') - 1
+    n = len(full_df_normalized)
+    if not intervals:
+        return windows, labels
 
-    if interval_data_start_idx >= len(full_df_normalized) or interval_data_start_idx > interval_data_end_idx:
-        print(f"Warning: Interval for {gesture_type_name} ({interval['start_time']:.2f}-{interval['end_time']:.2f}s) is out of data range or empty. Skipping.")
-        return [], []
+    timestamps = full_df_normalized['timestamp'].to_numpy()
+    features = full_df_normalized[sensor_cols].to_numpy(dtype=np.float32)
 
-    # Scan for the first gyro trigger *within this specific interval's data segment*
-    trigger_start_idx = -1
-    
-    # Iterate only through the samples within the current interval's bounds
-    for idx_in_full_df in range(interval_data_start_idx, interval_data_end_idx + 1):
-        # We assume the label in the data is correct within the interval, but only check gyro if it's the intended gesture.
-        # This check is crucial for finding the *activity peak* within the labelled segment.
-        gx, gy, gz = full_df_normalized.iloc[idx_in_full_df]['gx'], full_df_normalized.iloc[idx_in_full_df]['gy'], full_df_normalized.iloc[idx_in_full_df]['gz']
-        
-        if abs(gx) >= 1.0 or abs(gy) >= 1.0 or abs(gz) >= 1.0:
-            trigger_start_idx = idx_in_full_df # Found trigger point
-            break # Stop scanning this interval once trigger is found
+    start_idx, end_idx = interval_index_bounds(timestamps, intervals, grid=full_df_normalized.attrs.get('grid'))
+    trigger_idx = find_trigger_indices(full_df_normalized[['gx', 'gy', 'gz']].to_numpy(), start_idx, end_idx)
 
-    if trigger_start_idx != -1: # If a valid gyro trigger was found within the interval
-        window_start_idx = trigger_start_idx
-        window_end_idx = window_start_idx + WINDOW_SIZE - 1
+    for interval, interval_start, interval_end, trigger in zip(intervals, start_idx, end_idx, trigger_idx):
+        if interval_start >= n or interval_start > interval_end:
+            print(f"Warning: Interval for {gesture_type_name} ({interval['start_time']:.2f}-{interval['end_time']:.2f}s) is out of data range or empty. Skipping.")
+            continue
 
-        if window_end_idx < len(full_df_normalized):
-            window_df = full_df_normalized.loc[full_df_normalized.index[window_start_idx] : full_df_normalized.index[window_end_idx]].copy()
-            
-            if len(window_df) != WINDOW_SIZE:
-                print(f"Warning: Extracted window for {gesture_type_name} (starting {full_df_normalized.iloc[window_start_idx]['timestamp']:.2f}s) has incorrect size ({len(window_df)} instead of {WINDOW_SIZE}). Skipping.")
-                return [], [] # Return empty if window size is incorrect
+        if trigger == -1:
+            print(f"Warning: No gyro trigger (abs > 1.0) found within interval for {gesture_type_name} ({interval['start_time']:.2f}-{interval['end_time']:.2f}s). Skipping.")
+            continue
 
-            # Extract features (dropping timestamp and labels for model input)
-            features = window_df[sensor_cols].astype(np.float32).values.tolist()
-            
-            windows.append(features)
+        # Windows that would run past the end of the recording are dropped silently, as before
+        if trigger + WINDOW_SIZE - 1 < n:
+            windows.append(features[trigger:trigger + WINDOW_SIZE])
             labels.append(LABEL_MAP[gesture_type_name])
-    else:
-        print(f"Warning: No gyro trigger (abs > 1.0) found within interval for {gesture_type_name} ({interval['start_time']:.2f}-{interval['end_time']:.2f}s). Skipping.")
-        
+
     return windows, labels
 
+def extract_gesture_window(full_df_normalized, interval, gesture_type_name):
+    """
+    Extracts a single window for a gesture based on its interval.
+    """
+    return extract_gesture_windows(full_df_normalized, [interval], gesture_type_name)
+
 def extract_junk_windows_from_interval(full_df_normalized, interval):
     """
     Extracts junk windows from a specific interval in the raw data.
-    Uses a 1-second stride (60 samples) for junk windows.
+    Uses a 1-second stride (88 samples) for junk windows.
     """
-    windows = []
-    labels = []
-
     # Get start and end indices of the junk interval in the full dataframe
-    junk_data_start_idx = full_df_normalized['timestamp'].searchsorted(interval['start_time'], side='left')
-    junk_data_end_idx = full_df_normalized['timestamp'].searchsorted(interval['end_time'], side='right') - 1
+    start_idx, end_idx = interval_index_bounds(full_df_normalized['timestamp'].to_numpy(), [interval],
+                                               grid=full_df_normalized.attrs.get('grid'))
+    junk_data_start_idx, junk_data_end_idx = int(start_idx[0]), int(end_idx[0])
 
     if junk_data_start_idx >= len(full_df_normalized) or junk_data_start_idx > junk_data_end_idx:
         print(f"Warning: Junk interval ({interval['start_time']:.2f}-{interval['end_time']:.2f}s) is out of data range or empty. Skipping.")
         return [], []
     
-    # Slice the DataFrame for the junk segment
-    junk_segment_df = full_df_normalized.loc[full_df_normalized.index[junk_data_start_idx] : full_df_normalized.index[junk_data_end_idx]].copy()
-
-    # Iterate through the junk segment with a 1-second stride
-    n = len(junk_segment_df)
-    effective_stride = int(1 * SENSOR_SAMPLE_RATE_HZ)
+    # 1-second stride windows as strided views over the junk segment (no per-window copies)
+    features = full_df_normalized[sensor_cols].to_numpy(dtype=np.float32)
+    junk_features = features[junk_data_start_idx : junk_data_end_idx + 1]
+    windows = strided_windows(junk_features, WINDOW_SIZE, int(1 * SENSOR_SAMPLE_RATE_HZ))
+    labels = [JUNK_LABEL_INDEX] * len(windows) # Label as junk
 
-    for start_idx_in_segment in range(0, n - WINDOW_SIZE + 1, effective_stride):
-        window_df = junk_segment_df.iloc[start_idx_in_segment : start_idx_in_segment + WINDOW_SIZE]
-        
-        if len(window_df) != WINDOW_SIZE:
-            continue
-
-        features = window_df[sensor_cols].astype(np.float32).values.tolist()
-        windows.append(features)
-        labels.append(JUNK_LABEL_INDEX) # Label as junk
-        
     return windows, labels
 
 
 # --- Main Script Execution ---
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a quantized TFLite model on the 'novi' recording.")
+    parser.add_argument('--model', default=QUANTIZED_MODEL_PATH,
+                        help=f"TFLite model (default: {QUANTIZED_MODEL_PATH}, or e.g. {FIRMWARE_MODEL_PATH})")
+    parser.add_argument('--batch-size', type=int, default=EVAL_BATCH_SIZE, help="windows per invoke()")
+    parser.add_argument('--check', action='store_true',
+                        help="also run the model one window at a time and check the outputs are identical")
+    add_stage_argument(parser) # isti --stage kao normalize_data.py / pipeline.py
+    args = parser.parse_args()
+
     print("Starting specialized 'novi' data processing for quantized model testing.")
 
     # 1. Load raw data and intervals
@@ -178,6 +184,11 @@ if __name__ == "__main__":
     print(f"Raw data loaded. Total samples: {len(raw_df)}")
     print(f"Intervals loaded. Total intervals: {len(intervals)}")
 
+    rate = stage_rate(args.stage)
+    if rate:
+        raw_df = resample_dataframe(raw_df, rate)
+        print(f"Resampled to {rate} Hz: {len(raw_df)} samples")
+
     # 2. Normalize the entire raw DataFrame once
     normalized_df = normalize_sensor_data(raw_df, MEANS, STDS, sensor_cols)
     print("Raw data normalized.")
@@ -200,10 +211,9 @@ if __name__ == "__main__":
         gesture_intervals = intervals[start_interval_idx : end_interval_idx]
         
         print(f"\nExtracting windows for gesture: '{gesture_name}' ({len(gesture_intervals)} intervals)")
-        for interval in gesture_intervals:
-            windows, labels = extract_gesture_window(normalized_df, interval, gesture_name)
-            all_test_windows.extend(windows)
-            all_test_labels.extend(labels)
+        windows, labels = extract_gesture_windows(normalized_df, gesture_intervals, gesture_name)
+        all_test_windows.extend(windows)
+        all_test_labels.extend(labels)
             
     # 4. Extract junk windows from the specified junk segment
     junk_segment_info = INTERVAL_SEGMENTS['junk_segment']
@@ -225,47 +235,37 @@ if __name__ == "__main__":
 
     # 5. Load and Test Quantized TFLite Model
     try:
-        interpreter = tf.lite.Interpreter(model_path=QUANTIZED_MODEL_PATH)
-        interpreter.allocate_tensors()
-        print(f"\nQuantized model loaded from '{QUANTIZED_MODEL_PATH}'.")
+        interpreter = tf.lite.Interpreter(model_path=args.model)
+        evaluator = BatchEvaluator(interpreter, batch_size=args.batch_size)
+        print(f"\nQuantized model loaded from '{args.model}'.")
     except FileNotFoundError:
-        print(f"Error: Quantized model '{QUANTIZED_MODEL_PATH}' not found. Please run quantize_model.py first.")
+        print(f"Error: Quantized model '{args.model}' not found. Please run quantize_model.py first.")
         exit()
     except Exception as e:
         print(f"Error loading quantized model: {e}")
         exit()
 
-    input_details = interpreter.get_input_details()[0]
-    output_details = interpreter.get_output_details()[0]
-
-    input_scale = input_details['quantization_parameters']['scales'][0]
-    input_zero_point = input_details['quantization_parameters']['zero_points'][0]
-    output_scale = output_details['quantization_parameters']['scales'][0]
-    output_zero_point = output_details['quantization_parameters']['zero_points'][0]
-
-    print(f"Input Quantization: scale={input_scale}, zero_point={input_zero_point}")
-    print(f"Output Quantization: scale={output_scale}, zero_point={output_zero_point}")
-
-    # Run inference
-    y_pred = []
-    print("\nRunning inference on 'novi' test data...")
-    for i in range(X_test_novi.shape[0]):
-        input_data_float = X_test_novi[i:i+1] # Get one window (batch size of 1)
-        
-        # Quantize input data (float32 to int8)
-        input_data_int8 = (input_data_float / input_scale + input_zero_point).astype(input_details['dtype'])
-
-        interpreter.set_tensor(input_details['index'], input_data_int8)
-        interpreter.invoke()
-        output_data_int8 = interpreter.get_tensor(output_details['index'])
-
-        # Dequantize output data (int8 to float32 probabilities)
-        output_data_float = (output_data_int8 - output_zero_point) * output_scale
-
-        predicted_class_idx = np.argmax(output_data_float[0])
-        y_pred.append(predicted_class_idx)
-
-    y_pred = np.array(y_pred)
+    print(f"Input Quantization: scale={evaluator.input_scale}, zero_point={evaluator.input_zero_point}")
+    print(f"Output Quantization: scale={evaluator.output_scale}, zero_point={evaluator.output_zero_point}")
+
+    # Run inference, batch_size windows per invoke()
+    print(f"\nRunning inference on 'novi' test data (batches of {args.batch_size})...")
+    start = time.perf_counter()
+    output_data_float = evaluator.predict(X_test_novi)
+    elapsed = time.perf_counter() - start
+    print(f"{len(X_test_novi)} windows in {elapsed:.3f} s ({evaluator.invocations} invokes)")
+    y_pred = np.argmax(output_data_float, axis=1)
+
+    if args.check:
+        start = time.perf_counter()
+        reference = evaluator.predict_per_window(X_test_novi)
+        reference_elapsed = time.perf_counter() - start
+        print(f"Per-window reference: {reference_elapsed:.3f} s")
+        if not np.array_equal(output_data_float, reference):
+            print(f"Error: batched outputs differ from the per-window path in "
+                  f"{int(np.any(output_data_float != reference, axis=1).sum())} windows.")
+            exit(1)
+        print("Batched outputs are identical to the per-window path.")
 
     # 6. Evaluate and Plot Confusion Matrix
     print("\n--- Evaluation on 'novi' data (Quantized Model) ---")
@@ -0,0 +1,26 @@
+import os
+
+from benchmark_models import parse_op_profile
+
+data_dir = os.path.join(os.path.dirname(__file__), "data")
+
+
+def load_sample(name):
+    with open(os.path.join(data_dir, name)) as f:
+        return f.read()
+
+
+def test_parse_op_profile_skips_initialization_table():
+    rows = parse_op_profile(load_sample("benchmark_model_op_profiling.txt"))
+
+    assert [row['op'] for row in rows] == ['CONV_2D', 'CONV_2D', 'MEAN', 'FULLY_CONNECTED', 'SOFTMAX']
+    assert rows[0] == {'op': 'CONV_2D', 'name': '[sequential/conv1d/Relu;sequential/conv1d/BiasAdd]:0',
+                       'avg_ms': 0.066, 'percent': 41.772}
+    assert rows[-1]['name'] == '[StatefulPartitionedCall:0]:4'
+
+
+def test_parse_op_profile_without_regular_runs():
+    sample = load_sample("benchmark_model_op_profiling.txt")
+    initialization_only = sample[:sample.index("Operator-wise Profiling Info for Regular Benchmark Runs")]
+
+    assert parse_op_profile(initialization_only) == []
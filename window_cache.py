@@ -0,0 +1,141 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+# Content-addressed cache for extracted windows. The key is a hash of the input files' bytes and the
+# windowing parameters, so a gesture is only re-extracted when its recording, its intervals or a
+# parameter changed. Entries are plain .npy files; the least recently used ones are removed once the
+# cache grows over max_bytes.
+
+cache_dir_name = "window_cache"
+max_cache_bytes = 1024 * 2**20
+# povecati kad se promijeni nacin ekstrakcije prozora, tako da se stari unosi ne koriste
+cache_version = 1
+hash_block_bytes = 4 * 2**20
+
+
+def file_digest(path, digest=None):
+    digest = hashlib.sha256() if digest is None else digest
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(hash_block_bytes)
+            if not block:
+                break
+            digest.update(block)
+    return digest
+
+
+def cache_key(input_paths, params):
+    """
+    sha256 over the cache version, the params dict (JSON, sorted keys) and the contents of input_paths.
+    File names do not go into the key, only their bytes and order.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'version': cache_version, 'params': params}, sort_keys=True).encode())
+    for path in input_paths:
+        digest.update(b'\0')
+        file_digest(path, digest)
+    return digest.hexdigest()
+
+
+class WindowCache:
+    """
+    Directory of <key>.npy window arrays. get() touches the file's mtime, which is what the LRU eviction
+    in put() orders by. max_bytes=None turns eviction off, e.g. in worker processes sharing the directory.
+    """
+
+    def __init__(self, cache_dir, max_bytes=max_cache_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def get(self, key, mmap=True):
+        path = self.path(key)
+        try:
+            windows = np.load(path, mmap_mode='r' if mmap else None)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        os.utime(path)
+        return windows
+
+    def put(self, key, windows):
+        windows = np.ascontiguousarray(windows, dtype=np.float32)
+        path = self.path(key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, windows)
+        os.replace(tmp_path, path)
+        self.evict(keep={path})
+        return windows
+
+    def entries(self):
+        """
+        (mtime, size, path) of every entry, least recently used first.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, os.path.join(self.cache_dir, name)))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=()):
+        """
+        Removes least recently used entries until the cache fits max_bytes; paths in keep are never removed.
+        Entries that cannot be removed (on Windows, one still memory-mapped) are skipped.
+        """
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Could not evict {path} from the window cache: {e}")
+                continue
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def ensure(self, input_paths, params, extract):
+        """
+        Makes sure the entry for these inputs/params exists, storing extract() on a miss.
+        Returns (path of the .npy, hit).
+        """
+        key = cache_key(input_paths, params)
+        path = self.path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return path, True
+        self.put(key, extract())
+        return path, False
+
+    def cached(self, input_paths, params, extract):
+        """
+        Returns (windows, hit): the cached array for these inputs/params, or extract() stored under its key.
+        """
+        key = cache_key(input_paths, params)
+        windows = self.get(key)
+        if windows is not None:
+            return windows, True
+        return self.put(key, extract()), False
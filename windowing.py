@@ -0,0 +1,109 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+gyro_trigger_threshold = 1.0
+grid_eps = 1e-6 # tolerancija za float gresku u (t - grid_start) * rate, dijeli ga i resample.Resampler
+
+
+def interval_index_bounds(timestamps, intervals, grid=None):
+    """
+    Maps a list of {'start_time', 'end_time'} intervals to inclusive sample index bounds,
+    the same way the scripts did it with Series.searchsorted.
+    grid=(grid_start, rate) for resampled recordings (resample.recording_grid) uses index arithmetic instead.
+    """
+    starts = np.array([iv['start_time'] for iv in intervals], dtype=np.float64)
+    ends = np.array([iv['end_time'] for iv in intervals], dtype=np.float64)
+    if grid is not None:
+        return grid_index_bounds(starts, ends, grid[0], grid[1], len(timestamps))
+
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    start_idx = np.searchsorted(timestamps, starts, side='left')
+    end_idx = np.searchsorted(timestamps, ends, side='right') - 1
+    return start_idx.astype(np.int64), end_idx.astype(np.int64)
+
+
+def grid_index_bounds(starts, ends, grid_start, rate, n):
+    """
+    First sample at or after each start and last sample at or before each end, for samples at
+    grid_start + i / rate.
+    """
+    start_idx = np.ceil((starts - grid_start) * rate - grid_eps)
+    end_idx = np.floor((ends - grid_start) * rate + grid_eps)
+    return np.clip(start_idx, 0, n).astype(np.int64), np.clip(end_idx, -1, n - 1).astype(np.int64)
+
+
+def find_trigger_indices(gyro, start_idx, end_idx, threshold=gyro_trigger_threshold, valid=None):
+    """
+    For every inclusive [start, end] index interval returns the index of the first sample where
+    |gx|, |gy| or |gz| >= threshold (and valid is True, if given), or -1 when there is none.
+    All intervals are resolved at once with one boolean mask and a searchsorted over the hits.
+    """
+    gyro = np.asarray(gyro)
+    start_idx = np.asarray(start_idx, dtype=np.int64)
+    end_idx = np.asarray(end_idx, dtype=np.int64)
+
+    hits = (np.abs(gyro) >= threshold).any(axis=1)
+    if valid is not None:
+        hits &= np.asarray(valid, dtype=bool)
+    hit_idx = np.flatnonzero(hits)
+
+    triggers = np.full(len(start_idx), -1, dtype=np.int64)
+    if len(hit_idx) == 0 or len(start_idx) == 0:
+        return triggers
+
+    pos = np.searchsorted(hit_idx, start_idx, side='left')
+    found = pos < len(hit_idx)
+    candidates = hit_idx[np.minimum(pos, len(hit_idx) - 1)]
+    found &= candidates <= end_idx
+    triggers[found] = candidates[found]
+    return triggers
+
+
+def gesture_window_starts(timestamps, gyro, intervals, window_size, threshold=gyro_trigger_threshold, valid=None,
+                          grid=None, bounds=None):
+    """
+    Returns the start index of every gesture window: the first gyro trigger inside each interval,
+    dropping intervals that are empty, have no trigger or would run past the end of the data.
+    grid is passed to interval_index_bounds; bounds=(start_idx, end_idx) skips the mapping altogether.
+    """
+    n = len(timestamps)
+    if not intervals:
+        return np.empty(0, dtype=np.int64)
+
+    start_idx, end_idx = bounds if bounds is not None else interval_index_bounds(timestamps, intervals, grid=grid)
+    non_empty = (start_idx < n) & (start_idx <= end_idx)
+
+    triggers = find_trigger_indices(gyro, start_idx, end_idx, threshold=threshold, valid=valid)
+    keep = non_empty & (triggers != -1) & (triggers + window_size - 1 < n)
+    return triggers[keep]
+
+
+def sliding_windows(features, window_size, stride=1):
+    """
+    Returns every stride-th window of window_size samples as a read-only strided view
+    of shape (n_windows, window_size, n_features) over one contiguous float32 buffer.
+    Nothing is copied unless features are not float32 / C-contiguous already.
+    """
+    buffer = np.ascontiguousarray(features, dtype=np.float32)
+    if len(buffer) < window_size:
+        return np.empty((0, window_size) + buffer.shape[1:], dtype=np.float32)
+    # sliding_window_view puts the window axis last: (n - w + 1, n_features, w)
+    view = sliding_window_view(buffer, window_size, axis=0)
+    return np.moveaxis(view, -1, 1)[::stride]
+
+
+def take_windows(features, window_starts, window_size):
+    """
+    Materializes only the windows starting at window_starts into a new (k, window_size, n_features) array.
+    """
+    window_starts = np.asarray(window_starts, dtype=np.int64)
+    return sliding_windows(features, window_size)[window_starts]
+
+
+def strided_windows(features, window_size, stride, materialize=False):
+    """
+    Windows at every stride samples, e.g. junk windows. Returns a view by default;
+    materialize=True copies them into their own array.
+    """
+    windows = sliding_windows(features, window_size, stride)
+    return np.array(windows) if materialize else windows